@@ -0,0 +1,83 @@
+"""
+Microbenchmark for the shared CRC-16 engine.
+
+Compares tinyos3.packet.crc16 against the bit-by-bit implementation it
+replaced, and measures the entry points callers use
+(SerialProtocol.crcByte, tos.HDLC._crc16), in bytes/second.
+
+    python -m benchmarks.bench_crc
+"""
+
+import os
+
+from tinyos3 import tos
+from tinyos3.packet import crc16
+from tinyos3.packet.SerialProtocol import crcByte
+
+from .timing import perSecond
+
+
+def bitwiseCrc(data):
+    """The original per-bit CRC loop from SerialProtocol.crcByte."""
+    crc = 0
+    for b in data:
+        crc = crc ^ b << 8
+        for i in range(0, 8):
+            if (crc & 0x8000) == 0x8000:
+                crc = crc << 1 ^ 0x1021
+            else:
+                crc = crc << 1
+        crc = crc & 0xFFFF
+    return crc
+
+
+def tableCrc(data):
+    crc = 0
+    for b in data:
+        crc = crc16.updateByte(crc, b)
+    return crc
+
+
+def serialProtocolCrc(data):
+    crc = 0
+    for b in data:
+        crc = crcByte(crc, b)
+    return crc
+
+
+def hdlcCrc(data):
+    return tos.HDLC._crc16(None, 0, data)
+
+
+def throughput(fn, data, repeat=None):
+    return len(data) * perSecond(lambda: fn(data), repeat)
+
+
+def run(sizes=(16, 64, 256, 4096)):
+    results = []
+    for size in sizes:
+        data = os.urandom(size)
+        assert bitwiseCrc(data) == tableCrc(data) == crc16.compute(data)
+        assert serialProtocolCrc(data) == hdlcCrc(data) == crc16.compute(data)
+        results.append(
+            {
+                "size": size,
+                "bitwise": throughput(bitwiseCrc, data),
+                "table": throughput(tableCrc, data),
+                "update": throughput(crc16.compute, data),
+                "crcByte": throughput(serialProtocolCrc, data),
+                "hdlc_crc16": throughput(hdlcCrc, data),
+            }
+        )
+    return results
+
+
+def main():
+    columns = ("bitwise", "table", "update", "crcByte", "hdlc_crc16")
+    print("%6s " % "bytes" + " ".join("%14s" % (c + " B/s") for c in columns))
+    for r in run():
+        print("%6d " % r["size"] + " ".join("%14.0f" % r[c] for c in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Microbenchmark for MoteIF.dispatchPacket with 1 to 500 listeners.
+
+Every listener is registered for the same message class, so this
+measures the per-listener cost of a dispatch; "classes" registers each
+listener with a class of its own, so every one also decodes the message.
+
+    python -m benchmarks.bench_dispatch
+"""
+
+from unittest.mock import patch
+
+from tinyos3.message.Message import Message
+from tinyos3.message.MoteIF import MoteIF
+from tinyos3.message.SerialPacket import SerialPacket
+
+from .timing import perSecond
+
+LISTENERS = (1, 10, 100, 500)
+AM_TYPE = 0x22
+
+
+class Listener:
+    def __init__(self):
+        self.count = 0
+
+    def receive(self, source, msg):
+        self.count += 1
+
+
+def messageClass():
+    class Msg(Message):
+        def __init__(self, data=b"", addr=None, gid=None, base_offset=0, data_length=None):
+            Message.__init__(self, data, addr, gid, base_offset, data_length)
+
+        @classmethod
+        def get_amType(cls):
+            return AM_TYPE
+
+    return Msg
+
+
+def serialPacket(payload=bytes(28)):
+    pkt = SerialPacket(None)
+    pkt.set_header_dest(0xFFFF)
+    pkt.set_header_src(1)
+    pkt.set_header_group(0x22)
+    pkt.set_header_type(AM_TYPE)
+    pkt.set_header_length(len(payload))
+    return b"\x00" + pkt.dataGet() + payload
+
+
+def moteIF():
+    # MoteIF() would start the Watcher, which forks.
+    with patch("tinyos3.utils.Watcher.Watcher.getInstance", return_value=object()):
+        return MoteIF()
+
+
+def run(counts=LISTENERS):
+    packet = serialPacket()
+    results = []
+    for sharing in ("shared", "classes"):
+        for n in counts:
+            mote = moteIF()
+            shared = messageClass()
+            for i in range(n):
+                mote.addListener(
+                    Listener(), shared if sharing == "shared" else messageClass()
+                )
+            results.append(
+                {
+                    "listeners": n,
+                    "kind": sharing,
+                    "packets": perSecond(lambda: mote.dispatchPacket(None, packet)),
+                }
+            )
+    return results
+
+
+def main():
+    print("%9s %8s %14s" % ("listeners", "kind", "packets/s"))
+    for r in run():
+        print("%9d %8s %14.0f" % (r["listeners"], r["kind"], r["packets"]))
+
+
+if __name__ == "__main__":
+    main()
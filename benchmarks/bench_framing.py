@@ -0,0 +1,99 @@
+"""
+Microbenchmark for HDLC frame encoding and decoding.
+
+Compares tinyos3.packet.HDLC against the byte-at-a-time escaping that
+SerialProtocol.writeFramedPacket and tos.HDLC used before, for payloads
+of 10 to 250 bytes with and without bytes that need escaping.
+
+    python -m benchmarks.bench_framing
+"""
+
+import random
+
+from tinyos3.packet import HDLC
+from tinyos3.packet.SerialProtocol import crcByte
+
+from .timing import perSecond
+
+SIZES = (10, 50, 100, 250)
+
+
+def bytewiseEncode(frameType, sn, data):
+    """The original SerialProtocol.writeFramedPacket loop."""
+
+    def escape(b):
+        if b == 0x7E or b == 0x7D:
+            return b"\x7d" + (b ^ 0x20).to_bytes(1, byteorder="big")
+        return (b).to_bytes(1, byteorder="big")
+
+    crc = 0
+    frame = b"\x7e"
+    crc = crcByte(crc, frameType)
+    frame += escape(frameType)
+    crc = crcByte(crc, sn)
+    frame += escape(sn)
+    for c in data:
+        crc = crcByte(crc, c)
+        frame += escape(c)
+    frame += escape(crc & 0xFF)
+    frame += escape(crc >> 8)
+    frame += b"\x7e"
+    return frame
+
+
+def bytewiseUnescape(packet):
+    """The original tos.HDLC._unescape loop."""
+    r = []
+    esc = False
+    for b in packet:
+        if esc:
+            r.append(b ^ 0x20)
+            esc = False
+        elif b == 0x7D:
+            esc = True
+        else:
+            r.append(b)
+    return r
+
+
+def payloads(size):
+    rnd = random.Random(size)
+    clean = bytes(rnd.choice(range(0x7D)) for i in range(size))
+    dirty = bytes(rnd.choice((0x7D, 0x7E, 0x01, 0x02)) for i in range(size))
+    return (("clean", clean), ("escaped", dirty))
+
+
+def run(sizes=SIZES):
+    results = []
+    for size in sizes:
+        for (kind, data) in payloads(size):
+            header = b"\x44\x01"
+            frame = HDLC.encode(header, data)
+            assert bytes(frame) == bytewiseEncode(0x44, 1, data)
+            body = bytes(frame[1:-1])
+            results.append(
+                {
+                    "size": size,
+                    "kind": kind,
+                    "encode_bytewise": perSecond(lambda: bytewiseEncode(0x44, 1, data)),
+                    "encode": perSecond(lambda: HDLC.encode(header, data)),
+                    "unescape_bytewise": perSecond(lambda: bytewiseUnescape(body)),
+                    "unescape": perSecond(lambda: HDLC.unescape(body)),
+                    "deframe": perSecond(lambda: HDLC.Deframer().feed(frame)),
+                }
+            )
+    return results
+
+
+def main():
+    columns = ("encode_bytewise", "encode", "unescape_bytewise", "unescape", "deframe")
+    print("%5s %8s " % ("bytes", "payload") + " ".join("%17s" % c for c in columns))
+    for r in run():
+        print(
+            "%5d %8s " % (r["size"], r["kind"])
+            + " ".join("%15.0f/s" % r[c] for c in columns)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark for loading a NescApp from a synthetic nescDecls.xml with
+many enums, message structs, typedefs and variables.
+
+    python -m benchmarks.bench_nescapp
+"""
+
+import os
+import tempfile
+import time
+
+from tinyos3.tossim.TossimApp import NescApp
+
+# number of message structs; enums and variables scale with it
+SIZES = (10, 50, 200)
+FIELDS = 8
+
+
+def syntheticDecls(structs, fields=FIELDS):
+    out = ['<?xml version="1.0" ?>', "<nesc>", "<enums>"]
+    for i in range(4 * structs):
+        out.append('<enum name="E%d" value="I:%d"/>' % (i, i))
+    for i in range(structs):
+        out.append('<enum name="AM_MSG%d" value="I:%d"/>' % (i, 100 + i))
+    out.append("</enums>")
+
+    out.append("<structs>")
+    for i in range(structs):
+        out.append('<struct name="msg%d" size="I:%d">' % (i, 2 * fields))
+        for j in range(fields):
+            out.append(
+                '<field name="f%d" bit-offset="I:%d" size="I:2">'
+                '<type-int cname="unsigned int" size="I:2"/></field>' % (j, 16 * j)
+            )
+        out.append("</struct>")
+    out.append("</structs>")
+
+    out.append("<typedefs>")
+    for i in range(structs):
+        out.append('<typedef name="msg%d_t" value="msg%d"/>' % (i, i))
+    out.append("</typedefs>")
+
+    out.append("<variables>")
+    for i in range(2 * structs):
+        out.append(
+            '<variable name="v%d" loc="1:/apps/App.nc">'
+            '<component-ref qname="C%d"/>'
+            '<type-int cname="unsigned char" size="I:1"/></variable>' % (i, i)
+        )
+    out.append("</variables>")
+    out.append("</nesc>")
+    return "\n".join(out)
+
+
+def run(sizes=SIZES):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for structs in sizes:
+            path = os.path.join(tmp, "nescDecls%d.xml" % structs)
+            with open(path, "w") as f:
+                f.write(syntheticDecls(structs))
+
+            best = None
+            for i in range(3):
+                start = time.perf_counter()
+                app = NescApp("Synthetic", path)
+                elapsed = time.perf_counter() - start
+                if best == None or elapsed < best:
+                    best = elapsed
+            assert len(app.messages._msgNames) == structs
+            results.append(
+                {"structs": structs, "bytes": os.path.getsize(path), "seconds": best}
+            )
+    return results
+
+
+def main():
+    print("%7s %10s %10s" % ("structs", "xml bytes", "load s"))
+    for r in run():
+        print("%7d %10d %10.3f" % (r["structs"], r["bytes"], r["seconds"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Microbenchmarks for packet and message decoding.
+
+Covers tos.Packet decoding and payload(), Message.getUIntElement and
+setUIntElement, and the generated SerialPacket and avrmote.TOS_Msg
+accessors, in operations/second, and the memory held by a received
+tos.ActiveMessage.
+
+    python -m benchmarks.bench_packet
+"""
+
+import tracemalloc
+
+from tinyos3 import tos
+from tinyos3.message.Message import Message
+from tinyos3.message.SerialPacket import SerialPacket
+from tinyos3.packet.avrmote import TOS_Msg
+
+from .timing import perSecond
+
+PAYLOAD_SIZE = 28
+
+
+def amPacket(size=PAYLOAD_SIZE):
+    return [0xFF, 0xFF, 0x00, 0x01, size, 0x22, 0x0A] + list(range(size))
+
+
+def serialHeader(size=PAYLOAD_SIZE):
+    return bytes(amPacket(size)[:7])
+
+
+def decodeSerialHeader(data):
+    pkt = SerialPacket(data)
+    return (
+        pkt.get_header_dest(),
+        pkt.get_header_src(),
+        pkt.get_header_length(),
+        pkt.get_header_group(),
+        pkt.get_header_type(),
+    )
+
+
+def encodeSerialHeader(size=PAYLOAD_SIZE):
+    pkt = SerialPacket(None)
+    pkt.set_header_dest(0xFFFF)
+    pkt.set_header_src(0x0001)
+    pkt.set_header_length(size)
+    pkt.set_header_group(0x22)
+    pkt.set_header_type(0x0A)
+    return pkt
+
+
+def getTosMsg(msg):
+    return (
+        msg.get_addr(),
+        msg.get_type(),
+        msg.get_group(),
+        msg.get_length(),
+        msg.get_crc(),
+        msg.get_strength(),
+        msg.get_ack(),
+        msg.get_time(),
+    )
+
+
+def setTosMsg(msg):
+    msg.set_addr(0x0001)
+    msg.set_type(0x0A)
+    msg.set_group(0x22)
+    msg.set_length(PAYLOAD_SIZE)
+    msg.set_crc(0xBEEF)
+    msg.set_strength(0x0100)
+    msg.set_ack(1)
+    msg.set_time(0x1234)
+
+
+def bytesPerPacket(make, n=2000):
+    """Return the memory held per object by n objects from make()."""
+    tracemalloc.start()
+    try:
+        keep = [make() for i in range(n)]
+        held = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del keep
+    return held / n
+
+
+def run():
+    packet = amPacket()
+    am = tos.ActiveMessage(packet)
+    frame = [tos.SERIAL_PROTO_PACKET_NOACK, 0] + packet
+    bframe = bytes(frame)
+
+    def received(f):
+        return tos.ActiveMessage(tos.NoAckDataFrame(tos.RawPacket(0, f)))
+
+    msg = Message(bytes(range(PAYLOAD_SIZE)))
+
+    def getUInts():
+        for offset in (0, 16, 48, 96):
+            msg.getUIntElement(offset, 8, False)
+            msg.getUIntElement(offset, 16, False)
+            msg.getUIntElement(offset, 32, True)
+
+    def setUInts():
+        for offset in (0, 16, 48, 96):
+            msg.setUIntElement(offset, 8, 0x12, False)
+            msg.setUIntElement(offset, 16, 0x1234, False)
+            msg.setUIntElement(offset, 32, 0x12345678, True)
+
+    header = serialHeader()
+    tosMsg = TOS_Msg(bytes(range(43)))
+    tosData = list(range(29))
+    return [
+        {"name": "tos.ActiveMessage decode", "ops": perSecond(lambda: tos.ActiveMessage(packet))},
+        {
+            "name": "tos frame decode",
+            "ops": perSecond(lambda: tos.ActiveMessage(tos.NoAckDataFrame(frame))),
+        },
+        {
+            "name": "tos frame decode (bytes)",
+            "ops": perSecond(lambda: tos.ActiveMessage(tos.NoAckDataFrame(bframe))),
+        },
+        {"name": "tos.ActiveMessage payload", "ops": perSecond(am.payload)},
+        {
+            "name": "tos received packet memory (list)",
+            "bytes": bytesPerPacket(lambda: received(list(frame))),
+        },
+        {
+            "name": "tos received packet memory (bytes)",
+            "bytes": bytesPerPacket(lambda: received(bytes(bframe))),
+        },
+        {"name": "Message.getUIntElement x12", "ops": perSecond(getUInts)},
+        {"name": "Message.setUIntElement x12", "ops": perSecond(setUInts)},
+        {"name": "SerialPacket header", "ops": perSecond(lambda: decodeSerialHeader(header))},
+        {"name": "SerialPacket header set", "ops": perSecond(encodeSerialHeader)},
+        {"name": "TOS_Msg get x8", "ops": perSecond(lambda: getTosMsg(tosMsg))},
+        {"name": "TOS_Msg set x8", "ops": perSecond(lambda: setTosMsg(tosMsg))},
+        {
+            "name": "TOS_Msg set_data x29",
+            "ops": perSecond(lambda: tosMsg.set_data(tosData)),
+        },
+    ]
+
+
+def main():
+    for r in run():
+        if "ops" in r:
+            print("%-36s %14.0f/s" % (r["name"], r["ops"]))
+        else:
+            print("%-36s %14.0f bytes" % (r["name"], r["bytes"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark for SFProtocol over a socketpair: single packet round trips
+through an echoing peer, and one-way throughput of batched writes.
+
+    python -m benchmarks.bench_sfprotocol
+"""
+
+import socket
+from threading import Thread
+
+from tinyos3.packet.IO import IO, IODone
+from tinyos3.packet.SFProtocol import SFProtocol
+
+from .timing import perSecond
+
+SIZES = (10, 28, 100)
+BATCH = 1000
+
+
+class SocketPairIO(IO):
+    def __init__(self, sock):
+        IO.__init__(self)
+        self.sock = sock
+
+    def read_some(self, count):
+        data = self.sock.recv(count)
+        if not data:
+            raise IODone()
+        return data
+
+    def write(self, data):
+        self.sock.sendall(data)
+
+    def flush(self):
+        pass
+
+
+def echo(prot):
+    try:
+        while True:
+            prot.writePackets(prot.readPackets())
+    except (IODone, OSError):
+        pass
+
+
+def run(sizes=SIZES):
+    results = []
+    for size in sizes:
+        (a, b) = socket.socketpair()
+        client = SFProtocol(SocketPairIO(a), SocketPairIO(a))
+        server = SFProtocol(SocketPairIO(b), SocketPairIO(b))
+        thread = Thread(target=echo, args=(server,))
+        thread.daemon = True
+        thread.start()
+
+        packet = bytes(size)
+
+        def roundTrip():
+            client.writePacket(packet)
+            client.readPacket()
+
+        batch = [packet] * BATCH
+
+        def batched():
+            client.writePackets(batch)
+            n = 0
+            while n < BATCH:
+                n += len(client.readPackets())
+
+        results.append(
+            {
+                "size": size,
+                "round_trips": perSecond(roundTrip),
+                "batched_packets": perSecond(batched) * BATCH,
+            }
+        )
+        a.close()
+        b.close()
+        thread.join(1)
+    return results
+
+
+def main():
+    print("%5s %14s %18s" % ("bytes", "round trips/s", "batched packets/s"))
+    for r in run():
+        print("%5d %14.0f %18.0f" % (r["size"], r["round_trips"], r["batched_packets"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Run the benchmark suite and write the results as JSON.
+
+    python -m benchmarks.run -o results.json
+    python -m benchmarks.run --quick --only crc,dispatch
+    python -m benchmarks.run -o new.json --compare old.json
+
+The JSON file holds a "meta" object describing the machine and Python
+build, and a "results" object with the rows returned by each
+benchmark's run(). --compare prints, for every numeric value that is
+in both files, the new value divided by the old one.
+"""
+
+import argparse
+import datetime
+import json
+import platform
+import sys
+import time
+
+from . import timing
+from . import (
+    bench_crc,
+    bench_dispatch,
+    bench_framing,
+    bench_nescapp,
+    bench_packet,
+    bench_sfprotocol,
+)
+
+BENCHMARKS = {
+    "crc": bench_crc,
+    "framing": bench_framing,
+    "packet": bench_packet,
+    "dispatch": bench_dispatch,
+    "sfprotocol": bench_sfprotocol,
+    "nescapp": bench_nescapp,
+}
+
+# Keys that identify a row rather than measure something.
+ROW_KEYS = ("name", "size", "kind", "listeners", "structs")
+
+
+def meta():
+    return {
+        "python": sys.version,
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+
+
+def runAll(names, log=None):
+    results = {}
+    for name in names:
+        if log:
+            log("%s..." % name)
+        start = time.perf_counter()
+        results[name] = BENCHMARKS[name].run()
+        if log:
+            log("%s done in %.1fs" % (name, time.perf_counter() - start))
+    return {"meta": meta(), "results": results}
+
+
+def rowKey(row):
+    return tuple((k, row[k]) for k in ROW_KEYS if k in row)
+
+
+def compare(old, new):
+    """Yield (benchmark, row key, measure, new / old) for shared values."""
+    for (name, rows) in new["results"].items():
+        oldRows = {rowKey(r): r for r in old["results"].get(name, ())}
+        for row in rows:
+            oldRow = oldRows.get(rowKey(row))
+            if oldRow == None:
+                continue
+            for (measure, value) in row.items():
+                if measure in ROW_KEYS or not isinstance(value, (int, float)):
+                    continue
+                before = oldRow.get(measure)
+                if before:
+                    yield (name, rowKey(row), measure, value / before)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the tinyos3 benchmarks")
+    parser.add_argument("-o", "--output", help="write JSON here instead of stdout")
+    parser.add_argument(
+        "--only", help="comma-separated subset of: " + ", ".join(BENCHMARKS)
+    )
+    parser.add_argument(
+        "--quick", action="store_true", help="shorter, noisier measurements"
+    )
+    parser.add_argument("--compare", metavar="OLD", help="JSON results to compare with")
+    args = parser.parse_args()
+
+    names = list(BENCHMARKS)
+    if args.only:
+        names = args.only.split(",")
+        unknown = [n for n in names if n not in BENCHMARKS]
+        if unknown:
+            parser.error("unknown benchmark: %s" % ", ".join(unknown))
+    if args.quick:
+        timing.MIN_TIME = 0.02
+        timing.REPEAT = 2
+
+    def log(msg):
+        print(msg, file=sys.stderr)
+
+    report = runAll(names, log)
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        for (name, key, measure, ratio) in compare(old, report):
+            label = " ".join("%s=%s" % kv for kv in key)
+            print("%-10s %-36s %-18s %6.2fx" % (name, label, measure, ratio), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+"""Timing helpers shared by the benchmarks."""
+
+import timeit
+
+# Minimum time for one measurement, in seconds; run.py --quick lowers it.
+MIN_TIME = 0.2
+REPEAT = 5
+
+
+def perSecond(fn, repeat=None):
+    """Return how many times per second fn() runs, best of repeat runs."""
+    if repeat == None:
+        repeat = REPEAT
+    number = 1
+    while timeit.timeit(fn, number=number) < MIN_TIME:
+        number *= 2
+    return number / min(timeit.repeat(fn, number=number, repeat=repeat))
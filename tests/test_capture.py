@@ -0,0 +1,77 @@
+from unittest.mock import patch
+
+import pytest
+
+from tinyos3.message.MoteIF import MoteIF
+from tinyos3.packet.Capture import (
+    CaptureException,
+    CaptureReader,
+    CaptureWriter,
+    FILE_HEADER,
+)
+
+from test_moteif import serialPacket
+
+
+def test_records_round_trip_across_blocks(tmp_path):
+    path = tmp_path / "cap"
+    w = CaptureWriter(path, blockSize=256)
+    for i in range(100):
+        w.write(bytes((i,)) * (i % 7 + 1), sourceId=i % 3, timestamp=1000 + 10 * i)
+    w.close()
+    assert w.blocks > 1
+
+    with CaptureReader(path) as r:
+        assert len(r) == 100
+        assert len(r.blocks) == w.blocks
+        assert (r.startTime(), r.endTime()) == (1000, 1990)
+        records = [(ts, sid, bytes(data)) for (ts, sid, data) in r]
+        assert records[5] == (1050, 2, b"\x05" * 6)
+        assert [ts for (ts, sid, data) in records] == list(range(1000, 2000, 10))
+        del records
+
+        assert [ts for (ts, sid, data) in r.seek(1555)][:2] == [1560, 1570]
+        assert [ts for (ts, sid, data) in r.records(1200, 1230)] == [1200, 1210, 1220]
+        assert list(r.seek(5000)) == []
+
+
+def test_reader_ignores_a_truncated_block(tmp_path):
+    path = tmp_path / "cap"
+    w = CaptureWriter(path, blockSize=64)
+    for i in range(20):
+        w.write(b"x" * 10, timestamp=i)
+    w.close()
+    data = path.read_bytes()
+    path.write_bytes(data[:-5])
+
+    with CaptureReader(path) as r:
+        assert 0 < len(r) < 20
+        assert [ts for (ts, sid, d) in r] == list(range(len(r)))
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "junk"
+    path.write_bytes(b"\0" * FILE_HEADER.size)
+    with pytest.raises(CaptureException):
+        CaptureReader(path)
+
+
+def test_moteif_tap_captures_raw_packets(tmp_path):
+    path = tmp_path / "cap"
+    with patch("tinyos3.utils.Watcher.Watcher.getInstance", return_value=object()):
+        mote = MoteIF()
+    w = CaptureWriter(path)
+    mote.addTap(w)
+    packets = [serialPacket(1, 0, 0x22, bytes((i,))) for i in range(3)]
+    mote.dispatchPackets("a", packets[:2])
+    mote.dispatchPacket("b", packets[2])
+    mote.removeTap(w)
+    mote.dispatchPacket("b", packets[0])
+    w.close()
+
+    with CaptureReader(path) as r:
+        assert [(sid, bytes(d)) for (ts, sid, d) in r] == [
+            (0, packets[0]),
+            (0, packets[1]),
+            (1, packets[2]),
+        ]
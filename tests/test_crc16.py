@@ -0,0 +1,46 @@
+from tinyos3.packet import crc16
+from tinyos3.packet.SerialProtocol import crc, crcByte
+
+
+def bitwise(data):
+    crc = 0
+    for b in data:
+        crc = crc ^ b << 8
+        for i in range(8):
+            crc = (crc << 1 ^ 0x1021) if crc & 0x8000 else crc << 1
+        crc &= 0xFFFF
+    return crc
+
+
+def test_matches_bitwise_implementation():
+    data = bytes(range(256)) * 2
+    expected = bitwise(data)
+    assert crc16.compute(data) == expected
+    assert crc16.compute(bytearray(data)) == expected
+    assert crc16.compute(memoryview(data)) == expected
+    assert crc16.compute(list(data)) == expected
+    assert crc(data) == expected
+
+
+def test_incremental_update():
+    data = b"\x44\x01\x00\xff\xff\x00\x01\x02\x22\x06\x7e\x7d"
+    value = crc16.update(crc16.update(0, data[:5]), data[5:])
+    assert value == crc16.compute(data)
+
+    value = 0
+    for b in data:
+        value = crcByte(value, b)
+    assert value == crc16.compute(data)
+
+
+def test_verify_many():
+    body = b"\x45\x00\x01\x02\x03"
+    value = crc16.compute(body)
+    good = body + bytes([value & 0xFF, value >> 8])
+    bad = body + bytes([value & 0xFF, (value >> 8) ^ 1])
+    assert crc16.verify_many([good, bad, b"\x00", memoryview(good)]) == [
+        True,
+        False,
+        False,
+        True,
+    ]
@@ -0,0 +1,72 @@
+import io
+import os
+import signal
+import threading
+
+from tinyos3.packet import HDLC
+from tinyos3.packet.FlightRecorder import (
+    CRC_ERROR,
+    IN,
+    NO_ACK,
+    OK,
+    OUT,
+    FlightRecorder,
+    installSignalHandler,
+)
+from tinyos3.packet.SerialProtocol import P_ACK, P_PACKET_NO_ACK, SerialProtocol
+
+from test_serialprotocol import openProtocol
+
+
+def test_keeps_only_the_last_frames():
+    recorder = FlightRecorder(3)
+    for i in range(5):
+        recorder.received(bytes([i]))
+    assert [e[3] for e in recorder.snapshot()] == [b"\x02", b"\x03", b"\x04"]
+
+
+def test_records_good_and_bad_frames_in():
+    prot = SerialProtocol(None, None)
+    good = bytes(HDLC.encode(bytes((P_PACKET_NO_ACK, 0, 1))))
+    bad = bytearray(good)
+    bad[3] ^= 0xFF
+    prot.feed(good + bytes(bad))
+
+    entries = prot.recorder.snapshot()
+    assert [(e[1], e[2]) for e in entries] == [(IN, OK), (IN, CRC_ERROR)]
+    assert entries[0][3] == bytes((P_PACKET_NO_ACK, 0, 1))
+
+
+def test_records_missing_acks():
+    (io_, prot) = openProtocol()
+
+    def mote():
+        frame = HDLC.Deframer().feed(io_.tx.get(timeout=1))[0]
+        io_.rx.put(bytes(HDLC.encode(bytes([P_ACK, frame[1]]))))
+
+    try:
+        t = threading.Thread(target=mote)
+        t.start()
+        prot.writePacket(b"\x00\x01")
+        t.join()
+        prot.writePacket(b"\x00\x02")
+    finally:
+        io_.rx.put(None)
+
+    outcomes = [(e[1], e[2]) for e in prot.recorder.snapshot()]
+    assert outcomes == [(OUT, OK), (IN, OK), (OUT, NO_ACK)]
+
+
+def test_dump_on_signal():
+    recorder = FlightRecorder(name="test")
+    recorder.sent(b"\x7e\x45\x7e")
+    out = io.StringIO()
+    previous = signal.getsignal(signal.SIGUSR1)
+    try:
+        installSignalHandler(signal.SIGUSR1, out)
+        os.kill(os.getpid(), signal.SIGUSR1)
+    finally:
+        signal.signal(signal.SIGUSR1, previous)
+    text = out.getvalue()
+    assert "flight recorder test: last 1 frames" in text
+    assert "> ok       7e 45 7e" in text
@@ -0,0 +1,101 @@
+from tinyos3.packet import HDLC, crc16
+from tinyos3.packet.HDLC import Deframer, FramingException, unescape
+from tinyos3.packet.SerialProtocol import SerialProtocol
+
+
+def stuff(raw):
+    out = bytearray()
+    for b in raw:
+        if b in (0x7E, 0x7D):
+            out += bytes([0x7D, b ^ 0x20])
+        else:
+            out.append(b)
+    return bytes(out)
+
+
+def encode(body):
+    value = crc16.compute(body)
+    return b"\x7e" + stuff(body + bytes([value & 0xFF, value >> 8])) + b"\x7e"
+
+
+FRAMES = [b"\x45\x00\xff\xff\x00\x01\x02", b"\x45\x00\x7e\x7d\x7e", b"\x43\x01"]
+
+
+def test_unescape():
+    assert unescape(b"\x01\x7d\x5e\x02\x7d\x5d") == b"\x01\x7e\x02\x7d"
+    assert unescape(b"\x01\x02") == b"\x01\x02"
+
+
+def test_many_frames_in_one_chunk():
+    d = Deframer()
+    assert d.feed(b"".join(encode(f) for f in FRAMES)) == FRAMES
+    assert d.frames == 3
+
+
+def test_frames_split_across_chunks():
+    stream = b"".join(encode(f) for f in FRAMES)
+    d = Deframer()
+    out = []
+    for i in range(len(stream)):
+        out += d.feed(stream[i : i + 1])
+    assert out == FRAMES
+
+
+def test_leading_garbage_and_bad_crc_are_dropped():
+    bad = bytearray(encode(FRAMES[0]))
+    bad[3] ^= 0x01
+    d = Deframer()
+    assert d.feed(b"\x01\x02\x03" + bytes(bad) + encode(FRAMES[1])) == [FRAMES[1]]
+    assert d.skipped == 3
+    assert d.crcErrors == 1
+
+
+def test_oversize_frame_loses_sync():
+    d = Deframer(mtu=16)
+    assert d.feed(b"\x7e" + b"\x01" * 64) == []
+    assert d.oversize == 1
+    assert not d.inSync
+    assert d.feed(encode(FRAMES[0])) == [FRAMES[0]]
+
+
+class ChunkIO:
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.written = []
+
+    def read_some(self, count):
+        return self.chunks.pop(0)
+
+    def write(self, data):
+        self.written.append(data)
+
+
+def test_serial_protocol_reads_all_frames_from_one_read():
+    io = ChunkIO([b"".join(encode(f) for f in FRAMES)])
+    prot = SerialProtocol(io, io)
+    assert [prot.readFramedPacket() for f in FRAMES] == FRAMES
+    assert io.chunks == []
+
+
+def test_encode_matches_reference_encoder():
+    for body in FRAMES + [bytes(range(256))]:
+        assert bytes(HDLC.encode(body[:2], body[2:])) == encode(body)
+        assert HDLC.escape(body) == stuff(body)
+
+
+def test_encode_round_trip():
+    payload = bytes(range(120, 130)) * 20
+    frame = HDLC.encode(b"\x45\x00", payload)
+    assert Deframer(mtu=1024).feed(frame) == [b"\x45\x00" + payload]
+    assert unescape(HDLC.escape(payload)) == payload
+
+
+def test_unescape_other_escaped_bytes_and_errors():
+    assert unescape(b"\x7d\x21\x7d\x5e") == b"\x01\x7e"
+    for bad in (b"\x01\x7d", b"\x7d\x7d\x5d"):
+        try:
+            unescape(bad)
+        except FramingException:
+            pass
+        else:
+            assert False, bad
@@ -0,0 +1,90 @@
+import threading
+import time
+from unittest.mock import patch
+
+from tinyos3.message.ListenerPool import ListenerPool
+from tinyos3.message.MoteIF import MoteIF
+from tinyos3.packet.PacketQueue import DROP_NEWEST
+
+from test_moteif import Msg22, serialPacket
+
+
+class Collector:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.seen = []
+        self.threads = set()
+        self.done = threading.Event()
+        self.expect = None
+
+    def receive(self, source, msg):
+        time.sleep(self.delay)
+        self.threads.add(threading.current_thread().name)
+        self.seen.append(msg.dataGet()[0])
+        if len(self.seen) == self.expect:
+            self.done.set()
+
+
+def test_pool_keeps_per_listener_order_off_the_reader_thread():
+    pool = ListenerPool(workers=4)
+    with patch("tinyos3.utils.Watcher.Watcher.getInstance", return_value=object()):
+        mote = MoteIF(listenerPool=pool)
+    listeners = [Collector() for i in range(3)]
+    for l in listeners:
+        l.expect = 200
+        mote.addListener(l, Msg22)
+
+    for i in range(200):
+        mote.dispatchPacket(None, serialPacket(1, 0, 0x22, bytes((i,))))
+
+    for l in listeners:
+        assert l.done.wait(5)
+        assert l.seen == list(range(200))
+        assert threading.current_thread().name not in l.threads
+
+    stats = pool.stats()
+    assert stats[listeners[0]]["delivered"] == 200
+    assert stats[listeners[0]]["depth"] == 0
+    assert stats[listeners[0]]["callbackMax"] >= 0.0
+    pool.shutdown()
+
+
+def test_slow_listener_overflows_its_own_queue_only():
+    pool = ListenerPool(workers=2, capacity=4, overflow=DROP_NEWEST)
+    gate = threading.Event()
+    slow = Collector()
+    slow.receive = lambda source, msg: gate.wait(5) and slow.seen.append(msg)
+    fast = Collector()
+    fast.expect = 4
+
+    for i in range(10):
+        pool.submit(slow, None, Msg22(bytes((i,))))
+    for i in range(4):
+        pool.submit(fast, None, Msg22(bytes((i,))))
+
+    assert fast.done.wait(5)
+    gate.set()
+    pool.shutdown()
+    stats = pool.stats()
+    assert stats[fast]["dropped"] == 0
+    assert stats[slow]["dropped"] >= 5
+    assert stats[slow]["maxDepth"] == 4
+    assert [m.dataGet()[0] for m in slow.seen] == sorted(m.dataGet()[0] for m in slow.seen)
+
+
+def test_failing_listener_keeps_draining():
+    class Failing:
+        def __init__(self):
+            self.calls = 0
+
+        def receive(self, source, msg):
+            self.calls += 1
+            raise RuntimeError("boom")
+
+    pool = ListenerPool(workers=1)
+    l = Failing()
+    for i in range(5):
+        pool.submit(l, None, Msg22(b"\x00"))
+    pool.shutdown()
+    assert l.calls == 5
+    assert pool.stats()[l]["errors"] == 5
@@ -0,0 +1,45 @@
+import pytest
+
+from tinyos3.message.Message import Message, MessageException
+from tinyos3.message.SerialPacket import SerialPacket
+from tinyos3.packet.avrmote import TOS_Msg
+
+
+def test_fields_are_read_and_written_in_place():
+    data = bytes(range(8))
+    msg = Message(data)
+    assert msg.getUIntElement(8, 16, True) == 0x0102
+    assert msg.getUIntElement(8, 16, False) == 0x0201
+    assert msg.dataGet() is data
+
+    msg.setSIntElement(0, 8, -1, False)
+    buffer = msg.dataGet()
+    assert isinstance(buffer, bytearray)
+    msg.setUIntElement(32, 32, 0xDEADBEEF, True)
+    msg.setFloatElement(0, 32, 1.5, False)
+    assert msg.dataGet() is buffer
+    assert msg.getFloatElement(0, 32, False) == 1.5
+    assert buffer[4:8] == b"\xde\xad\xbe\xef"
+
+
+def test_bad_fields_raise_message_exception():
+    msg = Message(bytes(4))
+    with pytest.raises(MessageException, match="bad offset"):
+        msg.getUIntElement(16, 32, True)
+    with pytest.raises(MessageException, match="bit fields"):
+        msg.setUIntElement(4, 8, 0, True)
+    with pytest.raises(MessageException, match="Bad length"):
+        msg.getUIntElement(0, 24, True)
+
+
+def test_generated_messages():
+    pkt = SerialPacket(None)
+    pkt.set_header_dest(0xFFFF)
+    pkt.set_header_type(0x22)
+    assert bytes(pkt.dataGet()) == b"\xff\xff\x00\x00\x00\x00\x22"
+
+    msg = TOS_Msg()
+    msg.set_addr(0x1234)
+    msg.set_data([1, -2, 3])
+    assert msg.get_addr() == 0x1234
+    assert msg.get_data()[:3] == [1, -2, 3]
@@ -0,0 +1,99 @@
+import threading
+import urllib.request
+from unittest.mock import patch
+
+from tinyos3.message.MoteIF import MoteIF
+from tinyos3.packet import HDLC
+from tinyos3.packet.Metrics import Histogram, metricName, prometheusText
+from tinyos3.packet.SerialProtocol import P_ACK, P_PACKET_NO_ACK, SerialProtocol
+
+from test_moteif import Msg22, Recorder, serialPacket
+from test_serialprotocol import openProtocol
+
+
+def test_histogram_buckets_are_cumulative():
+    h = Histogram((0.1, 1.0))
+    for v in (0.05, 0.1, 0.5, 5.0):
+        h.observe(v)
+    snap = h.snapshot()
+    assert snap["count"] == 4
+    assert snap["sum"] == 5.65
+    assert snap["buckets"] == [(0.1, 2), (1.0, 3), (float("inf"), 4)]
+
+
+def test_serial_protocol_counts_frames_and_errors():
+    prot = SerialProtocol(None, None)
+    good = bytes(HDLC.encode(bytes((P_PACKET_NO_ACK, 0, 1))))
+    bad = bytearray(good)
+    bad[3] ^= 0xFF
+    prot.feed(b"junk" + good + bytes(bad) + good)
+
+    stats = prot.stats()
+    assert stats["bytesIn"] == 4 + 3 * len(good)
+    assert stats["framesIn"] == 2
+    assert stats["crcErrors"] == 1
+    assert stats["skippedBytes"] == 4
+    assert stats["rxQueueDepth"] == 0
+
+
+def test_ack_rtt_and_missing_acks():
+    (io, prot) = openProtocol()
+
+    def mote():
+        frame = HDLC.Deframer().feed(io.tx.get(timeout=1))[0]
+        io.rx.put(bytes(HDLC.encode(bytes([P_ACK, frame[1]]))))
+
+    try:
+        t = threading.Thread(target=mote)
+        t.start()
+        prot.writePacket(b"\x00\x01")
+        t.join()
+        prot.writePacket(b"\x00\x02")
+
+        stats = prot.stats()
+        assert stats["framesOut"] == 2
+        assert stats["noAcks"] == 1
+        assert stats["ackRttSeconds"]["count"] == 1
+    finally:
+        io.rx.put(None)
+
+
+def test_retransmits_count_attempts_after_the_first():
+    (io, prot) = openProtocol()
+    try:
+        with patch("tinyos3.packet.SerialProtocol.TX_ATTEMPT_LIMIT", 2):
+            prot.writePacket(b"\x00\x01")
+        stats = prot.stats()
+        assert (stats["framesOut"], stats["noAcks"], stats["retransmits"]) == (2, 2, 1)
+    finally:
+        io.rx.put(None)
+
+
+def test_moteif_stats_and_prometheus_endpoint():
+    with patch("tinyos3.utils.Watcher.Watcher.getInstance", return_value=object()):
+        mote = MoteIF()
+    mote.addListener(Recorder(), Msg22)
+    mote.dispatchPackets("src", [serialPacket(1, 0, 0x22, b"\x01")] * 3 + [b"\x00"])
+
+    stats = mote.stats()["sources"]["src"]
+    assert stats["packetsDispatched"] == 4
+    assert stats["shortPackets"] == 1
+    assert stats["dispatchSeconds"]["count"] == 1
+
+    server = mote.serveMetrics(port=0)
+    try:
+        url = "http://127.0.0.1:%d/metrics" % server.port
+        text = urllib.request.urlopen(url, timeout=2).read().decode()
+    finally:
+        server.close()
+    assert "# TYPE tinyos_packets_dispatched_total counter" in text
+    assert 'tinyos_packets_dispatched_total{source="src"} 4' in text
+    assert 'tinyos_dispatch_seconds_bucket{source="src",le="+Inf"} 1' in text
+    assert 'tinyos_dispatch_seconds_count{source="src"} 1' in text
+
+
+def test_prometheus_text_names_and_gauges():
+    assert metricName("rxQueueMaxDepth") == "tinyos_rx_queue_max_depth"
+    text = prometheusText({'a"b': {"rxQueueDepth": 3, "inSync": True}})
+    assert "# TYPE tinyos_rx_queue_depth gauge" in text
+    assert 'tinyos_in_sync{source="a\\"b"} 1' in text
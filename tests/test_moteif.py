@@ -1,3 +1,4 @@
+import threading
 from unittest.mock import patch
 
 from tinyos3.message.MoteIF import MoteIF
@@ -33,3 +34,87 @@ def test_send_msg_constructs_correct_packet():
     expected = bytes([Serial.TOS_SERIAL_ACTIVE_MESSAGE_ID]) + header + payload
 
     assert dest.packet == expected
+
+
+class Msg22(Message):
+    def __init__(self, data=b"", addr=None, gid=None, base_offset=0, data_length=None):
+        Message.__init__(self, data, addr, gid, base_offset, data_length)
+
+    @classmethod
+    def get_amType(cls):
+        return 0x22
+
+
+class Recorder:
+    def __init__(self):
+        self.msgs = []
+
+    def receive(self, source, msg):
+        self.msgs.append(msg)
+
+
+def serialPacket(src, group, amType, payload):
+    pkt = SerialPacket(None)
+    pkt.set_header_dest(0xFFFF)
+    pkt.set_header_src(src)
+    pkt.set_header_group(group)
+    pkt.set_header_type(amType)
+    pkt.set_header_length(len(payload))
+    return b"\x00" + pkt.dataGet() + payload
+
+
+def test_dispatch_decodes_once_per_message_class():
+    with patch("tinyos3.utils.Watcher.Watcher.getInstance", return_value=object()):
+        mote = MoteIF()
+    listeners = [Recorder() for i in range(3)]
+    for l in listeners:
+        mote.addListener(l, Msg22)
+
+    mote.dispatchPacket(None, serialPacket(5, 0x7D, 0x22, b"\x01\x02"))
+    mote.dispatchPacket(None, serialPacket(5, 0x7D, 0x23, b"\x03"))
+    mote.dispatchPacket(None, b"\x00\x01")
+
+    msgs = [l.msgs for l in listeners]
+    assert all(len(m) == 1 for m in msgs)
+    assert msgs[0][0] is msgs[1][0] is msgs[2][0]
+    assert msgs[0][0].dataGet() == b"\x01\x02"
+    assert msgs[0][0].getAddr() == 5
+    assert msgs[0][0].getGid() == 0x7D
+
+    mote.removeListener(listeners[0])
+    mote.dispatchPacket(None, serialPacket(5, 0x7D, 0x22, b"\x04"))
+    assert [len(l.msgs) for l in listeners] == [1, 2, 2]
+
+
+class BatchRecorder:
+    def __init__(self):
+        self.batches = []
+        self.ready = threading.Event()
+
+    def receive_batch(self, source, msgs):
+        self.batches.append((source, [m.dataGet()[0] for m in msgs]))
+        self.ready.set()
+
+
+def test_batch_listener_gets_full_batches_then_times_out():
+    with patch("tinyos3.utils.Watcher.Watcher.getInstance", return_value=object()):
+        mote = MoteIF()
+    batch = BatchRecorder()
+    single = Recorder()
+    mote.addBatchListener(batch, Msg22, maxCount=4, maxDelay=100)
+    mote.addListener(single, Msg22)
+
+    packets = [serialPacket(1, 0, 0x22, bytes((i,))) for i in range(10)]
+    mote.dispatchPackets("src", packets)
+    assert batch.batches == [("src", [0, 1, 2, 3]), ("src", [4, 5, 6, 7])]
+    assert len(single.msgs) == 10
+
+    batch.ready.clear()
+    assert batch.ready.wait(2)
+    assert batch.batches[-1] == ("src", [8, 9])
+
+    mote.dispatchPacket("a", packets[0])
+    mote.dispatchPacket("b", packets[1])
+    mote.removeListener(batch)
+    assert batch.batches[-2:] == [("a", [0]), ("b", [1])]
+    mote.batches.close()
@@ -0,0 +1,42 @@
+import threading
+
+from tinyos3.packet.PacketQueue import BLOCK, DROP_NEWEST, DROP_OLDEST, PacketQueue
+
+
+def test_drop_oldest_keeps_latest_packets():
+    q = PacketQueue(3, DROP_OLDEST)
+    for i in range(5):
+        assert q.put(i)
+    assert q.getMany(10) == [2, 3, 4]
+    assert q.dropped == 2
+    assert q.maxDepth == 3
+
+
+def test_drop_newest_keeps_earliest_packets():
+    q = PacketQueue(3, DROP_NEWEST)
+    assert [q.put(i) for i in range(5)] == [True, True, True, False, False]
+    assert q.getMany(10) == [0, 1, 2]
+    assert q.dropped == 2
+
+
+def test_block_waits_for_room():
+    q = PacketQueue(1, BLOCK)
+    q.put(0)
+    assert not q.put(1, timeout=0.01)
+    assert q.dropped == 1
+
+    t = threading.Thread(target=q.put, args=(2,))
+    t.start()
+    assert q.get(timeout=1) == 0
+    t.join(1)
+    assert q.get(timeout=1) == 2
+
+
+def test_get_returns_buffered_packet_and_none_when_closed():
+    q = PacketQueue(4)
+    q.put(b"\x01")
+    assert q.get() == b"\x01"
+    assert q.get(timeout=0.01) is None
+    q.close()
+    assert q.get() is None
+    assert q.getMany(4) == []
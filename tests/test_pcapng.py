@@ -0,0 +1,105 @@
+import struct
+
+from tinyos3.packet import HDLC
+from tinyos3.packet.Capture import CaptureWriter
+from tinyos3.packet.Pcapng import LINKTYPE_USER0, PcapngWriter, convert
+from tinyos3.packet.SFSource import SFSource
+from tinyos3.packet.SerialProtocol import P_PACKET_NO_ACK, SerialProtocol
+
+
+def readBlocks(path):
+    data = open(path, "rb").read()
+    blocks = []
+    pos = 0
+    while pos < len(data):
+        (btype, total) = struct.unpack_from("<II", data, pos)
+        assert total % 4 == 0
+        assert struct.unpack_from("<I", data, pos + total - 4)[0] == total
+        blocks.append((btype, data[pos + 8 : pos + total - 4]))
+        pos += total
+    return blocks
+
+
+def packets(blocks):
+    result = []
+    for (btype, body) in blocks:
+        if btype == 6:
+            (iface, high, low, caplen, origlen) = struct.unpack_from("<IIIII", body)
+            result.append((iface, (high << 32) | low, body[20 : 20 + caplen]))
+    return result
+
+
+def test_writer_produces_valid_blocks(tmp_path):
+    path = tmp_path / "out.pcapng"
+    with PcapngWriter(path, blockSize=100) as w:
+        w("a", b"\x01\x02\x03")
+        w("b", b"\x04")
+        w("a", b"\x05\x06\x07\x08\x09")
+        w.write(b"", timestamp=(5 << 32) + 7)
+
+    blocks = readBlocks(path)
+    assert blocks[0][0] == 0x0A0D0D0A
+    assert struct.unpack_from("<I", blocks[0][1])[0] == 0x1A2B3C4D
+    idbs = [body for (btype, body) in blocks if btype == 1]
+    assert len(idbs) == 2
+    assert struct.unpack_from("<H", idbs[0])[0] == LINKTYPE_USER0
+    assert b"\x09\x00\x01\x00\x09" in idbs[0]
+
+    pkts = packets(blocks)
+    assert [(i, d) for (i, t, d) in pkts] == [
+        (0, b"\x01\x02\x03"),
+        (1, b"\x04"),
+        (0, b"\x05\x06\x07\x08\x09"),
+        (0, b""),
+    ]
+    assert pkts[-1][1] == (5 << 32) + 7
+
+
+def test_convert_capture(tmp_path):
+    cap = tmp_path / "cap"
+    w = CaptureWriter(cap, blockSize=64)
+    for i in range(20):
+        w.write(bytes((i,)), sourceId=i % 2, timestamp=w.monoStart + i * 1000)
+    w.close()
+
+    assert convert(cap, tmp_path / "out.pcapng") == 20
+    blocks = readBlocks(tmp_path / "out.pcapng")
+    assert sum(1 for (btype, body) in blocks if btype == 1) == 2
+    pkts = packets(blocks)
+    assert [d for (i, t, d) in pkts] == [bytes((i,)) for i in range(20)]
+    assert [i for (i, t, d) in pkts][:3] == [0, 1, 0]
+    assert pkts[0][1] == w.wallStart
+    assert pkts[19][1] - pkts[0][1] == 19000
+
+
+def test_serial_protocol_frame_tap(tmp_path):
+    path = tmp_path / "out.pcapng"
+    prot = SerialProtocol(None, None)
+    with PcapngWriter(path) as w:
+        prot.addTap(w)
+        prot.feed(HDLC.encode(bytes((P_PACKET_NO_ACK,)), b"\x00\x11\x22"))
+        prot.removeTap(w)
+        prot.feed(HDLC.encode(bytes((P_PACKET_NO_ACK,)), b"\x00\x33"))
+    assert [d for (i, t, d) in packets(readBlocks(path))] == [
+        bytes((P_PACKET_NO_ACK,)) + b"\x00\x11\x22"
+    ]
+
+
+def test_interfaces_are_named_after_sources(tmp_path):
+    path = tmp_path / "out.pcapng"
+    named = SFSource(None, "localhost:9002")
+    named.name = "sf@localhost:9002"
+    unnamed = SFSource(None, "localhost:9003")
+    prot = SerialProtocol(None, None)
+    try:
+        with PcapngWriter(path) as w:
+            for source in (named, unnamed, prot):
+                w(source, b"\x00")
+    finally:
+        named.io.socket.close()
+        unnamed.io.socket.close()
+    idbs = [body for (btype, body) in readBlocks(path) if btype == 1]
+    assert b"sf@localhost:9002" in idbs[0]
+    assert b"SFSource localhost:9003" in idbs[1]
+    assert b"SerialProtocol" in idbs[2]
+    assert not any(b" object at " in idb for idb in idbs)
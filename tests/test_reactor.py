@@ -0,0 +1,99 @@
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from tinyos3.packet import HDLC
+from tinyos3.packet.Reactor import Reactor
+from tinyos3.packet.SerialProtocol import P_ACK, P_PACKET_ACK, P_PACKET_NO_ACK
+from tinyos3.packet.SerialSource import SerialSource
+from tinyos3.packet.SFSource import SFSource
+
+
+class Collector:
+    def __init__(self):
+        self.packets = []
+        self.threads = set()
+
+    def dispatchPacket(self, source, packet):
+        self.threads.add(threading.current_thread())
+        self.packets.append(bytes(packet))
+
+
+def sfServer(packets, hold=1):
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+
+    def serve():
+        (sock, addr) = server.accept()
+        sock.sendall(b"U ")
+        sock.recv(2)
+        sock.sendall(b"".join(bytes((len(p),)) + p for p in packets))
+        time.sleep(hold)
+        sock.close()
+        server.close()
+
+    threading.Thread(target=serve, daemon=True).start()
+    return server.getsockname()[1]
+
+
+def waitFor(condition, timeout=2):
+    end = time.time() + timeout
+    while not condition():
+        assert time.time() < end
+        time.sleep(0.01)
+
+
+def test_one_thread_serves_many_sf_sources():
+    collector = Collector()
+    reactor = Reactor()
+    reactor.start()
+    try:
+        for i in range(4):
+            port = sfServer([bytes([i, j]) for j in range(10)])
+            reactor.add(SFSource(collector, "127.0.0.1:%d" % port))
+        waitFor(lambda: len(collector.packets) == 40)
+    finally:
+        reactor.cancel()
+
+    assert sorted(collector.packets) == [bytes([i, j]) for i in range(4) for j in range(10)]
+    assert len(collector.threads) == 1
+
+
+def test_sf_burst_is_delivered_while_connection_is_open():
+    collector = Collector()
+    reactor = Reactor()
+    reactor.start()
+    packets = [bytes([i % 256]) * 100 for i in range(500)]
+    try:
+        port = sfServer(packets, hold=10)
+        reactor.add(SFSource(collector, "127.0.0.1:%d" % port))
+        # well before the server closes the connection
+        waitFor(lambda: len(collector.packets) == 500)
+    finally:
+        reactor.cancel()
+    assert collector.packets == packets
+
+
+@pytest.mark.skipif(not hasattr(os, "openpty"), reason="needs a pty")
+def test_serial_source_is_deframed_and_acked_inline():
+    (master, slave) = os.openpty()
+    collector = Collector()
+    reactor = Reactor()
+    reactor.start()
+    try:
+        reactor.add(SerialSource(collector, "%s:115200" % os.ttyname(slave)))
+        os.write(master, bytes(HDLC.encode(bytes([P_PACKET_NO_ACK, 0, 1, 2]))))
+        os.write(master, bytes(HDLC.encode(bytes([P_PACKET_ACK, 9, 0, 3]))))
+        waitFor(lambda: len(collector.packets) == 2)
+        assert collector.packets == [b"\x00\x01\x02", b"\x00\x03"]
+        ack = HDLC.Deframer().feed(os.read(master, 64))
+        assert ack == [bytes([P_ACK, 9])]
+    finally:
+        reactor.cancel()
+        time.sleep(0.05)
+        os.close(master)
+        os.close(slave)
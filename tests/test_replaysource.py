@@ -0,0 +1,91 @@
+import time
+from unittest.mock import patch
+
+import pytest
+
+from tinyos3.message.MoteIF import MoteIF
+from tinyos3.packet.Capture import CaptureWriter
+from tinyos3.packet.PacketSource import PacketSourceException
+from tinyos3.packet.ReplaySource import ReplaySource
+
+from test_moteif import Msg22, Recorder, serialPacket
+
+
+class Collector:
+    def __init__(self):
+        self.packets = []
+
+    def dispatchPackets(self, source, packets):
+        self.packets.extend(packets)
+
+
+def capture(path, count, spacing):
+    w = CaptureWriter(path, blockSize=128)
+    for i in range(count):
+        w.write(serialPacket(1, 0, 0x22, bytes((i % 256,))), timestamp=i * spacing)
+    w.close()
+
+
+def test_parses_speed():
+    assert ReplaySource(None, "/tmp/x").speed == 1.0
+    assert ReplaySource(None, "/tmp/x:2.5").speed == 2.5
+    assert ReplaySource(None, "/tmp/x:max").speed == None
+    assert ReplaySource(None, "/tmp/a:b").path == "/tmp/a:b"
+    with pytest.raises(PacketSourceException):
+        ReplaySource(None, "/tmp/x:0")
+
+
+def test_replays_everything_at_max_speed(tmp_path):
+    capture(tmp_path / "cap", 1000, 1000000000)
+    dispatcher = Collector()
+    src = ReplaySource(dispatcher, "%s:max" % (tmp_path / "cap"))
+    src()
+    assert [p[8] for p in dispatcher.packets] == [i % 256 for i in range(1000)]
+    assert src.packets == 1000
+    assert src.rate() > 0
+
+
+def test_keeps_the_recorded_pace(tmp_path):
+    # 5 packets 40 ms apart, played twice as fast: about 80 ms.
+    capture(tmp_path / "cap", 5, 40000000)
+    dispatcher = Collector()
+    src = ReplaySource(dispatcher, "%s:2" % (tmp_path / "cap"))
+    start = time.monotonic()
+    src()
+    elapsed = time.monotonic() - start
+    assert len(dispatcher.packets) == 5
+    assert 0.07 < elapsed < 1.0
+
+
+def test_read_packets_times_out_before_the_next_record(tmp_path):
+    capture(tmp_path / "cap", 2, 300000000)
+    src = ReplaySource(Collector(), str(tmp_path / "cap"))
+    src.open()
+    try:
+        assert len(src.readPackets(timeout=0.05)) == 1
+        assert src.readPackets(timeout=0.05) == []
+        assert len(src.readPackets(timeout=1)) == 1
+    finally:
+        src.close()
+
+
+def test_moteif_file_source(tmp_path):
+    capture(tmp_path / "cap", 50, 0)
+    with patch("tinyos3.utils.Watcher.Watcher.getInstance", return_value=object()):
+        mote = MoteIF()
+    recorder = Recorder()
+    mote.addListener(recorder, Msg22)
+    src = mote.addSource("file@%s:max" % (tmp_path / "cap"))
+    assert isinstance(src, ReplaySource)
+    deadline = time.monotonic() + 5
+    while src.endTime == None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert [m.dataGet()[0] for m in recorder.msgs] == list(range(50))
+    while src in mote.sources and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert mote.sources == []
+    assert mote.dispatchMetrics == {}
+    stats = mote.stats()["sources"]["file@%s:max" % (tmp_path / "cap")]
+    assert stats["finished"]
+    assert stats["packetsReplayed"] == 50
+    assert stats["packetsDispatched"] == 50
@@ -0,0 +1,119 @@
+import socket
+import time
+
+from tinyos3.packet.SerialForwarder import SFClient, SerialForwarder
+
+
+class DummySource:
+    def __init__(self):
+        self.written = []
+        self.cancelled = False
+
+    def writePacket(self, packet):
+        self.written.append(packet)
+
+    def cancel(self):
+        self.cancelled = True
+
+
+def waitFor(condition, timeout=2):
+    end = time.time() + timeout
+    while not condition():
+        assert time.time() < end
+        time.sleep(0.01)
+
+
+def connect(sf, handshake=True):
+    sock = socket.create_connection(("127.0.0.1", sf.port))
+    sock.settimeout(2)
+    assert sock.recv(2) == b"U "
+    if handshake:
+        sock.sendall(b"U ")
+    return sock
+
+
+def recvExactly(sock, n):
+    data = b""
+    while len(data) < n:
+        data += sock.recv(n - len(data))
+    return data
+
+
+def test_fan_out_and_merged_writes():
+    sf = SerialForwarder(port=0, host="127.0.0.1")
+    sf.source = DummySource()
+    sf.start()
+    try:
+        clients = [connect(sf) for i in range(5)]
+        waitFor(lambda: sum(c.ready for c in sf.clients.values()) == 5)
+
+        sf.dispatchPacket(None, b"\x00\x01\x02")
+        sf.dispatchPacket(None, b"\x00\x03")
+        for c in clients:
+            assert recvExactly(c, 7) == b"\x03\x00\x01\x02\x02\x00\x03"
+
+        clients[0].sendall(b"\x02\xaa\xbb")
+        clients[1].sendall(b"\x01\xcc\x01")
+        clients[1].sendall(b"\xdd")
+        waitFor(lambda: len(sf.source.written) == 3)
+        assert sorted(sf.source.written) == [b"\xaa\xbb", b"\xcc", b"\xdd"]
+    finally:
+        sf.close()
+
+
+def test_slow_client_does_not_stall_others():
+    sf = SerialForwarder(port=0, host="127.0.0.1", maxClientBuffer=1024)
+    sf.source = DummySource()
+    sf.start()
+    try:
+        slow = connect(sf)
+        slow.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024)
+        fast = connect(sf)
+        waitFor(lambda: sum(c.ready for c in sf.clients.values()) == 2)
+        for c in sf.clients.values():
+            c.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+
+        packet = bytes(200)
+        received = 0
+        # Keep the fast client drained, so only the slow one backs up.
+        for i in range(2000):
+            sf.dispatchPacket(None, packet)
+            while received < (i + 1) * 201:
+                received += len(fast.recv(65536))
+        assert received == 2000 * 201
+        waitFor(lambda: sf.dropped() > 0)
+    finally:
+        sf.close()
+
+
+def test_client_buffer_limit_is_per_packet():
+    client = SFClient(None, None, 250)
+    packets = [bytes(99)] * 4
+    client.queue(b"".join(b"\x63" + p for p in packets), packets)
+    assert client.outBytes == 200
+    assert client.dropped == 2
+
+
+def test_close_cancels_the_source():
+    sf = SerialForwarder(port=0, host="127.0.0.1")
+    sf.source = DummySource()
+    sf.start()
+    sf.close()
+    assert sf.source.cancelled
+
+
+def test_disconnect_twice_is_harmless():
+    sf = SerialForwarder(port=0, host="127.0.0.1")
+    sf.source = DummySource()
+    sf.start()
+    try:
+        sock = connect(sf)
+        # once ready, the serve thread is idle in select()
+        waitFor(lambda: sum(c.ready for c in sf.clients.values()) == 1)
+        client = list(sf.clients.values())[0]
+        sf.disconnect(client)
+        sf.disconnect(client)
+        assert sf.clients == {}
+        sock.close()
+    finally:
+        sf.close()
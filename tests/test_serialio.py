@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+
+import pytest
+
+from tinyos3.packet.IO import IODone
+from tinyos3.packet.SerialIO import SerialIO
+from tinyos3.packet.SerialSource import SerialSource
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "openpty"), reason="needs a pty")
+
+
+@pytest.fixture
+def pty():
+    (master, slave) = os.openpty()
+    io = SerialIO(os.ttyname(slave), 115200)
+    io.open()
+    yield (master, io)
+    io.close()
+    os.close(master)
+    os.close(slave)
+
+
+def test_read_some_returns_what_is_available(pty):
+    (master, io) = pty
+    os.write(master, b"\x7e\x45\x00\x7e")
+    time.sleep(0.05)
+    assert io.read_some(64) == b"\x7e\x45\x00\x7e"
+    os.write(master, b"\x01\x02\x03")
+    assert io.read(3) == b"\x01\x02\x03"
+
+
+def test_cancel_wakes_blocked_reader(pty):
+    (master, io) = pty
+    result = []
+
+    def reader():
+        try:
+            io.read_some(64)
+        except IODone:
+            result.append("done")
+
+    t = threading.Thread(target=reader)
+    start = time.time()
+    t.start()
+    time.sleep(0.05)
+    io.cancel()
+    t.join(1)
+    assert result == ["done"]
+    assert time.time() - start < 0.5
+
+
+def test_hung_up_device_finishes_the_reader():
+    (master, slave) = os.openpty()
+    io = SerialIO(os.ttyname(slave), 115200)
+    io.open()
+    try:
+        os.close(master)
+        start = time.time()
+        with pytest.raises(IODone):
+            io.read_some(64)
+        assert time.time() - start < 0.5
+    finally:
+        io.close()
+        os.close(slave)
+
+
+def test_wake_is_drained(pty):
+    (master, io) = pty
+    io.waker.wake()
+    threading.Timer(0.2, os.write, (master, b"\x01")).start()
+    assert io.read_some(64) == b"\x01"
+    assert io.selector.select(0) == []
+
+
+class Collector:
+    def __init__(self):
+        self.packets = []
+
+    def dispatchPackets(self, source, packets):
+        self.packets.extend(packets)
+
+
+def test_serial_source_finishes_when_the_device_hangs_up():
+    (master, slave) = os.openpty()
+    source = SerialSource(Collector(), "%s:115200" % os.ttyname(slave))
+    t = threading.Thread(target=source)
+    t.start()
+    try:
+        source.semaphore.acquire()
+        source.semaphore.release()
+        os.close(master)
+        t.join(2)
+        assert not t.is_alive()
+    finally:
+        source.cancel()
+        t.join(1)
+        os.close(slave)
@@ -0,0 +1,84 @@
+import queue
+import threading
+import time
+
+from tinyos3.packet import HDLC
+from tinyos3.packet.IO import IO, IODone
+from tinyos3.packet.SerialProtocol import (
+    P_ACK,
+    P_PACKET_ACK,
+    P_PACKET_NO_ACK,
+    SerialProtocol,
+)
+
+
+class QueueIO(IO):
+    """In-memory IO: chunks put on rx are read, written bytes go to tx."""
+
+    def __init__(self):
+        IO.__init__(self)
+        self.rx = queue.Queue()
+        self.tx = queue.Queue()
+
+    def read_some(self, count):
+        chunk = self.rx.get()
+        if chunk == None:
+            raise IODone()
+        return chunk
+
+    def write(self, data):
+        self.tx.put(bytes(data))
+
+
+def openProtocol():
+    io = QueueIO()
+    prot = SerialProtocol(io, io)
+    prot.open()
+    return (io, prot)
+
+
+def test_rx_thread_acks_without_blocking():
+    (io, prot) = openProtocol()
+    try:
+        start = time.time()
+        for sn in range(5):
+            io.rx.put(bytes(HDLC.encode(bytes([P_PACKET_ACK, sn, 0]), b"\x01\x02")))
+        acks = [HDLC.Deframer().feed(io.tx.get(timeout=1)) for sn in range(5)]
+
+        assert acks == [[bytes([P_ACK, sn])] for sn in range(5)]
+        assert time.time() - start < 0.25
+    finally:
+        io.rx.put(None)
+
+
+def test_write_packet_waits_for_its_ack():
+    (io, prot) = openProtocol()
+
+    def mote():
+        frame = HDLC.Deframer().feed(io.tx.get(timeout=1))[0]
+        io.rx.put(bytes(HDLC.encode(bytes([P_ACK, frame[1]]))))
+
+    try:
+        t = threading.Thread(target=mote)
+        t.start()
+        prot.writeFramedPacket(P_PACKET_ACK, 7, b"\x00\x01")
+        t.join()
+    finally:
+        io.rx.put(None)
+
+
+def test_bursts_are_queued_for_batch_reads():
+    (io, prot) = openProtocol()
+    try:
+        burst = b"".join(
+            bytes(HDLC.encode(bytes([P_PACKET_NO_ACK, 0, i]))) for i in range(20)
+        )
+        io.rx.put(burst)
+        packets = []
+        while len(packets) < 20:
+            packets += prot.readPackets(8, timeout=1)
+        assert packets == [bytes([0, i]) for i in range(20)]
+        assert prot.rxQueue.dropped == 0
+    finally:
+        io.rx.put(None)
+    assert prot.readPacket() is None
@@ -1,12 +1,15 @@
 from tinyos3.packet.SFProtocol import SFProtocol
 
 class DummyIO:
-    def __init__(self):
+    def __init__(self, chunks=()):
         self.written = []
+        self.chunks = list(chunks)
     def write(self, data):
         self.written.append(data)
     def flush(self):
         pass
+    def read_some(self, count):
+        return memoryview(self.chunks.pop(0))
 
 
 def test_write_packet_sends_length_as_byte():
@@ -16,5 +19,31 @@ def test_write_packet_sends_length_as_byte():
 
     prot.writePacket(pkt)
 
-    assert io.written[0] == bytes([len(pkt)])
-    assert io.written[1] == pkt
+    assert io.written == [bytes([len(pkt)]) + pkt]
+
+
+def test_write_packets_coalesces_into_one_write():
+    io = DummyIO()
+    prot = SFProtocol(io, io)
+
+    prot.writePackets([b"\x01", b"\x02\x03", b""])
+
+    assert io.written == [b"\x01\x01\x02\x02\x03\x00"]
+
+
+def test_read_parses_every_packet_in_a_chunk():
+    io = DummyIO([b"\x01\x0a\x02\x0b\x0c\x03\x0d", b"\x0e\x0f\x00"])
+    prot = SFProtocol(io, io)
+
+    assert prot.readPacket() == b"\x0a"
+    assert io.chunks == [b"\x0e\x0f\x00"]
+    assert prot.readPackets() == [b"\x0b\x0c"]
+    assert prot.readPackets() == [b"\x0d\x0e\x0f", b""]
+
+
+def test_read_packets_takes_at_most_max_n():
+    io = DummyIO([b"\x01\x0a\x01\x0b\x01\x0c"])
+    prot = SFProtocol(io, io)
+
+    assert prot.readPackets(2) == [b"\x0a", b"\x0b"]
+    assert prot.readPackets(2) == [b"\x0c"]
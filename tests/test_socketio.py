@@ -0,0 +1,71 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from tinyos3.packet.IO import IODone
+from tinyos3.packet.SFProtocol import SFProtocol
+from tinyos3.packet.SocketIO import SocketIO
+
+
+@pytest.fixture
+def connection():
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+    io = SocketIO("127.0.0.1", server.getsockname()[1], bufferSize=8)
+    io.open()
+    (peer, addr) = server.accept()
+    yield (peer, io)
+    peer.close()
+    server.close()
+    if io.socket:
+        io.close()
+
+
+def test_reads_are_views_that_stay_valid(connection):
+    (peer, io) = connection
+    peer.sendall(b"abcdefghijklmnopqrstuvwxyz")
+    views = [io.read(3) for i in range(8)]
+    assert isinstance(views[0], memoryview)
+    assert b"".join(views) == b"abcdefghijklmnopqrstuvwx"
+    assert bytes(io.read_some(100)) == b"yz"
+
+
+def test_read_larger_than_buffer(connection):
+    (peer, io) = connection
+    peer.sendall(bytes(range(100)))
+    assert bytes(io.read(100)) == bytes(range(100))
+
+
+def test_cancel_and_close_raise_iodone(connection):
+    (peer, io) = connection
+    result = []
+
+    def reader():
+        try:
+            io.read(1)
+        except IODone:
+            result.append("done")
+
+    t = threading.Thread(target=reader)
+    start = time.time()
+    t.start()
+    time.sleep(0.05)
+    io.cancel()
+    t.join(1)
+    assert result == ["done"]
+    assert time.time() - start < 0.5
+
+
+def test_sf_read_packets_times_out(connection):
+    (peer, io) = connection
+    prot = SFProtocol(io, io)
+    start = time.time()
+    assert prot.readPackets(timeout=0.1) == []
+    assert time.time() - start >= 0.1
+    peer.sendall(b"\x01\x0a\x01")
+    threading.Timer(0.05, peer.sendall, (b"\x0b",)).start()
+    assert prot.readPackets(timeout=1) == [b"\x0a"]
+    assert prot.readPackets(timeout=1) == [b"\x0b"]
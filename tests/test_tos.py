@@ -0,0 +1,232 @@
+import time
+from unittest.mock import patch
+
+import pytest
+
+from tinyos3 import tos
+from tinyos3.packet.HDLC import Deframer
+
+
+class RecordingSource(tos.ByteSource):
+    def __init__(self, framePacing=0):
+        tos.ByteSource.__init__(self, framePacing)
+        self.debug = False
+        self.writes = []
+
+    def _write(self, data):
+        self.writes.append(bytes(data))
+
+
+def test_byte_source_needs_a_write():
+    with pytest.raises(TypeError):
+        tos.ByteSource()
+
+
+def test_batch_goes_out_in_one_write():
+    src = RecordingSource()
+    hdlc = tos.HDLC(src)
+    hdlc.writeMany([([1, 2, 3], 1), ([4, 5], 2)])
+
+    assert len(src.writes) == 1
+    assert Deframer().feed(src.writes[0]) == [
+        bytes([tos.SERIAL_PROTO_PACKET_ACK, 1, 0, 1, 2, 3]),
+        bytes([tos.SERIAL_PROTO_PACKET_ACK, 2, 0, 4, 5]),
+    ]
+    assert src.txFrames == 2
+    assert src.txBytes == len(src.writes[0])
+    assert src.txRate() > 0
+
+
+def test_paced_frames_are_written_separately():
+    src = RecordingSource(framePacing=0.01)
+    with patch("tinyos3.tos.time.sleep") as sleep:
+        src.putFrames([b"\x7e\x01\x7e", [0x7E, 0x02, 0x7E]])
+
+    assert src.writes == [b"\x7e\x01\x7e", b"\x7e\x02\x7e"]
+    assert sleep.call_count == 1
+
+
+class AckingSource(RecordingSource):
+    """Acks every data frame it is sent, except the first copy of those in drop."""
+
+    def __init__(self, drop=()):
+        RecordingSource.__init__(self)
+        self._ts = None
+        self.ackTimeout = 0.01
+        self.timeout = None
+        self.drop = set(drop)
+        self.deframer = Deframer()
+        self.rx = b""
+
+    def _write(self, data):
+        RecordingSource._write(self, data)
+        for frame in self.deframer.feed(data):
+            seqno = frame[1]
+            if seqno in self.drop:
+                self.drop.discard(seqno)
+                continue
+            self.rx += bytes(tos.HDLC_encode(bytes([tos.SERIAL_PROTO_ACK, seqno])))
+
+    def getBytes(self, count):
+        if not self.rx:
+            raise tos.Timeout
+        (data, self.rx) = (self.rx, b"")
+        return data
+
+    def getTimeout(self):
+        return self.timeout
+
+    def setTimeout(self, timeout):
+        self.timeout = timeout
+
+
+def test_windowed_send_keeps_window_full_and_retransmits_losses():
+    src = AckingSource(drop={3})
+    am = tos.SimpleAM(src, window=4)
+    done = []
+    futures = [am.send([i], 0x22, callback=done.append) for i in range(10)]
+
+    assert am.flush(timeout=5)
+    assert all(f.result() for f in futures)
+    assert len(done) == 10
+    # the first write fills the whole window
+    assert len(Deframer().feed(src.writes[0])) == 4
+    # only the lost frame was sent twice
+    assert src.txFrames == 11
+
+
+def test_windowed_send_gives_up_after_retries():
+    src = AckingSource()
+    src._write = RecordingSource._write.__get__(src)
+    am = tos.SimpleAM(src, window=2, retries=1)
+    future = am.send([1], 0x22)
+
+    assert not am.flush()
+    assert future.result() is False
+    assert src.txFrames == 2
+
+
+class Reading(tos.Packet):
+    def __init__(self, packet=None):
+        tos.Packet.__init__(
+            self,
+            [
+                ("id", "int", 2),
+                ("flags", "bint", 3),
+                ("channel", "bint", 5),
+                ("temperature", "sint", 2),
+                ("name", "string", 3),
+                ("data", "blob", None),
+                ("crc", "int", 2),
+            ],
+            packet,
+        )
+
+
+def test_packet_fields_decode_and_encode():
+    raw = [0x12, 0x34, 0xA5, 0xFF, 0x38, 0x61, 0x62, 0x63, 1, 2, 3, 0xBE, 0xEF]
+    r = Reading(raw)
+
+    assert (r.id, r.flags, r.channel, r.temperature) == (0x1234, 5, 5, -200)
+    assert (r.name, r.data, r.crc) == ("abc", [1, 2, 3], 0xBEEF)
+    assert r["channel"] == 5 and r[1] == "flags"
+    assert r.payload()[:5] == raw[:5]
+
+    r.temperature = -1
+    assert Reading(r.payload()).temperature == -1
+
+
+def test_descriptions_may_use_lists_and_are_cached_boundedly():
+    class Pair(tos.Packet):
+        def __init__(self, packet=None, width=1):
+            desc = [["a", "int", width], ["b", "blob", None]]
+            tos.Packet.__init__(self, desc, packet)
+
+    p = Pair(b"\x01\x02\x03")
+    assert (p.a, p.b) == (1, b"\x02\x03")
+    for width in range(1, 2 * tos.LAYOUT_CACHE_SIZE):
+        Pair(bytes(width + 1), width)
+    assert len(tos._layouts) <= tos.LAYOUT_CACHE_SIZE
+
+
+def test_active_message_round_trip():
+    frame = [tos.SERIAL_PROTO_PACKET_NOACK, 0, 0xFF, 0xFF, 0, 1, 3, 0x22, 0x0A, 7, 8, 9]
+    am = tos.ActiveMessage(tos.NoAckDataFrame(frame))
+
+    assert (am.destination, am.source, am.length, am.type) == (0xFFFF, 1, 3, 0x0A)
+    assert am.data == [7, 8, 9]
+    assert am.payload() == frame[2:]
+    assert tos.ActiveMessage(am.payload()) == am
+    assert not hasattr(am, "__dict__")
+    assert tos.ActiveMessage._compiled[0] is tos.ActiveMessage._desc
+
+
+def test_short_packets_decode_what_is_there():
+    ack = tos.AckFrame([tos.SERIAL_PROTO_ACK])
+    assert ack.protocol == tos.SERIAL_PROTO_ACK
+    assert ack.seqno == 0
+    assert not hasattr(ack, "nosuchfield")
+
+
+def test_bytes_and_memoryview_frames():
+    frame = bytes(
+        [tos.SERIAL_PROTO_PACKET_NOACK, 0, 0xFF, 0xFF, 0, 1, 3, 0x22, 0x0A, 7, 8, 9]
+    )
+    am = tos.ActiveMessage(tos.NoAckDataFrame(tos.RawPacket(0, frame)))
+    assert (am.destination, am.source, am.length, am.type) == (0xFFFF, 1, 3, 0x0A)
+    assert am.data == b"\x07\x08\x09"
+    assert am.payload() == frame[2:]
+
+    view = tos.ActiveMessage(tos.NoAckDataFrame(memoryview(frame)))
+    assert view.data.obj is frame
+    assert view.payload() == frame[2:]
+    assert "data: [7, 8, 9]" in str(view)
+
+
+def test_read_returns_views_or_lists():
+    header = bytes([tos.SERIAL_PROTO_PACKET_NOACK, 0, 0, 1, 0, 2, 1, 0, 0x22])
+    frame = bytes(tos.HDLC_encode(header, b"\x05"))
+    for lists in (False, True):
+        src = AckingSource()
+        src.rx = frame
+        am = tos.SimpleAM(src, lists=lists)
+        packet = am.read()
+        assert packet.type == 0x22
+        assert list(packet.data) == [5]
+        assert isinstance(packet.data, list) == lists
+    assert not tos.SimpleAM(AckingSource())._hdlc.lists
+
+
+def test_window_must_fit_the_sequence_numbers():
+    for window in (0, -1, 256):
+        with pytest.raises(ValueError):
+            tos.SimpleAM(RecordingSource(), window=window)
+    assert tos.SimpleAM(RecordingSource(), window=255).window == 255
+
+
+def test_flush_with_zero_timeout_does_not_wait():
+    src = AckingSource()
+    src._write = RecordingSource._write.__get__(src)
+    am = tos.SimpleAM(src)
+    future = am.send([1], 0x22)
+
+    start = time.time()
+    assert not am.flush(timeout=0)
+    assert time.time() - start < 0.5
+    assert future.result() is False
+
+
+def test_seqno_given_up_on_is_not_reused_at_once():
+    src = AckingSource()
+    src._write = RecordingSource._write.__get__(src)
+    am = tos.SimpleAM(src, retries=0)
+    am.send([1], 0x22)
+    assert not am.flush()
+
+    # as if the seqnos had wrapped around
+    del src._write
+    am.seqno = 0
+    future = am.send([2], 0x22)
+    assert am.flush(timeout=1)
+    assert future.result() is True
+    assert am.seqno == 2
@@ -0,0 +1,35 @@
+from tinyos3.tossim.TossimApp import NescApp
+
+DECLS = """<?xml version="1.0" ?>
+<nesc>
+<enums>
+<enum name="AM_SENSEMSG" value="I:10"/>
+<enum name="LIMIT" value="0x20"/>
+</enums>
+<structs>
+<struct name="SenseMsg" size="I:4">
+<field name="reading" bit-offset="I:16" size="I:2"><type-int cname="unsigned int" size="I:2"/></field>
+<field name="id" bit-offset="I:0" size="I:2"><type-int cname="unsigned int" size="I:2"/></field>
+</struct>
+</structs>
+<typedefs><typedef name="SenseMsg_t" value="SenseMsg"/></typedefs>
+<variables>
+<variable name="count" loc="1:/apps/Sense.nc"><component-ref qname="SenseC"/>
+<type-int cname="unsigned char" size="I:1"/></variable>
+</variables>
+</nesc>
+"""
+
+
+def test_loads_nesc_decls(tmp_path):
+    path = tmp_path / "nescDecls.xml"
+    path.write_text(DECLS)
+    app = NescApp("Sense", str(path))
+
+    assert app.enums.AM_SENSEMSG == 10
+    assert app.enums.LIMIT == 0x20
+    msg = app.messages.SenseMsg
+    assert msg.amType == 10
+    assert [f["name"] for f in msg.fields] == ["id", "reading"]
+    assert app.types.SenseMsg_t.size == 4
+    assert app.variables.variables() == ["SenseC.count", "simple", "unsigned char"]
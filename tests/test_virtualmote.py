@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+from tinyos3.packet.SerialProtocol import SerialProtocol
+from tinyos3.packet.VirtualMote import Traffic, VirtualMote
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "openpty"), reason="needs a pty")
+
+serial = pytest.importorskip("serial")
+from tinyos3.packet.SerialIO import SerialIO
+
+
+def connect(mote):
+    # pyserial flushes the input when it opens the port, so only start
+    # sending once it is open.
+    io = SerialIO(mote.open(), 115200)
+    io.open()
+    prot = SerialProtocol(io, io, rxCapacity=1000)
+    prot.open()
+    mote.start()
+    return (io, prot)
+
+
+def close(mote, io, prot):
+    prot.shutdown()
+    io.cancel()
+    io.close()
+    mote.stop()
+
+
+def test_uplink_traffic_reaches_serial_protocol():
+    traffic = Traffic(amType=0x33, rate=None, size=20, src=7, count=500)
+    mote = VirtualMote([traffic])
+    (io, prot) = connect(mote)
+    try:
+        packets = []
+        while len(packets) < 500:
+            packet = prot.readPacket(timeout=5)
+            assert packet != None
+            packets.append(packet)
+        # dispatch byte, then dest, src, length, group, type
+        assert packets[0][:8] == bytes((0, 0xFF, 0xFF, 0, 7, 20, 0x22, 0x33))
+        assert [int.from_bytes(p[8:12], "big") for p in packets] == list(range(500))
+        assert prot.deframer.crcErrors == 0
+    finally:
+        close(mote, io, prot)
+
+
+def test_acks_and_drops_downlink_frames():
+    mote = VirtualMote(ackProbability=1.0)
+    (io, prot) = connect(mote)
+    try:
+        for i in range(5):
+            prot.writePacket(bytes((0, i)))
+        assert mote.acked == 5
+        assert [bytes(p) for p in mote.received] == [bytes((0, i)) for i in range(5)]
+
+        mote.ackProbability = 0.0
+        prot.writePacket(b"\x00\x09")
+        assert mote.dropped == 1
+        assert mote.acked == 5
+    finally:
+        close(mote, io, prot)
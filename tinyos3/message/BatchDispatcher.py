@@ -0,0 +1,157 @@
+"""
+Batched delivery for MoteIF listeners that implement
+receive_batch(source, msgs).
+
+Messages for a batch listener are collected per listener and handed
+over once maxCount of them are pending, or maxDelay milliseconds after
+the first of them arrived, whichever comes first. A batch only ever
+holds messages from one source. Count-triggered batches are delivered
+on the thread that dispatched the packets; time-triggered ones from a
+background flusher thread. Either way a listener receives its batches
+in order and one at a time.
+"""
+
+import logging
+import time
+from threading import Condition, Lock, Thread
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_COUNT = 64
+DEFAULT_MAX_DELAY = 50
+
+
+class Batcher:
+    def __init__(self, listener, maxCount, maxDelay):
+        self.listener = listener
+        self.maxCount = maxCount
+        self.maxDelay = maxDelay / 1000.0
+        self.source = None
+        self.pending = []
+        self.deadline = None
+        # Held while taking and delivering a batch, so that batches are
+        # delivered in the order they were taken.
+        self.deliverLock = Lock()
+
+        self.batches = 0
+        self.delivered = 0
+
+
+class BatchDispatcher:
+    def __init__(self):
+        self.batchers = {}
+        self.cv = Condition()
+        self.thread = None
+        self.closed = False
+
+    def __contains__(self, listener):
+        return listener in self.batchers
+
+    def add(self, listener, maxCount=DEFAULT_MAX_COUNT, maxDelay=DEFAULT_MAX_DELAY):
+        if maxCount < 1:
+            raise ValueError("maxCount must be at least 1")
+        with self.cv:
+            self.batchers[listener] = Batcher(listener, maxCount, maxDelay)
+            if self.thread == None:
+                self.thread = Thread(target=self.flusher, name="BatchDispatcher")
+                self.thread.daemon = True
+                self.thread.start()
+
+    def remove(self, listener):
+        """Deliver whatever is pending for listener and forget it."""
+        b = self.batchers.get(listener)
+        if b == None:
+            return
+        self.flush(b)
+        with self.cv:
+            self.batchers.pop(listener, None)
+
+    def deliver(self, listener, source, msgs):
+        """Add msgs, all from source, to listener's pending batch."""
+        b = self.batchers[listener]
+        while True:
+            with self.cv:
+                if not b.pending or b.source is source:
+                    self._append(b, source, msgs)
+                    full = len(b.pending) >= b.maxCount
+                    break
+            self.flush(b)
+        if full:
+            self.flush(b, partial=False)
+
+    def _append(self, b, source, msgs):
+        if not b.pending:
+            b.source = source
+            b.deadline = time.monotonic() + b.maxDelay
+            self.cv.notify()
+        b.pending.extend(msgs)
+
+    def flush(self, b, partial=True):
+        """
+        Deliver b's pending messages in batches of at most maxCount. If
+        partial is False, a final short batch is left pending.
+        """
+        with b.deliverLock:
+            with self.cv:
+                batch = b.pending
+                n = len(batch)
+                if not partial:
+                    n -= n % b.maxCount
+                source = b.source
+                b.pending = batch[n:]
+                batch = batch[:n]
+                if b.pending:
+                    b.deadline = time.monotonic() + b.maxDelay
+                    self.cv.notify()
+                else:
+                    b.deadline = None
+            for i in range(0, n, b.maxCount):
+                chunk = batch[i : i + b.maxCount]
+                b.batches += 1
+                b.delivered += len(chunk)
+                try:
+                    b.listener.receive_batch(source, chunk)
+                except Exception:
+                    logger.exception("batch listener %r failed", b.listener)
+
+    def flushAll(self):
+        for b in list(self.batchers.values()):
+            self.flush(b)
+
+    def flusher(self):
+        cv = self.cv
+        while True:
+            with cv:
+                while True:
+                    if self.closed:
+                        return
+                    now = time.monotonic()
+                    deadlines = [
+                        b.deadline for b in self.batchers.values() if b.pending
+                    ]
+                    due = [
+                        b
+                        for b in self.batchers.values()
+                        if b.pending and b.deadline <= now
+                    ]
+                    if due:
+                        break
+                    cv.wait(min(deadlines) - now if deadlines else None)
+            for b in due:
+                self.flush(b)
+
+    def close(self):
+        self.flushAll()
+        with self.cv:
+            self.closed = True
+            self.cv.notify_all()
+
+    def stats(self):
+        return {
+            b.listener: {
+                "pending": len(b.pending),
+                "batches": b.batches,
+                "delivered": b.delivered,
+            }
+            for b in list(self.batchers.values())
+        }
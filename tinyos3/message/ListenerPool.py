@@ -0,0 +1,136 @@
+"""
+Run MoteIF listener callbacks off the source's reader thread.
+
+Every listener gets its own bounded FIFO of (source, msg) pairs, and at
+most one task per listener is scheduled on the executor at any time, so
+a listener sees its messages in order and never concurrently with
+itself, while different listeners run in parallel. A slow listener only
+fills its own queue; what happens then is up to the overflow policy
+(see tinyos3.packet.PacketQueue).
+
+The executor may be any concurrent.futures executor that runs
+callables in this process; by default a ThreadPoolExecutor is created.
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from tinyos3.packet.PacketQueue import PacketQueue, DROP_OLDEST
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+DEFAULT_CAPACITY = 1024
+# Messages handled per task before yielding the worker to other listeners.
+DRAIN_BATCH = 32
+
+
+class ListenerQueue:
+    def __init__(self, listener, capacity, overflow):
+        self.listener = listener
+        self.queue = PacketQueue(capacity, overflow)
+        self.scheduled = False
+
+        self.delivered = 0
+        self.errors = 0
+        self.callbackTime = 0.0
+        self.callbackMax = 0.0
+        self.waitMax = 0.0
+
+    def stats(self):
+        return {
+            "depth": len(self.queue),
+            "maxDepth": self.queue.maxDepth,
+            "dropped": self.queue.dropped,
+            "delivered": self.delivered,
+            "errors": self.errors,
+            "callbackMean": self.callbackTime / self.delivered if self.delivered else 0.0,
+            "callbackMax": self.callbackMax,
+            "waitMax": self.waitMax,
+        }
+
+
+class ListenerPool:
+    def __init__(
+        self,
+        executor=None,
+        workers=DEFAULT_WORKERS,
+        capacity=DEFAULT_CAPACITY,
+        overflow=DROP_OLDEST,
+    ):
+        if executor == None:
+            executor = ThreadPoolExecutor(workers, thread_name_prefix="ListenerPool")
+        self.executor = executor
+        self.capacity = capacity
+        self.overflow = overflow
+        self.queues = {}
+        self.lock = Lock()
+
+    def submit(self, listener, source, msg):
+        """Queue a receive(source, msg) call for listener."""
+        q = self.queues.get(listener)
+        if q == None:
+            with self.lock:
+                q = self.queues.setdefault(
+                    listener, ListenerQueue(listener, self.capacity, self.overflow)
+                )
+
+        if not q.queue.put((source, msg, time.perf_counter())):
+            return
+        with self.lock:
+            if q.scheduled:
+                return
+            q.scheduled = True
+        self.executor.submit(self.drain, q)
+
+    def drain(self, q):
+        listener = q.listener
+        while True:
+            for i in range(DRAIN_BATCH):
+                item = q.queue.get(0)
+                if item == None:
+                    break
+                (source, msg, queued) = item
+                start = time.perf_counter()
+                try:
+                    listener.receive(source, msg)
+                except Exception:
+                    q.errors += 1
+                    logger.exception("listener %r failed", listener)
+                end = time.perf_counter()
+
+                q.delivered += 1
+                q.callbackTime += end - start
+                if end - start > q.callbackMax:
+                    q.callbackMax = end - start
+                if start - queued > q.waitMax:
+                    q.waitMax = start - queued
+
+            with self.lock:
+                if not len(q.queue):
+                    q.scheduled = False
+                    return
+            # Requeue behind other listeners' tasks; once the executor
+            # is shutting down, finish the queue here instead.
+            try:
+                self.executor.submit(self.drain, q)
+                return
+            except RuntimeError:
+                pass
+
+    def remove(self, listener):
+        """Forget listener; anything still queued for it is discarded."""
+        with self.lock:
+            q = self.queues.pop(listener, None)
+        if q:
+            q.queue.close()
+
+    def stats(self):
+        """Return queue and callback metrics per listener."""
+        return {q.listener: q.stats() for q in list(self.queues.values())}
+
+    def shutdown(self, wait=True):
+        """Stop accepting work; with wait, return once every queue is drained."""
+        self.executor.shutdown(wait)
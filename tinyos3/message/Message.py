@@ -32,12 +32,32 @@
 import struct
 
 
+def _structs(codes):
+    """Return {(length in bits, big-endian): Struct} for codes."""
+    return {
+        (8 * struct.calcsize("<" + code), big): struct.Struct((">" if big else "<") + code)
+        for code in codes
+        for big in (False, True)
+    }
+
+
+_UINT = _structs("BHL")
+_SINT = _structs("bhl")
+_FLOAT = _structs("f")
+
+
 class MessageException(Exception):
     def __init__(self, *args):
         self.args = args
 
 
 class Message:
+    """
+    The message bytes are read in place with precompiled Structs. The
+    first write turns data into a bytearray, which later writes update
+    in place.
+    """
+
     def __init__(self, data, addr=None, gid=None, base_offset=0, data_length=None):
         self.addr = addr
         self.gid = gid
@@ -47,7 +67,7 @@ class Message:
             self.data_length = data_length
 
             if data == None or len(data) != data_length:
-                self.data = b"\x00" * data_length
+                self.data = bytearray(data_length)
 
         else:
             self.data_length = len(data)
@@ -55,6 +75,10 @@ class Message:
             self.am_type = 0
 
     def dataGet(self):
+        """
+        Return the message bytes: the object passed in until the first
+        set*Element() call, a bytearray from then on.
+        """
         return self.data
 
     def baseOffset(self):
@@ -88,126 +112,43 @@ class Message:
         if length & 7 != 0:
             raise MessageException("Cannot deal with bit fields")
 
-    def getUIntElement(self, offset, length, endian):
-        self.checkBounds(offset, length)
-
-        byteOffset = offset >> 3
-        bitOffset = offset & 7
-
-        if endian:
-            endian = ">"
-        else:
-            endian = "<"
-
-        temp = self.data[byteOffset : byteOffset + (length >> 3)]
-
-        if length == 8:
-            return struct.unpack("B", temp)[0]
-        elif length == 16:
-            return struct.unpack(endian + "H", temp)[0]
-        elif length == 32:
-            return struct.unpack(endian + "L", temp)[0]
-        else:
-            raise MessageException("Bad length")
-
-    def setUIntElement(self, offset, length, val, endian):
-        self.checkBounds(offset, length)
-
-        byteOffset = offset >> 3
-        bitOffset = offset & 7
-
-        if endian:
-            endian = ">"
-        else:
-            endian = "<"
-
-        if length == 8:
-            temp = struct.pack(endian + "B", val)
-        elif length == 16:
-            temp = struct.pack(endian + "H", val)
-        elif length == 32:
-            temp = struct.pack(endian + "L", val)
-        else:
-            raise MessageException("Bad length")
-
-        self.data = (
-            self.data[:byteOffset] + temp + self.data[byteOffset + (length >> 3) :]
-        )
-
-    def getSIntElement(self, offset, length, endian):
+    def _badField(self, offset, length):
         self.checkBounds(offset, length)
-
-        byteOffset = offset >> 3
-        bitOffset = offset & 7
-
-        if endian:
-            endian = ">"
-        else:
-            endian = "<"
-
-        temp = self.data[byteOffset : byteOffset + (length >> 3)]
-
-        if length == 8:
-            return struct.unpack(endian + "b", temp)[0]
-        elif length == 16:
-            return struct.unpack(endian + "h", temp)[0]
-        elif length == 32:
-            return struct.unpack(endian + "l", temp)[0]
-        else:
-            raise MessageException("Bad length")
-
-    def setSIntElement(self, offset, length, val, endian):
-        self.checkBounds(offset, length)
-
-        byteOffset = offset >> 3
-        bitOffset = offset & 7
-
-        if endian:
-            endian = ">"
-        else:
-            endian = "<"
-
-        if length == 8:
-            temp = struct.pack(endian + "b", val)
-        elif length == 16:
-            temp = struct.pack(endian + "h", val)
-        elif length == 32:
-            temp = struct.pack(endian + "l", val)
-        else:
-            raise MessageException("Bad length")
-
-        self.data = (
-            self.data[:byteOffset] + temp + self.data[byteOffset + (length >> 3) :]
-        )
-
-    def getFloatElement(self, offset, length, endian):
-        self.checkBounds(offset, length)
-
-        byteOffset = offset >> 3
-        bitOffset = offset & 7
-
-        if endian:
-            endian = ">"
-        else:
-            endian = "<"
-
-        temp = self.data[byteOffset : byteOffset + (length >> 3)]
-
-        return struct.unpack(endian + "f", temp)[0]
-
-    def setFloatElement(self, offset, length, value, endian):
-        self.checkBounds(offset, length)
-
-        byteOffset = offset >> 3
-        bitOffset = offset & 7
-
-        if endian:
-            endian = ">"
-        else:
-            endian = "<"
-
-        temp = struct.pack(endian + "f", value)
-
-        self.data = (
-            self.data[:byteOffset] + temp + self.data[byteOffset + (length >> 3) :]
-        )
+        raise MessageException("Bad length")
+
+    def _struct(self, table, offset, length, endian):
+        """Return the Struct from table for the field, or raise MessageException."""
+        s = table.get((length, True if endian else False))
+        if s == None or offset & 7 or not 0 <= offset <= self.data_length * 8 - length:
+            self._badField(offset, length)
+        return s
+
+    def _writable(self):
+        data = self.data
+        if type(data) != bytearray:
+            data = self.data = bytearray(data)
+        return data
+
+    def getUIntElement(self, offset, length, endian=False):
+        s = self._struct(_UINT, offset, length, endian)
+        return s.unpack_from(self.data, offset >> 3)[0]
+
+    def setUIntElement(self, offset, length, val, endian=False):
+        s = self._struct(_UINT, offset, length, endian)
+        s.pack_into(self._writable(), offset >> 3, val)
+
+    def getSIntElement(self, offset, length, endian=False):
+        s = self._struct(_SINT, offset, length, endian)
+        return s.unpack_from(self.data, offset >> 3)[0]
+
+    def setSIntElement(self, offset, length, val, endian=False):
+        s = self._struct(_SINT, offset, length, endian)
+        s.pack_into(self._writable(), offset >> 3, val)
+
+    def getFloatElement(self, offset, length, endian=False):
+        s = self._struct(_FLOAT, offset, length, endian)
+        return s.unpack_from(self.data, offset >> 3)[0]
+
+    def setFloatElement(self, offset, length, value, endian=False):
+        s = self._struct(_FLOAT, offset, length, endian)
+        s.pack_into(self._writable(), offset >> 3, value)
@@ -32,12 +32,22 @@
 import logging
 import os
 import re
+import struct
+import time
 from tinyos3.utils.Watcher import Watcher
 
 from tinyos3.packet.Serial import Serial
+from tinyos3.message.BatchDispatcher import (
+    BatchDispatcher,
+    DEFAULT_MAX_COUNT,
+    DEFAULT_MAX_DELAY,
+)
 from tinyos3.message.SerialPacket import SerialPacket
+from tinyos3.packet.PacketDispatcher import buildDispatchTable
+from tinyos3.packet.Metrics import Histogram, MetricsServer, DEFAULT_PORT
 import tinyos3.packet.PacketDispatcher
 import tinyos3.packet.PacketSource
+import tinyos3.packet.ReplaySource
 import tinyos3.packet.SFSource
 
 try:
@@ -47,15 +57,38 @@ except:
 
 logger = logging.getLogger(__name__)
 
+# The SERIAL_AMTYPE dispatch byte followed by the SerialPacket header:
+# dest, src, length, group, type (all big-endian).
+SERIAL_HEADER = struct.Struct(">xHHBBB")
+
 
 class MoteIFException(Exception):
     def __init__(self, *args):
         self.args = args
 
 
-class MoteIF:
+class DispatchMetrics:
     def __init__(self):
+        self.packets = 0
+        self.shortPackets = 0
+        self.time = Histogram()
+
+
+class MoteIF:
+    def __init__(self, listenerPool=None):
+        """
+        If listenerPool (a ListenerPool) is given, listeners are called
+        from its workers instead of the source's reader thread.
+        """
         self.listeners = {}
+        self.dispatchTable = {}
+        self.listenerPool = listenerPool
+        self.batches = BatchDispatcher()
+        self.taps = ()
+        self.sources = []
+        self.dispatchMetrics = {}
+        # name: last stats of a source that has finished
+        self.finishedSources = {}
         self.watcher = Watcher.getInstance()
 
     @staticmethod
@@ -69,37 +102,89 @@ class MoteIF:
 
         amTypes = self.listeners[listener]
         amTypes[msgClass.get_amType()] = msgClass
+        self.dispatchTable = buildDispatchTable(self.listeners)
+
+    def addBatchListener(
+        self, listener, msgClass, maxCount=DEFAULT_MAX_COUNT, maxDelay=DEFAULT_MAX_DELAY
+    ):
+        """
+        Register a listener with a receive_batch(source, msgs) method. It
+        gets a batch once maxCount messages are pending or maxDelay
+        milliseconds after the first of them arrived.
+        """
+        if listener not in self.batches:
+            self.batches.add(listener, maxCount, maxDelay)
+        self.addListener(listener, msgClass)
 
     def removeListener(self, listener):
         del self.listeners[listener]
+        self.dispatchTable = buildDispatchTable(self.listeners)
+        self.batches.remove(listener)
+        if self.listenerPool != None:
+            self.listenerPool.remove(listener)
+
+    def addTap(self, tap):
+        """
+        Call tap(source, packet) with every raw packet received, before
+        it is decoded; e.g. a tinyos3.packet.Capture.CaptureWriter.
+        """
+        self.taps = self.taps + (tap,)
+
+    def removeTap(self, tap):
+        self.taps = tuple(t for t in self.taps if t is not tap)
 
     def dispatchPacket(self, source, packet):
-        # try:
-        # print "Packet length: ", len(packet)
-        #            print "Dispatching from MoteIF"
-        #             for i in packet:
-        #                 print ord(i)," ",
-        #             print
-        # Message.py ignores base_offset, so we'll just chop off
-        # the first byte (the SERIAL_AMTYPE) here.
-        serial_pkt = SerialPacket(packet[1:], data_length=len(packet) - 1)
-
-        data_start = serial_pkt.offset_data(0) + 1
-        data_end = data_start + serial_pkt.get_header_length()
-        data = packet[data_start:data_end]
-        amType = serial_pkt.get_header_type()
-
-        for l in self.listeners:
-            amTypes = self.listeners[l]
-            if amType in amTypes:
-                msgClass = amTypes[amType]
-                msg = msgClass(
-                    data=data,
-                    data_length=len(data),
-                    addr=serial_pkt.get_header_src(),
-                    gid=serial_pkt.get_header_group(),
-                )
-                l.receive(source, msg)
+        self.dispatchPackets(source, (packet,))
+
+    def dispatchPackets(self, source, packets):
+        # Each packet starts with the SERIAL_AMTYPE byte, then the
+        # SerialPacket header. Each message is decoded once per message
+        # class and shared by all listeners registered for it; batch
+        # listeners get everything for them from packets in one call.
+        start = time.perf_counter()
+        short = 0
+        table = self.dispatchTable
+        batches = self.batches
+        pool = self.listenerPool
+        taps = self.taps
+        collected = None
+        for packet in packets:
+            for tap in taps:
+                tap(source, packet)
+            try:
+                (dest, src, length, group, amType) = SERIAL_HEADER.unpack_from(packet)
+            except struct.error:
+                logger.debug("short packet dropped: %d bytes", len(packet))
+                short += 1
+                continue
+
+            entries = table.get(amType)
+            if not entries:
+                continue
+
+            data = packet[SERIAL_HEADER.size : SERIAL_HEADER.size + length]
+            for (msgClass, listeners) in entries:
+                msg = msgClass(data=data, data_length=len(data), addr=src, gid=group)
+                for l in listeners:
+                    if l in batches:
+                        if collected == None:
+                            collected = {}
+                        collected.setdefault(l, []).append(msg)
+                    elif pool != None:
+                        pool.submit(l, source, msg)
+                    else:
+                        l.receive(source, msg)
+
+        if collected:
+            for (l, msgs) in collected.items():
+                batches.deliver(l, source, msgs)
+
+        m = self.dispatchMetrics.get(source)
+        if m == None:
+            m = self.dispatchMetrics.setdefault(source, DispatchMetrics())
+        m.packets += len(packets)
+        m.shortPackets += short
+        m.time.observe(time.perf_counter() - start)
 
     def sendMsg(self, dest, addr, amType, group, msg):
         payload = msg.dataGet()
@@ -114,7 +199,13 @@ class MoteIF:
 
         dest.writePacket(data)
 
-    def addSource(self, name=None):
+    def addSource(self, name=None, reactor=None):
+        """
+        Open a packet source named like MOTECOM (e.g. serial@/dev/ttyUSB0:115200
+        or sf@localhost:9002), or file@/path[:speed|max] to replay a
+        capture file. By default the source reads in its own
+        thread; if reactor is given, the reactor's thread reads it.
+        """
         if name == None:
             name = os.environ.get("MOTECOM", "sf@localhost:9002")
 
@@ -128,8 +219,17 @@ class MoteIF:
             source = tinyos3.packet.SFSource.SFSource(self, args)
         elif sourceType == "serial" and tinyos3.packet.SerialSource != None:
             source = tinyos3.packet.SerialSource.SerialSource(self, args)
+        elif sourceType == "file":
+            source = tinyos3.packet.ReplaySource.ReplaySource(self, args)
         else:
             raise MoteIFException("bad source")
+
+        source.name = name
+        self.sources.append(source)
+
+        if reactor != None:
+            return reactor.add(source)
+
         source.start()
         # block until the source has started up.
         source.semaphore.acquire()
@@ -137,5 +237,60 @@ class MoteIF:
 
         return source
 
+    def sourceFinished(self, source):
+        """
+        Keep the final counters of a source that has finished, marked
+        finished, and let go of the source itself.
+        """
+        stats = self._sourceStats(source)
+        stats["finished"] = True
+        self.finishedSources[self._sourceName(source)] = stats
+        try:
+            self.sources.remove(source)
+        except ValueError:
+            pass
+        self.dispatchMetrics.pop(source, None)
+
+    def _sourceName(self, source):
+        return getattr(source, "name", None) or str(source)
+
+    def _sourceStats(self, source):
+        stats = {}
+        if hasattr(source, "stats"):
+            stats.update(source.stats())
+        m = self.dispatchMetrics.get(source)
+        if m != None:
+            stats["packetsDispatched"] = m.packets
+            stats["shortPackets"] = m.shortPackets
+            stats["dispatchSeconds"] = m.time.snapshot()
+        stats["finished"] = False
+        return stats
+
+    def stats(self):
+        """
+        Return {"sources": {name: counters}} with each source's own
+        counters plus its dispatch counts and times, and the listener
+        pool and batch listener stats when those are in use. Sources
+        that have finished keep their last counters, with finished set,
+        until a source of the same name replaces them.
+        """
+        sources = dict(self.finishedSources)
+        for source in self.sources + [
+            s for s in list(self.dispatchMetrics) if s not in self.sources
+        ]:
+            sources[self._sourceName(source)] = self._sourceStats(source)
+
+        result = {"sources": sources}
+        if self.listenerPool != None:
+            result["listeners"] = self.listenerPool.stats()
+        if self.batches.batchers:
+            result["batchListeners"] = self.batches.stats()
+        return result
+
+    def serveMetrics(self, port=DEFAULT_PORT, host="127.0.0.1"):
+        """Serve stats() in the Prometheus text format at http://host:port/metrics."""
+        return MetricsServer(self.stats, port, host)
+
     def finishAll(self):
         tinyos3.packet.PacketSource.finishAll()
+        self.batches.close()
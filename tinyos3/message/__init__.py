@@ -28,4 +28,4 @@
 #
 # Author: Geoffrey Mainland <mainland@eecs.harvard.edu>
 #
-__all__ = ["Message", "MoteIF", "SerialPacket"]
+__all__ = ["BatchDispatcher", "ListenerPool", "Message", "MoteIF", "SerialPacket"]
@@ -0,0 +1,215 @@
+"""
+Binary capture files of received packets.
+
+A capture file is a header followed by blocks of records:
+
+    file header    magic, version, wall clock and monotonic clock (ns)
+                   at the time the file was created
+    block header   size of the records in bytes, record count, first and
+                   last timestamp in the block
+    record         timestamp (monotonic ns), source id, length, data
+
+All integers are little-endian. The block headers double as a sparse
+timestamp index: the reader hops from one to the next to find the
+block holding a given time without touching the records in between.
+
+CaptureWriter collects records in memory and writes a block at a time.
+It can be used directly as a MoteIF tap (see MoteIF.addTap). The
+CaptureReader maps the file and returns record data as memoryview
+slices of the mapping.
+"""
+
+import mmap
+import struct
+import time
+from bisect import bisect_right
+from threading import Lock
+
+MAGIC = b"TOSCAP\r\n"
+VERSION = 1
+
+FILE_HEADER = struct.Struct("<8sHHqq")
+BLOCK_HEADER = struct.Struct("<IIqq")
+RECORD_HEADER = struct.Struct("<qHH")
+
+BLOCK_SIZE = 1 << 20
+MAX_RECORD = 0xFFFF
+
+
+class CaptureException(Exception):
+    pass
+
+
+class CaptureWriter:
+    def __init__(self, path, blockSize=BLOCK_SIZE):
+        self.path = path
+        self.blockSize = blockSize
+        self.file = open(path, "wb")
+        self.wallStart = time.time_ns()
+        self.monoStart = time.monotonic_ns()
+        self.file.write(
+            FILE_HEADER.pack(MAGIC, VERSION, 0, self.wallStart, self.monoStart)
+        )
+
+        self.block = bytearray(BLOCK_HEADER.size)
+        self.count = 0
+        self.first = 0
+        self.last = 0
+        self.sourceIds = {}
+        self.lock = Lock()
+
+        self.records = 0
+        self.blocks = 0
+
+    def sourceId(self, source):
+        """Return the small integer id recorded for source."""
+        sid = self.sourceIds.get(source)
+        if sid == None:
+            sid = self.sourceIds.setdefault(source, len(self.sourceIds))
+        return sid
+
+    def write(self, data, sourceId=0, timestamp=None):
+        n = len(data)
+        if n > MAX_RECORD:
+            raise CaptureException("record too long: %d bytes" % n)
+        if timestamp == None:
+            timestamp = time.monotonic_ns()
+
+        with self.lock:
+            block = self.block
+            if not self.count:
+                self.first = timestamp
+            block += RECORD_HEADER.pack(timestamp, sourceId, n)
+            block += data
+            self.count += 1
+            self.last = timestamp
+            if len(block) >= self.blockSize:
+                self._writeBlock()
+
+    # MoteIF tap
+    def __call__(self, source, packet):
+        self.write(packet, self.sourceId(source))
+
+    def _writeBlock(self):
+        if not self.count:
+            return
+        block = self.block
+        BLOCK_HEADER.pack_into(
+            block, 0, len(block) - BLOCK_HEADER.size, self.count, self.first, self.last
+        )
+        self.file.write(block)
+        self.records += self.count
+        self.blocks += 1
+        self.block = bytearray(BLOCK_HEADER.size)
+        self.count = 0
+
+    def flush(self):
+        with self.lock:
+            self._writeBlock()
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file.closed:
+                return
+            self._writeBlock()
+            self.file.close()
+
+
+class CaptureReader:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # mmap refuses empty files
+            self.file.close()
+            raise CaptureException("not a capture file: %s" % path)
+        self.view = memoryview(self.map)
+
+        if len(self.map) < FILE_HEADER.size:
+            self.close()
+            raise CaptureException("not a capture file: %s" % path)
+        (magic, version, flags, self.wallStart, self.monoStart) = FILE_HEADER.unpack_from(
+            self.map
+        )
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise CaptureException("not a capture file: %s" % path)
+
+        self._index()
+
+    def _index(self):
+        # (first timestamp, last timestamp, offset of first record,
+        # end offset, record count) for every complete block
+        self.blocks = []
+        offset = FILE_HEADER.size
+        end = len(self.map)
+        while offset + BLOCK_HEADER.size <= end:
+            (size, count, first, last) = BLOCK_HEADER.unpack_from(self.map, offset)
+            start = offset + BLOCK_HEADER.size
+            if start + size > end:
+                # truncated by a crash; ignore the partial block
+                break
+            self.blocks.append((first, last, start, start + size, count))
+            offset = start + size
+        self.firsts = [b[0] for b in self.blocks]
+
+    def __len__(self):
+        return sum(b[4] for b in self.blocks)
+
+    def __iter__(self):
+        return self.records()
+
+    def startTime(self):
+        return self.blocks[0][0] if self.blocks else None
+
+    def endTime(self):
+        return self.blocks[-1][1] if self.blocks else None
+
+    def records(self, start=None, end=None):
+        """
+        Yield (timestamp, sourceId, data) for the records with start <=
+        timestamp < end, in file order. data is a memoryview into the
+        mapped file.
+        """
+        i = 0
+        if start != None:
+            # the last block starting at or before start may hold it
+            i = max(bisect_right(self.firsts, start) - 1, 0)
+        view = self.view
+        unpack = RECORD_HEADER.unpack_from
+        hsize = RECORD_HEADER.size
+        for (first, last, offset, blockEnd, count) in self.blocks[i:]:
+            if end != None and first >= end:
+                return
+            if start != None and last < start:
+                continue
+            while offset < blockEnd:
+                (ts, sid, n) = unpack(view, offset)
+                offset += hsize
+                if end != None and ts >= end:
+                    return
+                if start == None or ts >= start:
+                    yield (ts, sid, view[offset : offset + n])
+                offset += n
+
+    def seek(self, timestamp):
+        """Iterate from the first record at or after timestamp."""
+        return self.records(start=timestamp)
+
+    def close(self):
+        try:
+            self.view.release()
+            self.map.close()
+        except (AttributeError, BufferError):
+            # record views are still in use; the mapping goes away with them
+            pass
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,119 @@
+"""
+A flight recorder for serial frames: a ring buffer holding the last N
+frames received and sent, with their timestamps and outcomes.
+
+Recording a frame appends one small list to a bounded deque and keeps a
+reference to the frame's bytes; nothing is copied or formatted. The
+text form is built only when asked for, by dump() or by the signal
+handler installed with installSignalHandler(). SerialProtocol records
+received frames as deframed (no flags, escapes or CRC), sent frames as
+written to the wire, and the raw bytes of frames the Deframer rejected.
+
+    installSignalHandler()            # SIGUSR1 dumps every recorder
+    ...
+    source.prot.recorder.dump()       # or on demand
+"""
+
+import signal
+import sys
+import time
+import weakref
+from collections import deque
+
+SIZE = 1024
+
+IN = "<"
+OUT = ">"
+
+OK = "ok"
+CRC_ERROR = "crc"
+ESCAPE_ERROR = "escape"
+OVERSIZE = "oversize"
+NO_ACK = "noack"
+
+_recorders = weakref.WeakSet()
+
+
+class FlightRecorder:
+    def __init__(self, size=SIZE, name=None):
+        self.entries = deque(maxlen=size)
+        self.name = name
+        _recorders.add(self)
+
+    def record(self, direction, data, outcome=OK):
+        """
+        Add a frame. Returns the entry, a [timestamp, direction,
+        outcome, data] list whose outcome may be updated later.
+        """
+        entry = [time.time(), direction, outcome, data]
+        self.entries.append(entry)
+        return entry
+
+    def received(self, data, outcome=OK):
+        return self.record(IN, data, outcome)
+
+    def sent(self, data, outcome=OK):
+        return self.record(OUT, data, outcome)
+
+    def deframed(self, outcome, data):
+        """Deframer callback."""
+        if outcome != OK:
+            data = bytes(data)
+        self.entries.append([time.time(), IN, outcome, data])
+
+    def snapshot(self) -> list:
+        """Return the recorded entries as (timestamp, direction, outcome, data)."""
+        # list() copies the deque without letting other threads in
+        return [tuple(e) for e in list(self.entries)]
+
+    def clear(self):
+        self.entries.clear()
+
+    def format(self) -> str:
+        lines = []
+        for (ts, direction, outcome, data) in self.snapshot():
+            lines.append(
+                "%s.%06d %s %-8s %s"
+                % (
+                    time.strftime("%H:%M:%S", time.localtime(ts)),
+                    int(ts % 1 * 1e6),
+                    direction,
+                    outcome,
+                    " ".join("%02x" % b for b in bytes(data)),
+                )
+            )
+        return "\n".join(lines)
+
+    def dump(self, file=None):
+        """Write the recorded frames, oldest first, to file (stderr by default)."""
+        if file == None:
+            file = sys.stderr
+        print(
+            "flight recorder %s: last %d frames"
+            % (self.name or hex(id(self)), len(self.entries)),
+            file=file,
+        )
+        text = self.format()
+        if text:
+            print(text, file=file)
+        file.flush()
+
+
+def recorders() -> list:
+    """Return every live FlightRecorder."""
+    return list(_recorders)
+
+
+def dumpAll(file=None):
+    for recorder in recorders():
+        recorder.dump(file)
+
+
+def installSignalHandler(signum=None, file=None):
+    """
+    Dump every live recorder when signum (SIGUSR1 by default) arrives.
+    Must be called from the main thread.
+    """
+    if signum == None:
+        signum = signal.SIGUSR1
+    signal.signal(signum, lambda n, frame: dumpAll(file))
@@ -0,0 +1,205 @@
+"""
+HDLC-like framing used by the TEP113 serial protocol.
+
+A frame on the wire looks like
+
+    [FLAG][escaped (payload + CRC16)][FLAG]
+
+where FLAG is 0x7E and any 0x7E or 0x7D byte inside the frame is sent
+as 0x7D followed by the byte XORed with 0x20.
+
+encode() builds a complete frame in a single buffer. The Deframer is
+fed arbitrary chunks of bytes, as returned by a single read from a
+serial port or socket, and returns every complete frame that could be
+assembled from them.
+"""
+
+from . import crc16
+from .Serial import Serial
+
+FLAG_BYTE = Serial.HDLC_FLAG_BYTE
+ESCAPE_BYTE = Serial.HDLC_CTLESC_BYTE
+B_FLAG_BYTE = bytes([FLAG_BYTE])
+B_ESCAPE_BYTE = bytes([ESCAPE_BYTE])
+B_ESCAPED_FLAG = bytes([ESCAPE_BYTE, FLAG_BYTE ^ 0x20])
+B_ESCAPED_ESCAPE = bytes([ESCAPE_BYTE, ESCAPE_BYTE ^ 0x20])
+
+MTU = 256
+MIN_FRAME = 4
+
+
+class FramingException(Exception):
+    pass
+
+
+def escape(data) -> bytes:
+    """Apply HDLC byte stuffing to data."""
+    if FLAG_BYTE not in data and ESCAPE_BYTE not in data:
+        return bytes(data)
+    return (
+        bytes(data)
+        .replace(B_ESCAPE_BYTE, B_ESCAPED_ESCAPE)
+        .replace(B_FLAG_BYTE, B_ESCAPED_FLAG)
+    )
+
+
+def encode(header, payload=b"") -> bytearray:
+    """
+    Return the complete wire frame for header + payload: opening flag,
+    escaped header, payload and CRC, closing flag.
+
+    header and payload may be any bytes-like objects (or lists of ints).
+    """
+    crc = crc16.update(crc16.update(0, header), payload)
+    h = len(header)
+    n = h + len(payload)
+
+    frame = bytearray(n + 4)
+    frame[0] = FLAG_BYTE
+    frame[1 : h + 1] = header
+    frame[h + 1 : n + 1] = payload
+    frame[n + 1] = crc & 0xFF
+    frame[n + 2] = crc >> 8
+    frame[n + 3] = FLAG_BYTE
+
+    # Fast path: nothing needs escaping.
+    if frame.find(B_FLAG_BYTE, 1, n + 3) < 0 and frame.find(B_ESCAPE_BYTE, 1, n + 3) < 0:
+        return frame
+
+    frame[1 : n + 3] = (
+        frame[1 : n + 3]
+        .replace(B_ESCAPE_BYTE, B_ESCAPED_ESCAPE)
+        .replace(B_FLAG_BYTE, B_ESCAPED_FLAG)
+    )
+    return frame
+
+
+def unescape(data) -> bytes:
+    """Undo HDLC byte stuffing on data (without the flag bytes)."""
+    if ESCAPE_BYTE not in data:
+        return bytes(data)
+    if not isinstance(data, (bytes, bytearray)):
+        data = bytes(data)
+
+    # TEP113 only ever escapes the flag and escape bytes themselves.
+    escapes = data.count(B_ESCAPE_BYTE)
+    out = data.replace(B_ESCAPED_FLAG, B_FLAG_BYTE).replace(
+        B_ESCAPED_ESCAPE, B_ESCAPE_BYTE
+    )
+    if len(out) == len(data) - escapes:
+        return bytes(out)
+
+    parts = data.split(B_ESCAPE_BYTE)
+    out = bytearray(parts[0])
+    for i in range(1, len(parts)):
+        part = parts[i]
+        if not part:
+            # escape followed by another escape or by the end of the frame
+            raise FramingException("bad escape sequence")
+        out.append(part[0] ^ 0x20)
+        out += memoryview(part)[1:]
+    return bytes(out)
+
+
+class Deframer:
+    """
+    Incremental HDLC deframer.
+
+    feed() accepts chunks of any size and returns a list of complete
+    frames, unescaped and with the CRC checked and removed. Frames that
+    fail the CRC, are badly escaped, or are longer than mtu are dropped
+    and counted. If recorder is set, recorder(outcome, frame) is called
+    with every frame, good or bad, in the order they were found; the
+    outcomes are "ok", "crc", "escape" and "oversize".
+    """
+
+    def __init__(self, mtu=MTU, minFrame=MIN_FRAME):
+        self.mtu = mtu
+        self.minFrame = minFrame
+        self.inSync = False
+        self.partial = bytearray()
+        self.recorder = None
+
+        self.frames = 0
+        self.crcErrors = 0
+        self.escapeErrors = 0
+        self.oversize = 0
+        self.resyncs = 0
+        self.skipped = 0
+
+    def reset(self):
+        self.inSync = False
+        self.partial = bytearray()
+
+    def feed(self, chunk) -> list:
+        frames = []
+        if not chunk:
+            return frames
+        if not isinstance(chunk, (bytes, bytearray)):
+            chunk = bytes(chunk)
+
+        pos = 0
+        if not self.inSync:
+            pos = chunk.find(B_FLAG_BYTE)
+            if pos < 0:
+                self.skipped += len(chunk)
+                return frames
+            self.skipped += pos
+            self.inSync = True
+            pos += 1
+
+        # Escaped frames are at most twice as long as the unescaped ones.
+        maxEscaped = 2 * (self.mtu + 2)
+        partial = self.partial
+        find = chunk.find
+        while True:
+            end = find(B_FLAG_BYTE, pos)
+            if end < 0:
+                partial += chunk[pos:]
+                if len(partial) > maxEscaped:
+                    self.oversize += 1
+                    self.resyncs += 1
+                    if self.recorder != None:
+                        self.recorder("oversize", partial)
+                    self.reset()
+                else:
+                    self.partial = partial
+                return frames
+
+            if partial:
+                partial += chunk[pos:end]
+                raw = partial
+                partial = bytearray()
+            else:
+                raw = chunk[pos:end]
+            pos = end + 1
+
+            if len(raw) < self.minFrame:
+                # back-to-back flags or a runt frame
+                continue
+            try:
+                frame = unescape(raw)
+            except FramingException:
+                self.escapeErrors += 1
+                self.resyncs += 1
+                if self.recorder != None:
+                    self.recorder("escape", raw)
+                continue
+            n = len(frame)
+            if n < self.minFrame:
+                continue
+            if n > self.mtu:
+                self.oversize += 1
+                if self.recorder != None:
+                    self.recorder("oversize", frame)
+                continue
+            if crc16.compute(frame[: n - 2]) != frame[n - 2] | (frame[n - 1] << 8):
+                self.crcErrors += 1
+                if self.recorder != None:
+                    self.recorder("crc", frame)
+                continue
+            self.frames += 1
+            frame = frame[: n - 2]
+            if self.recorder != None:
+                self.recorder("ok", frame)
+            frames.append(frame)
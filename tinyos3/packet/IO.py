@@ -28,19 +28,58 @@
 #
 # Author: Geoffrey Mainland <mainland@eecs.harvard.edu>
 #
+import socket
+
+
 class IODone(Exception):
     pass
 
 
+class Waker:
+    """
+    A socket pair that can be registered with a selector alongside a
+    device, so that a thread blocked in select() can be woken up.
+    """
+
+    def __init__(self):
+        (self.r, self.w) = socket.socketpair()
+        self.r.setblocking(False)
+        self.w.setblocking(False)
+
+    def fileno(self):
+        return self.r.fileno()
+
+    def wake(self):
+        try:
+            self.w.send(b"\0")
+        except OSError:
+            # already pending, or closed
+            pass
+
+    def clear(self):
+        try:
+            while self.r.recv(64):
+                pass
+        except OSError:
+            pass
+
+    def close(self):
+        self.r.close()
+        self.w.close()
+
+
 class IO:
     def __init__(self):
         self.done = False
+        self.waker = None
 
     def isDone(self):
         return self.done
 
     def cancel(self):
         self.done = True
+        if self.waker:
+            self.waker.wake()
 
     def open(self):
         pass
@@ -51,6 +90,16 @@ class IO:
     def read(self, count):
         pass
 
+    def read_some(self, count):
+        return self.read(1)
+
+    def read_available(self, count):
+        """Return up to count bytes that can be read without blocking."""
+        return b""
+
+    def fileno(self):
+        raise OSError("no file descriptor")
+
     def write(self, data):
         pass
 
@@ -0,0 +1,152 @@
+"""
+Counters and latency histograms for packet sources, and a small HTTP
+endpoint that serves them in the Prometheus text format.
+
+The counters themselves are plain integer attributes on the objects
+that do the work (SerialProtocol, SFProtocol, the Deframer, the
+PacketQueues), so recording one costs an attribute increment. Their
+stats() methods collect them into dicts, and MoteIF.stats() gathers
+those per source. A Histogram keeps per-bucket counts and costs one
+bisect per observation.
+
+Nothing is locked, so the values are approximate: most counters are
+only written by one thread (bytesIn and the Deframer's by the RX
+thread, bytesOut by the TX thread, the dispatch counters by the
+source's reader), but framesOut is counted both by the threads that
+write packets and by the RX thread as it sends acks, and an increment
+can occasionally be lost when two of them race.
+"""
+
+import re
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+# seconds, from 10 us to 10 s
+LATENCY_BOUNDS = tuple(m * 10.0**e for e in range(-5, 1) for m in (1, 2.5, 5)) + (
+    10.0,
+)
+
+DEFAULT_PORT = 9464
+PREFIX = "tinyos_"
+
+# stats keys that are levels rather than running totals
+GAUGES = (
+    "rxQueueDepth",
+    "rxQueueMaxDepth",
+    "txQueueDepth",
+    "inSync",
+    "rate",
+    "finished",
+)
+
+
+class Histogram:
+    def __init__(self, bounds=LATENCY_BOUNDS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self):
+        """Return count, sum and cumulative (upper bound, count) buckets."""
+        buckets = []
+        total = 0
+        for (bound, n) in zip(self.bounds + (float("inf"),), self.counts):
+            total += n
+            buckets.append((bound, total))
+        return {"count": self.count, "sum": self.sum, "buckets": buckets}
+
+
+def metricName(key):
+    """Turn a camelCase stats key into a Prometheus metric name."""
+    return PREFIX + re.sub(r"(?<=[a-z0-9])([A-Z])", r"_\1", key).lower()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+def prometheusText(sources) -> str:
+    """
+    Format {source name: {key: value or histogram snapshot}} in the
+    Prometheus text exposition format.
+    """
+    metrics = {}
+    for (source, stats) in sources.items():
+        label = 'source="%s"' % _escape(source)
+        for (key, value) in stats.items():
+            if isinstance(value, bool):
+                value = int(value)
+            if isinstance(value, dict) and "buckets" in value:
+                metrics.setdefault((key, "histogram"), []).append((label, value))
+            elif isinstance(value, (int, float)):
+                kind = "gauge" if key in GAUGES else "counter"
+                metrics.setdefault((key, kind), []).append((label, value))
+
+    lines = []
+    for ((key, kind), samples) in sorted(metrics.items()):
+        name = metricName(key)
+        if kind == "counter":
+            name += "_total"
+        lines.append("# TYPE %s %s" % (name, kind))
+        for (label, value) in samples:
+            if kind != "histogram":
+                lines.append("%s{%s} %s" % (name, label, _number(value)))
+                continue
+            for (bound, count) in value["buckets"]:
+                lines.append(
+                    '%s_bucket{%s,le="%s"} %d' % (name, label, _number(bound), count)
+                )
+            lines.append("%s_sum{%s} %s" % (name, label, _number(value["sum"])))
+            lines.append("%s_count{%s} %d" % (name, label, value["count"]))
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """
+    Serve prometheusText(statsFunction()["sources"]) at /metrics from a
+    background thread. Binds to localhost unless told otherwise.
+    """
+
+    def __init__(self, statsFunction, port=DEFAULT_PORT, host="127.0.0.1"):
+        self.statsFunction = statsFunction
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = prometheusText(server.statsFunction()["sources"]).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.thread = Thread(target=self.httpd.serve_forever, name="MetricsServer")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
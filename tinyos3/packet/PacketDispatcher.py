@@ -30,10 +30,35 @@
 #
 import struct
 
+HEADER = struct.Struct("<HBBB")
+
+
+def buildDispatchTable(listeners):
+    """
+    Turn {listener: {amType: msgClass}} into {amType: ((msgClass,
+    (listener, ...)), ...)}, so that a packet can be decoded once per
+    message class and handed to every listener registered for it.
+    """
+    table = {}
+    for (listener, amTypes) in listeners.items():
+        for (amType, msgClass) in amTypes.items():
+            entries = table.setdefault(amType, [])
+            for (cls, ls) in entries:
+                if cls is msgClass:
+                    ls.append(listener)
+                    break
+            else:
+                entries.append((msgClass, [listener]))
+    return {
+        amType: tuple((cls, tuple(ls)) for (cls, ls) in entries)
+        for (amType, entries) in table.items()
+    }
+
 
 class PacketDispatcher:
     def __init__(self):
         self.listeners = {}
+        self.dispatchTable = {}
 
     def addListener(self, listener, msgClass):
         if listener not in self.listeners:
@@ -41,20 +66,20 @@ class PacketDispatcher:
 
         amTypes = self.listeners[listener]
         amTypes[msgClass.get_amType()] = msgClass
+        self.dispatchTable = buildDispatchTable(self.listeners)
 
     def removeListener(self, listener):
         del self.listeners[listener]
+        self.dispatchTable = buildDispatchTable(self.listeners)
 
     def dispatchPacket(self, source, packet):
-        (addr, amType, group, length) = struct.unpack("<HBBB", packet[0:5])
-        msgData = packet[5:]
-
-        # print (addr, amType, group, length)
-
-        for l in self.listeners:
-            amTypes = self.listeners[l]
-            if amType in amTypes:
-                msgClass = amTypes[amType]
-                msg = msgClass(msgData)
+        (addr, amType, group, length) = HEADER.unpack_from(packet)
+        entries = self.dispatchTable.get(amType)
+        if not entries:
+            return
 
+        msgData = packet[5:]
+        for (msgClass, listeners) in entries:
+            msg = msgClass(msgData)
+            for l in listeners:
                 l.receive(source, msg)
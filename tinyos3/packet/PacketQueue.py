@@ -0,0 +1,107 @@
+"""
+Bounded FIFO of packets handed from a producer thread to consumers.
+
+When the queue is full the overflow policy decides what happens to a
+new packet: DROP_OLDEST discards the oldest queued packet to make room,
+DROP_NEWEST discards the new one, and BLOCK makes the producer wait
+for room. Dropped packets are counted.
+"""
+
+from collections import deque
+from threading import Condition, Lock
+
+DROP_OLDEST = "drop-oldest"
+DROP_NEWEST = "drop-newest"
+BLOCK = "block"
+
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+
+class PacketQueue:
+    def __init__(self, capacity=256, overflow=DROP_OLDEST):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError("unknown overflow policy: %s" % (overflow,))
+
+        self.capacity = capacity
+        self.overflow = overflow
+        self.items = deque()
+        self.closed = False
+
+        lock = Lock()
+        self.notEmpty = Condition(lock)
+        self.notFull = Condition(lock)
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.maxDepth = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def put(self, item, timeout=None) -> bool:
+        """
+        Add item to the queue. Returns False if item itself was dropped
+        (DROP_NEWEST, a BLOCK timeout, or a closed queue).
+        """
+        with self.notEmpty:
+            if self.closed:
+                return False
+            items = self.items
+            if len(items) >= self.capacity:
+                if self.overflow == DROP_OLDEST:
+                    items.popleft()
+                    self.dropped += 1
+                elif self.overflow == DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+                elif not self.notFull.wait_for(
+                    lambda: self.closed or len(items) < self.capacity, timeout
+                ) or self.closed:
+                    self.dropped += 1
+                    return False
+            items.append(item)
+            self.enqueued += 1
+            if len(items) > self.maxDepth:
+                self.maxDepth = len(items)
+            self.notEmpty.notify()
+            return True
+
+    def get(self, timeout=None):
+        """
+        Remove and return the oldest item, waiting up to timeout seconds
+        for one. Returns None on timeout or once the queue is closed and
+        empty.
+        """
+        with self.notEmpty:
+            items = self.items
+            if not items:
+                self.notEmpty.wait_for(lambda: items or self.closed, timeout)
+                if not items:
+                    return None
+            item = items.popleft()
+            self.notFull.notify()
+            return item
+
+    def getMany(self, maxCount, timeout=None) -> list:
+        """
+        Remove and return up to maxCount items. Waits up to timeout
+        seconds for the first one, then takes whatever is queued.
+        """
+        with self.notEmpty:
+            items = self.items
+            if not items:
+                self.notEmpty.wait_for(lambda: items or self.closed, timeout)
+            n = min(maxCount, len(items))
+            batch = [items.popleft() for i in range(n)]
+            if n:
+                self.notFull.notify(n)
+            return batch
+
+    def close(self):
+        """Wake every waiter; later puts are dropped."""
+        with self.notEmpty:
+            self.closed = True
+            self.notEmpty.notify_all()
+            self.notFull.notify_all()
@@ -56,6 +56,10 @@ class PacketSource(ThreadTask):
         self.dispatcher = dispatcher
         self.semaphore = Semaphore(1)
         self.semaphore.acquire()
+        # Set by a Reactor that drives this source instead of its own thread.
+        self.inline = False
+        # The MOTECOM-style name the source was opened with, if any.
+        self.name = None
 
     def __call__(self):
         try:
@@ -72,21 +76,24 @@ class PacketSource(ThreadTask):
         finally:
             self.semaphore.release()
 
+        dispatcher = self.dispatcher
+        dispatchPackets = getattr(dispatcher, "dispatchPackets", None)
         while not self.isDone():
             try:
-                packet = self.readPacket()
+                packets = self.readPackets()
             except IODone:
                 logger.debug("IO finished")
                 break
 
-            if packet:
-                logger.debug("About to run packet dispatcher!")
-                logger.debug("packet=%s", packet)
-                # for i in packet:
-                #     print(i, " ", end=" ")
-                # print()
-
-                self.dispatcher.dispatchPacket(self, packet)
+            if not packets:
+                continue
+            # Hand over everything drained by one read together, so
+            # batch listeners see it as one batch.
+            if dispatchPackets != None:
+                dispatchPackets(self, packets)
+            else:
+                for packet in packets:
+                    dispatcher.dispatchPacket(self, packet)
 
         self.close()
 
@@ -95,6 +102,12 @@ class PacketSource(ThreadTask):
     def start(self):
         runner.start(self)
 
+    def finish(self):
+        sourceFinished = getattr(self.dispatcher, "sourceFinished", None)
+        if sourceFinished != None:
+            sourceFinished(self)
+        ThreadTask.finish(self)
+
     def open(self):
         pass
 
@@ -104,5 +117,29 @@ class PacketSource(ThreadTask):
     def readPacket(self):
         return None
 
+    def readPackets(self, max_n=None, timeout=None):
+        """
+        Return up to max_n packets (as many as one read yields if None),
+        waiting up to timeout seconds for the first one (forever if
+        None). This default reads a single packet with readPacket(),
+        which cannot time out.
+        """
+        packet = self.readPacket()
+        if packet:
+            return [packet]
+        return []
+
+    # Sources that can be driven by a Reactor implement these two.
+    def fileno(self):
+        raise PacketSourceException("source does not support a reactor")
+
+    def readAvailable(self):
+        """Return the packets that can be read without blocking."""
+        return []
+
+    def stats(self):
+        """Return this source's counters (see Metrics.py)."""
+        return {}
+
     def writePacket(self, packet):
         pass
@@ -0,0 +1,223 @@
+"""
+Export serial traffic as pcapng, for Wireshark, tshark, editcap and
+friends.
+
+Packets are written as Enhanced Packet Blocks with nanosecond
+timestamps, link type LINKTYPE_USER0 by default. Each source gets its
+own interface, named after the source. A PcapngWriter formats each
+block once, straight into a large buffer, and full buffers are written
+to the file by a background thread, so a writer can be used as a tap
+on the receive path:
+
+    writer = PcapngWriter("traffic.pcapng")
+    mote.addTap(writer)              # packets as dispatched by MoteIF
+    source.prot.addTap(writer)       # or raw SerialProtocol frames
+
+convert() turns a capture file (see Capture.py) into pcapng:
+
+    python -m tinyos3.packet.Pcapng capture traffic.pcapng
+"""
+
+import argparse
+import struct
+import time
+from threading import Lock, Thread
+
+from .Capture import CaptureReader
+from .PacketQueue import PacketQueue, BLOCK
+
+LINKTYPE_USER0 = 147
+SNAPLEN = 0xFFFF
+
+BLOCK_SIZE = 1 << 20
+# Full buffers waiting for the background writer.
+QUEUE_BLOCKS = 16
+
+SHB = struct.Struct("<IIIHHq")
+IDB_HEADER = struct.Struct("<IIHHI")
+EPB_HEADER = struct.Struct("<IIIIIII")
+TRAILER = struct.Struct("<I")
+
+SHB_TYPE = 0x0A0D0D0A
+IDB_TYPE = 0x00000001
+EPB_TYPE = 0x00000006
+BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+OPT_ENDOFOPT = 0
+IF_NAME = 2
+IF_TSRESOL = 9
+
+# zero bytes to pad n bytes to a multiple of 4, indexed by n & 3
+PADDING = (b"", b"\0\0\0", b"\0\0", b"\0")
+
+
+def _option(code, value):
+    return struct.pack("<HH", code, len(value)) + value + PADDING[len(value) & 3]
+
+
+def _sectionHeader():
+    total = SHB.size + 4
+    return SHB.pack(SHB_TYPE, total, BYTE_ORDER_MAGIC, 1, 0, -1) + TRAILER.pack(total)
+
+
+def _interface(linktype, name):
+    options = b""
+    if name:
+        options += _option(IF_NAME, name.encode("utf-8", "replace"))
+    # timestamps in nanoseconds
+    options += _option(IF_TSRESOL, b"\x09")
+    options += _option(OPT_ENDOFOPT, b"")
+    total = IDB_HEADER.size + len(options) + 4
+    return (
+        IDB_HEADER.pack(IDB_TYPE, total, linktype, 0, SNAPLEN)
+        + options
+        + TRAILER.pack(total)
+    )
+
+
+def _sourceName(source):
+    """
+    Name a source's interface: the MOTECOM-style name MoteIF gives it,
+    else its class and device or address.
+    """
+    if isinstance(source, str):
+        return source
+    name = getattr(source, "name", None)
+    if name:
+        return name
+    kind = type(source).__name__
+    # a PacketSource has io, a SerialProtocol (as a tap) ins
+    io = getattr(source, "io", None) or getattr(source, "ins", None)
+    if getattr(io, "device", None) != None:
+        return "%s %s" % (kind, io.device)
+    if getattr(io, "host", None) != None:
+        return "%s %s:%s" % (kind, io.host, io.port)
+    return kind
+
+
+class PcapngWriter:
+    def __init__(
+        self, path, linktype=LINKTYPE_USER0, blockSize=BLOCK_SIZE, background=True
+    ):
+        self.file = open(path, "wb")
+        self.linktype = linktype
+        self.blockSize = blockSize
+        self.buffer = bytearray(_sectionHeader())
+        self.interfaces = {}
+        self.lock = Lock()
+
+        self.packets = 0
+        self.queue = None
+        self.thread = None
+        if background:
+            self.queue = PacketQueue(QUEUE_BLOCKS, BLOCK)
+            self.thread = Thread(target=self._writer, name="PcapngWriter")
+            self.thread.daemon = True
+            self.thread.start()
+
+    def interface(self, source, name=None):
+        """Return the interface id for source, adding an interface if needed."""
+        iface = self.interfaces.get(source)
+        if iface == None:
+            with self.lock:
+                iface = self.interfaces.get(source)
+                if iface == None:
+                    if name == None and source != None:
+                        name = _sourceName(source)
+                    iface = len(self.interfaces)
+                    self.buffer += _interface(self.linktype, name)
+                    self.interfaces[source] = iface
+        return iface
+
+    def write(self, data, interface=0, timestamp=None):
+        """Add a packet; timestamp is in nanoseconds since the epoch."""
+        if timestamp == None:
+            timestamp = time.time_ns()
+        n = len(data)
+        pad = -n & 3
+        total = EPB_HEADER.size + n + pad + 4
+        with self.lock:
+            buffer = self.buffer
+            buffer += EPB_HEADER.pack(
+                EPB_TYPE, total, interface, timestamp >> 32, timestamp & 0xFFFFFFFF, n, n
+            )
+            buffer += data
+            buffer += PADDING[n & 3]
+            buffer += TRAILER.pack(total)
+            self.packets += 1
+            if len(buffer) >= self.blockSize:
+                self._flushBuffer()
+
+    # MoteIF and SerialProtocol tap
+    def __call__(self, source, packet):
+        iface = self.interfaces.get(source)
+        if iface == None:
+            iface = self.interface(source)
+        self.write(packet, iface)
+
+    def _flushBuffer(self):
+        buffer = self.buffer
+        if not buffer:
+            return
+        self.buffer = bytearray()
+        if self.queue != None:
+            self.queue.put(buffer)
+        else:
+            self.file.write(buffer)
+
+    def _writer(self):
+        while True:
+            buffer = self.queue.get()
+            if buffer == None:
+                break
+            self.file.write(buffer)
+
+    def flush(self):
+        """Hand everything buffered so far to the file."""
+        with self.lock:
+            self._flushBuffer()
+
+    def close(self):
+        with self.lock:
+            if self.file.closed:
+                return
+            self._flushBuffer()
+        if self.thread != None:
+            self.queue.close()
+            self.thread.join()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def convert(capturePath, pcapPath, linktype=LINKTYPE_USER0) -> int:
+    """Write the records of a capture file as pcapng. Returns the packet count."""
+    with CaptureReader(capturePath) as reader:
+        # capture timestamps are monotonic; anchor them to the wall clock
+        offset = reader.wallStart - reader.monoStart
+        with PcapngWriter(pcapPath, linktype, background=False) as writer:
+            interfaces = {}
+            for (ts, sid, data) in reader:
+                iface = interfaces.get(sid)
+                if iface == None:
+                    iface = interfaces[sid] = writer.interface(sid, "source%d" % sid)
+                writer.write(data, iface, ts + offset)
+            return writer.packets
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a capture file to pcapng")
+    parser.add_argument("capture")
+    parser.add_argument("output")
+    parser.add_argument("--linktype", type=int, default=LINKTYPE_USER0)
+    args = parser.parse_args()
+    n = convert(args.capture, args.output, args.linktype)
+    print("%d packets written to %s" % (n, args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Drive many packet sources from one thread.
+
+Normally every PacketSource reads in its own thread (and a SerialSource
+adds a SerialProtocol RX thread on top). A Reactor instead waits on the
+file descriptors of all its sources in a single selector, deframes
+whatever each one has received inline, and hands the packets to the
+source's dispatcher. Writes to a SerialSource still go through its
+SerialProtocol TX thread.
+"""
+
+import logging
+import selectors
+from threading import Lock
+
+from .IO import IODone, Waker
+from .PacketSource import runner
+from .ThreadTask import ThreadTask
+
+logger = logging.getLogger(__name__)
+
+
+class Reactor(ThreadTask):
+    def __init__(self):
+        ThreadTask.__init__(self, runner)
+        self.selector = selectors.DefaultSelector()
+        self.waker = Waker()
+        self.selector.register(self.waker, selectors.EVENT_READ, None)
+        self.sources = {}
+        self.added = []
+        self.addedLock = Lock()
+
+    def add(self, source):
+        """
+        Open source (in the calling thread) and have the reactor read
+        from it from now on.
+        """
+        source.inline = True
+        source.open()
+        with self.addedLock:
+            self.added.append(source)
+        self.waker.wake()
+        return source
+
+    def start(self):
+        runner.start(self)
+
+    def cancel(self):
+        self.done = True
+        self.waker.wake()
+
+    def __call__(self):
+        try:
+            while not self.isDone():
+                for (key, events) in self.selector.select():
+                    if key.data == None:
+                        self.waker.clear()
+                        self.register()
+                    else:
+                        self.service(key.data)
+        finally:
+            for source in list(self.sources):
+                self.remove(source)
+            self.selector.close()
+            self.waker.close()
+            self.finish()
+
+    def register(self):
+        with self.addedLock:
+            added = self.added
+            self.added = []
+        for source in added:
+            fd = source.fileno()
+            self.selector.register(fd, selectors.EVENT_READ, source)
+            self.sources[source] = fd
+            # pick up anything already buffered while the source opened
+            self.service(source)
+
+    def remove(self, source):
+        self.selector.unregister(self.sources.pop(source))
+        try:
+            source.close()
+        except OSError as e:
+            logger.debug("close failed: %s", e)
+        source.finish()
+
+    def service(self, source):
+        if source.isDone():
+            self.remove(source)
+            return
+        try:
+            packets = source.readAvailable()
+        except (IODone, OSError) as e:
+            logger.debug("source finished: %s", e)
+            self.remove(source)
+            return
+
+        if not packets:
+            return
+        dispatcher = source.dispatcher
+        dispatchPackets = getattr(dispatcher, "dispatchPackets", None)
+        if dispatchPackets != None:
+            dispatchPackets(source, packets)
+        else:
+            for packet in packets:
+                dispatcher.dispatchPacket(source, packet)
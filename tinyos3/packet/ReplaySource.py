@@ -0,0 +1,144 @@
+"""
+A packet source that replays a capture file (see Capture.py).
+
+    file@/path/to/capture         replay at the recorded pace
+    file@/path/to/capture:4       four times as fast
+    file@/path/to/capture:max     as fast as possible
+
+The file is memory-mapped, so captures larger than RAM can be
+replayed. The source finishes at the end of the file; rate() then gives
+the packets per second it achieved.
+"""
+
+import logging
+import re
+import time
+from threading import Event
+
+from .Capture import CaptureReader
+from .IO import IODone
+from .PacketSource import PacketSource, PacketSourceException
+
+logger = logging.getLogger(__name__)
+
+# Most packets handed to the dispatcher at once.
+BATCH_SIZE = 256
+
+
+class ReplaySource(PacketSource):
+    def __init__(self, dispatcher, args):
+        PacketSource.__init__(self, dispatcher)
+
+        m = re.match(r"(.*):(max|\d+(?:\.\d*)?|\.\d+)$", args)
+        if m == None:
+            (self.path, speed) = (args, "1")
+        else:
+            (self.path, speed) = m.groups()
+        if not self.path:
+            raise PacketSourceException("bad arguments")
+
+        if speed == "max":
+            self.speed = None
+        else:
+            self.speed = float(speed)
+            if self.speed <= 0:
+                raise PacketSourceException("bad replay speed: %s" % speed)
+
+        self.reader = None
+        self.records = None
+        self.pending = None
+        self.wakeup = Event()
+
+        self.packets = 0
+        self.first = None
+        self.startTime = None
+        self.endTime = None
+
+    def cancel(self):
+        self.done = True
+        self.wakeup.set()
+
+    def open(self):
+        self.reader = CaptureReader(self.path)
+        self.records = iter(self.reader)
+        PacketSource.open(self)
+
+    def close(self):
+        if self.endTime == None:
+            self.endTime = time.monotonic()
+        if self.reader != None:
+            self.reader.close()
+            self.reader = None
+        logger.info(
+            "replayed %d packets from %s at %.0f packets/s",
+            self.packets,
+            self.path,
+            self.rate(),
+        )
+
+    def rate(self):
+        """Return the packets per second replayed so far."""
+        if self.startTime == None:
+            return 0.0
+        end = self.endTime if self.endTime != None else time.monotonic()
+        if end <= self.startTime:
+            return 0.0
+        return self.packets / (end - self.startTime)
+
+    def stats(self):
+        return {"packetsReplayed": self.packets, "rate": self.rate()}
+
+    def _next(self):
+        record = self.pending
+        if record != None:
+            self.pending = None
+            return record
+        return next(self.records, None)
+
+    def readPacket(self):
+        packets = self.readPackets(1)
+        return packets[0] if packets else None
+
+    def readPackets(self, max_n=None, timeout=None):
+        """
+        Return up to max_n records that are due (BATCH_SIZE if None),
+        waiting up to timeout seconds for the first one (forever if None).
+        """
+        if max_n == None:
+            max_n = BATCH_SIZE
+        if self.startTime == None:
+            self.startTime = time.monotonic()
+
+        packets = []
+        while len(packets) < max_n:
+            record = self._next()
+            if record == None:
+                break
+            (ts, sid, data) = record
+
+            if self.speed != None:
+                if self.first == None:
+                    self.first = ts
+                due = self.startTime + (ts - self.first) / 1e9 / self.speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    if packets:
+                        # hand over what is due now, keep this one
+                        self.pending = record
+                        break
+                    if timeout != None and delay > timeout:
+                        # not due before the timeout; keep it for later
+                        self.pending = record
+                        self.wakeup.wait(timeout)
+                        return []
+                    if self.wakeup.wait(delay):
+                        self.pending = record
+                        return []
+
+            packets.append(bytes(data))
+
+        if not packets and not self.isDone():
+            self.endTime = time.monotonic()
+            raise IODone()
+        self.packets += len(packets)
+        return packets
@@ -28,11 +28,16 @@
 #
 # Author: Geoffrey Mainland <mainland@eecs.harvard.edu>
 #
+import time
+from collections import deque
+
 VERSION = b"U"
 SUBVERSION = b" "
 
 PLATFORM_UNKNOWN = 0
 
+READ_SIZE = 4096
+
 
 class SFProtocolException(Exception):
     def __init__(self, *args):
@@ -40,11 +45,28 @@ class SFProtocolException(Exception):
 
 
 class SFProtocol:
+    """
+    Serial forwarder protocol: after the two byte version handshake
+    each packet is sent as one length byte followed by the packet.
+
+    Packets are read from the stream in chunks; every complete packet in
+    a chunk is parsed at once and queued, so a busy link needs far fewer
+    reads than packets.
+    """
+
     def __init__(self, ins, outs):
         self.ins = ins
         self.outs = outs
         self.platform = None
 
+        self.partial = b""
+        self.pending = deque()
+
+        self.bytesIn = 0
+        self.bytesOut = 0
+        self.packetsIn = 0
+        self.packetsOut = 0
+
     def open(self):
         self.outs.write(VERSION + SUBVERSION)
         partner = self.ins.read(2)
@@ -63,15 +85,85 @@ class SFProtocol:
         # the tinyos-2.x serial forwarder doesn't do that, so the
         # connection is all set up at this point.
 
+    def feed(self, chunk) -> list:
+        """Return every complete packet in chunk, keeping any remainder."""
+        self.bytesIn += len(chunk)
+        if self.partial:
+            data = self.partial + bytes(chunk)
+        else:
+            data = chunk
+        packets = []
+        n = len(data)
+        pos = 0
+        while pos < n:
+            end = pos + 1 + data[pos]
+            if end > n:
+                break
+            packets.append(bytes(data[pos + 1 : end]))
+            pos = end
+        self.partial = bytes(data[pos:])
+        self.packetsIn += len(packets)
+        return packets
+
     def readPacket(self):
-        size = self.ins.read(1)
-        packet = self.ins.read(ord(size))
-        return packet
+        while not self.pending:
+            self.pending.extend(self.feed(self.ins.read_some(READ_SIZE)))
+        return self.pending.popleft()
+
+    def readPackets(self, max_n=None, timeout=None) -> list:
+        """
+        Return up to max_n received packets (all of them if None),
+        waiting up to timeout seconds for the first one (forever if
+        None). A timeout needs ins to have wait_readable(), as SocketIO
+        does.
+        """
+        pending = self.pending
+        if timeout == None:
+            while not pending:
+                pending.extend(self.feed(self.ins.read_some(READ_SIZE)))
+        else:
+            deadline = time.monotonic() + timeout
+            while not pending:
+                if not self.ins.wait_readable(max(0, deadline - time.monotonic())):
+                    break
+                pending.extend(self.feed(self.ins.read_available(READ_SIZE)))
+        if max_n == None or max_n >= len(pending):
+            packets = list(pending)
+            pending.clear()
+        else:
+            packets = [pending.popleft() for i in range(max_n)]
+        return packets
 
     def writePacket(self, packet):
         if len(packet) > 255:
             raise SFProtocolException("packet too long")
 
-        self.outs.write(bytes([len(packet)]))
-        self.outs.write(packet)
+        self.outs.write(bytes((len(packet),)) + bytes(packet))
         self.outs.flush()
+        self.bytesOut += len(packet) + 1
+        self.packetsOut += 1
+
+    def writePackets(self, packets):
+        """Write any number of packets with a single write."""
+        buffer = bytearray()
+        n = 0
+        for packet in packets:
+            if len(packet) > 255:
+                raise SFProtocolException("packet too long")
+            buffer.append(len(packet))
+            buffer += packet
+            n += 1
+
+        if buffer:
+            self.outs.write(buffer)
+            self.outs.flush()
+            self.bytesOut += len(buffer)
+            self.packetsOut += n
+
+    def stats(self) -> dict:
+        return {
+            "bytesIn": self.bytesIn,
+            "bytesOut": self.bytesOut,
+            "packetsIn": self.packetsIn,
+            "packetsOut": self.packetsOut,
+        }
@@ -65,5 +65,25 @@ class SFSource(PacketSource):
     def readPacket(self):
         return self.prot.readPacket()
 
+    def readPackets(self, max_n=None, timeout=None):
+        return self.prot.readPackets(max_n, timeout)
+
+    def fileno(self):
+        return self.io.fileno()
+
+    def stats(self):
+        return self.prot.stats()
+
+    def readAvailable(self):
+        packets = self.prot.feed(self.io.read_available(READ_SIZE))
+        # SocketIO may have received more than READ_SIZE; the selector
+        # will not wake up again for bytes already in its buffer
+        while self.io.buffered():
+            packets += self.prot.feed(self.io.read_available(READ_SIZE))
+        return packets
+
     def writePacket(self, packet):
         self.prot.writePacket(packet)
+
+    def writePackets(self, packets):
+        self.prot.writePackets(packets)
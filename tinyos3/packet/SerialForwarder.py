@@ -0,0 +1,350 @@
+"""
+A serial forwarder: shares one mote connection with any number of TCP
+clients speaking the SFProtocol ("U " handshake, length-prefixed
+packets), like the C sf program.
+
+Every packet from the mote is sent to every client. Packets from
+clients are queued and written to the mote one at a time by a separate
+thread, since each write waits for the mote's ack. All client sockets
+are served by a single selector loop; each client has a bounded output
+buffer and packets that do not fit are dropped for that client only.
+
+    python -m tinyos3.packet.SerialForwarder serial@/dev/ttyUSB0:115200 -p 9002
+"""
+
+import argparse
+import logging
+import os
+import re
+import selectors
+import socket
+from collections import deque
+from itertools import islice
+from threading import Lock, Thread
+
+from .IO import Waker
+from .PacketQueue import PacketQueue, DROP_NEWEST
+from .PacketSource import PacketSourceException
+from .SFProtocol import SFProtocol, VERSION, SUBVERSION
+from . import SFSource
+
+try:
+    from . import SerialSource
+except ImportError:
+    SerialSource = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 9002
+CLIENT_BUFFER_SIZE = 64 * 1024
+TX_QUEUE_SIZE = 256
+RECV_SIZE = 4096
+IOV_MAX = 64
+
+# sendmsg() sends all of a client's queued buffers without joining them.
+HAVE_SENDMSG = hasattr(socket.socket, "sendmsg")
+
+
+class SFClient:
+    def __init__(self, sock, addr, maxBuffer):
+        self.sock = sock
+        self.addr = addr
+        self.maxBuffer = maxBuffer
+        self.prot = SFProtocol(None, None)
+        self.version = b""
+        self.ready = False
+
+        self.out = deque()
+        self.outBytes = 0
+        self.dropped = 0
+
+    def queue(self, data, packets):
+        """
+        Queue data (the encoded form of packets) for sending. If it does
+        not all fit in maxBuffer, queue as many whole packets as do and
+        drop the rest.
+        """
+        if self.outBytes + len(data) <= self.maxBuffer:
+            self.out.append(data)
+            self.outBytes += len(data)
+            return
+        for packet in packets:
+            n = len(packet) + 1
+            if self.outBytes + n > self.maxBuffer:
+                self.dropped += 1
+                continue
+            self.out.append(bytes((len(packet),)) + packet)
+            self.outBytes += n
+
+    def send(self) -> bool:
+        """Send as much queued data as the socket takes. Returns True when all sent."""
+        out = self.out
+        while out:
+            try:
+                if HAVE_SENDMSG:
+                    n = self.sock.sendmsg(list(islice(out, IOV_MAX)))
+                else:
+                    if len(out) > 1:
+                        data = b"".join(out)
+                        out.clear()
+                        out.append(data)
+                    n = self.sock.send(out[0])
+            except BlockingIOError:
+                return False
+            self.outBytes -= n
+            while n:
+                first = out[0]
+                if n < len(first):
+                    out[0] = memoryview(first)[n:]
+                    return False
+                n -= len(first)
+                out.popleft()
+        return True
+
+
+class SerialForwarder:
+    def __init__(
+        self,
+        port=DEFAULT_PORT,
+        host="",
+        maxClientBuffer=CLIENT_BUFFER_SIZE,
+        txQueueSize=TX_QUEUE_SIZE,
+    ):
+        self.port = port
+        self.host = host
+        self.maxClientBuffer = maxClientBuffer
+        self.source = None
+        self.done = False
+
+        self.clients = {}
+        self.selector = selectors.DefaultSelector()
+        self.waker = Waker()
+        self.selector.register(self.waker, selectors.EVENT_READ, self.waker)
+        self.listener = None
+
+        self.inbound = deque()
+        self.inboundLock = Lock()
+        self.wakePending = False
+        self.txQueue = PacketQueue(txQueueSize, DROP_NEWEST)
+
+        self.packetsIn = 0
+        self.packetsOut = 0
+        self.packetsDropped = 0
+        self.clientsServed = 0
+
+    def addSource(self, name=None):
+        """Open the mote connection, e.g. serial@/dev/ttyUSB0:115200."""
+        if name == None:
+            name = os.environ.get("MOTECOM", "serial@/dev/ttyUSB0:115200")
+
+        m = re.match(r"([^@]*)@(.*)", name)
+        if m == None:
+            raise PacketSourceException("bad source '%s'" % (name))
+
+        (sourceType, args) = m.groups()
+        if sourceType == "sf":
+            source = SFSource.SFSource(self, args)
+        elif sourceType == "serial" and SerialSource != None:
+            source = SerialSource.SerialSource(self, args)
+        else:
+            raise PacketSourceException("bad source")
+        source.start()
+        source.semaphore.acquire()
+        source.semaphore.release()
+
+        self.source = source
+        return source
+
+    def listen(self):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((self.host, self.port))
+        self.listener.listen(socket.SOMAXCONN)
+        self.listener.setblocking(False)
+        self.port = self.listener.getsockname()[1]
+        self.selector.register(self.listener, selectors.EVENT_READ, None)
+
+    def start(self):
+        """Listen and serve clients from background threads."""
+        if self.listener == None:
+            self.listen()
+        for target in (self.serve, self.txLoop):
+            thread = Thread(target=target)
+            thread.daemon = True
+            thread.start()
+
+    def close(self):
+        """Stop serving clients and close the mote connection."""
+        self.done = True
+        self.txQueue.close()
+        self.waker.wake()
+        if self.source != None:
+            # the source's own thread closes the port once it sees this
+            self.source.cancel()
+
+    # Called on the source's thread for every packet from the mote.
+    def dispatchPacket(self, source, packet):
+        with self.inboundLock:
+            self.inbound.append(packet)
+            if self.wakePending:
+                return
+            self.wakePending = True
+        self.waker.wake()
+
+    def txLoop(self):
+        while True:
+            packet = self.txQueue.get()
+            if packet == None:
+                break
+            try:
+                self.source.writePacket(packet)
+            except Exception as e:
+                logger.debug("write to mote failed: %s", e)
+
+    def serve(self):
+        if self.listener == None:
+            self.listen()
+        try:
+            while not self.done:
+                for (key, events) in self.selector.select():
+                    if key.data == None:
+                        self.accept()
+                    elif key.data is self.waker:
+                        self.forward()
+                    elif key.data.sock in self.clients:
+                        # forward() earlier in this batch may have
+                        # disconnected the client
+                        client = key.data
+                        if events & selectors.EVENT_READ:
+                            self.receive(client)
+                        if (
+                            events & selectors.EVENT_WRITE
+                            and client.sock in self.clients
+                        ):
+                            self.flush(client)
+        finally:
+            for client in list(self.clients.values()):
+                self.disconnect(client)
+            self.selector.close()
+            self.listener.close()
+            self.waker.close()
+
+    def accept(self):
+        while True:
+            try:
+                (sock, addr) = self.listener.accept()
+            except BlockingIOError:
+                return
+            sock.setblocking(False)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client = SFClient(sock, addr, self.maxClientBuffer)
+            client.queue(VERSION + SUBVERSION, ())
+            self.clients[sock] = client
+            self.selector.register(sock, selectors.EVENT_READ, client)
+            self.clientsServed += 1
+            logger.debug("client %s connected", addr)
+            self.flush(client)
+
+    def disconnect(self, client):
+        if client.sock not in self.clients:
+            return
+        logger.debug("client %s disconnected", client.addr)
+        del self.clients[client.sock]
+        self.selector.unregister(client.sock)
+        client.sock.close()
+
+    def forward(self):
+        self.waker.clear()
+        with self.inboundLock:
+            packets = list(self.inbound)
+            self.inbound.clear()
+            self.wakePending = False
+        if not packets:
+            return
+
+        # Encode once and share the same bytes among all clients.
+        buffer = bytearray()
+        for packet in packets:
+            buffer.append(len(packet))
+            buffer += packet
+        data = bytes(buffer)
+        self.packetsIn += len(packets)
+
+        for client in list(self.clients.values()):
+            if not client.ready:
+                continue
+            idle = not client.out
+            dropped = client.dropped
+            client.queue(data, packets)
+            self.packetsDropped += client.dropped - dropped
+            if idle:
+                self.flush(client)
+
+    def flush(self, client):
+        try:
+            sent = client.send()
+        except OSError:
+            self.disconnect(client)
+            return
+        events = selectors.EVENT_READ
+        if not sent:
+            events |= selectors.EVENT_WRITE
+        self.selector.modify(client.sock, events, client)
+
+    def receive(self, client):
+        try:
+            data = client.sock.recv(RECV_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self.disconnect(client)
+            return
+
+        if not client.ready:
+            need = 2 - len(client.version)
+            client.version += data[:need]
+            data = data[need:]
+            if len(client.version) < 2:
+                return
+            if client.version[0] != VERSION[0]:
+                logger.debug("client %s: protocol version error", client.addr)
+                self.disconnect(client)
+                return
+            client.ready = True
+
+        for packet in client.prot.feed(data):
+            self.packetsOut += 1
+            self.txQueue.put(packet)
+
+    def dropped(self):
+        """Return the number of packets dropped for slow clients."""
+        return self.packetsDropped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TinyOS serial forwarder")
+    parser.add_argument("motecom", nargs="?", help="e.g. serial@/dev/ttyUSB0:115200")
+    parser.add_argument("-p", "--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args()
+
+    if args.debug:
+        logging.basicConfig(level=logging.DEBUG)
+
+    sf = SerialForwarder(args.port)
+    sf.addSource(args.motecom)
+    sf.listen()
+    print("Serial forwarder listening on port %d" % sf.port)
+    thread = Thread(target=sf.txLoop)
+    thread.daemon = True
+    thread.start()
+    try:
+        sf.serve()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -28,30 +28,130 @@
 #
 # Author: Geoffrey Mainland <mainland@eecs.harvard.edu>
 #
+import logging
+import selectors
+
 import serial
 
 from .IO import *
 
+logger = logging.getLogger(__name__)
+
+# Without a pollable file descriptor (e.g. on Windows) reads block in
+# pyserial for at most this long before checking for cancellation.
+POLL_INTERVAL = 0.5
+
 
 class SerialIO(IO):
+    """
+    Reads block in the kernel until the port has data: in a selector
+    together with a Waker on platforms where the port has a file
+    descriptor, otherwise in pyserial with a POLL_INTERVAL timeout.
+    cancel() wakes a blocked reader, which then raises IODone.
+    """
+
     def __init__(self, device, baud):
         IO.__init__(self)
 
         self.device = device
         self.baud = baud
+        self.selector = None
 
     def open(self):
-        self.serial = serial.Serial(port=self.device, baudrate=self.baud)
+        self.serial = serial.Serial(
+            port=self.device, baudrate=self.baud, timeout=POLL_INTERVAL
+        )
+        try:
+            fd = self.serial.fileno()
+        except (AttributeError, OSError):
+            return
+        self.waker = Waker()
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(fd, selectors.EVENT_READ)
+        self.selector.register(self.waker, selectors.EVENT_READ)
+        if self.isDone():
+            self.waker.wake()
 
     def close(self):
+        # Make any reader still blocked in read_some() give up.
+        self.cancel()
+        if self.selector:
+            self.selector.close()
+            self.selector = None
+        if self.waker:
+            self.waker.close()
+            self.waker = None
         self.serial.close()
 
     def read(self, count):
-        while self.serial.inWaiting() < count:
+        data = b""
+        while len(data) < count:
+            data += self.read_some(count - len(data))
+
+        return data
+
+    def read_some(self, count):
+        """Return between 1 and count bytes, blocking until one is available."""
+        try:
+            return self._read_some(count)
+        except OSError as e:
+            # pyserial raises these once close() has shut the port, and
+            # when the device goes away; either way the port is finished.
+            if not self.isDone():
+                logger.error("%s: %s", self.device, e)
+            raise IODone()
+
+    def _read_some(self, count):
+        while True:
             if self.isDone():
                 raise IODone()
 
-        return self.serial.read(count)
+            waiting = self.serial.in_waiting
+            if waiting:
+                return self.serial.read(min(count, waiting))
+
+            selector = self.selector
+            if selector:
+                # The timeout covers a close() racing with this select,
+                # which can take the waker away before it is seen.
+                try:
+                    events = selector.select(POLL_INTERVAL)
+                except (OSError, ValueError):
+                    if self.isDone():
+                        raise IODone()
+                    raise
+                ready = False
+                for (key, mask) in events:
+                    # key.fileobj, not self.waker: close() may have set
+                    # that to None meanwhile
+                    if type(key.fileobj) == Waker:
+                        key.fileobj.clear()
+                    else:
+                        ready = True
+                if not ready or self.serial.in_waiting:
+                    continue
+                # Readable with nothing waiting: let pyserial read, which
+                # raises if the device has hung up instead of spinning.
+                data = self.serial.read(1)
+                if data:
+                    return data
+                continue
+
+            data = self.serial.read(1)
+            if data:
+                waiting = self.serial.in_waiting
+                if waiting and count > 1:
+                    data += self.serial.read(min(count - 1, waiting))
+                return data
+
+    def read_available(self, count):
+        waiting = self.serial.in_waiting
+        if not waiting:
+            return b""
+        return self.serial.read(min(count, waiting))
+
+    def fileno(self):
+        return self.serial.fileno()
 
     def write(self, data):
         return self.serial.write(data)
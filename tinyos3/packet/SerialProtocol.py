@@ -34,8 +34,17 @@
 #  - Handle acknowledgements correctly
 
 import logging
+import time
+from collections import deque
+from queue import Queue
 from threading import Lock, Condition, Thread
 from .IO import IODone
+from . import crc16
+from . import HDLC
+from .HDLC import Deframer
+from .FlightRecorder import FlightRecorder, NO_ACK
+from .Metrics import Histogram
+from .PacketQueue import PacketQueue, DROP_OLDEST
 from .Serial import Serial
 
 SYNC_BYTE = Serial.HDLC_FLAG_BYTE
@@ -43,6 +52,8 @@ B_SYNC_BYTE = (SYNC_BYTE).to_bytes(1, byteorder="big")
 ESCAPE_BYTE = Serial.HDLC_CTLESC_BYTE
 B_ESCAPE_BYTE = (ESCAPE_BYTE).to_bytes(1, byteorder="big")
 MTU = 256
+READ_SIZE = 4096
+RX_QUEUE_SIZE = 256
 
 P_ACK = Serial.SERIAL_PROTO_ACK
 P_PACKET_ACK = Serial.SERIAL_PROTO_PACKET_ACK
@@ -51,6 +62,7 @@ P_UNKNOWN = Serial.SERIAL_PROTO_PACKET_UNKNOWN
 
 logger = logging.getLogger(__name__)
 TX_ATTEMPT_LIMIT = 1
+ACK_TIMEOUT = 0.25
 
 
 class NoAckException(Exception):
@@ -69,175 +81,245 @@ class RXThread(Thread):
     def run(self):
         while True:
             try:
-                frame = self.prot.readFramedPacket()
-                frameType = ord(frame[0])
-                pdataOffset = 1
-                if frameType == P_PACKET_ACK:
-                    # send an ACK
-                    self.prot.writeFramedPacket(P_ACK, frame[1], b"", 0)
-                    pdataOffset = 2
-                packet = frame[pdataOffset:]
-
-                if frameType == P_ACK:
-                    with self.prot.ackCV:
-                        if self.prot.lastAck:
-                            logger.debug("Warning: last ack not cleared")
-                        self.prot.lastAck = packet
-                        self.prot.ackCV.notify()
-                else:
-                    with self.prot.dataCV:
-                        self.prot.lastData = packet
-                        self.prot.dataCV.notify()
+                packet = self.prot.handleFrame(self.prot.readFramedPacket())
+                if packet != None:
+                    self.prot.rxQueue.put(packet)
             # OK, kind of ugly. finishing the SerialSource (ThreadTask)
             # leads (ultimately) to an IODone exception coming up
             # through here. At this point, the thread should complete.
             except IODone:
-                with self.prot.ackCV:
-                    self.prot.lastAck = None
-                    self.prot.ackCV.notify()
-                with self.prot.dataCV:
-                    self.prot.lastData = None
-                    self.prot.dataCV.notify()
+                self.prot.shutdown()
                 break
 
 
+class TXThread(Thread):
+    """
+    Writes every frame queued on prot.txQueue, in order. A None entry
+    stops the thread.
+    """
+
+    def __init__(self, prot):
+        Thread.__init__(self)
+        self.daemon = True
+        self.prot = prot
+
+    def run(self):
+        while True:
+            frame = self.prot.txQueue.get()
+            if frame == None:
+                break
+            try:
+                self.prot.outs.write(frame)
+                self.prot.bytesOut += len(frame)
+            except (IODone, OSError) as e:
+                logger.debug("write failed: %s", e)
+
+
 class SerialProtocol:
-    def __init__(self, ins, outs):
+    """
+    Received data packets are kept in a bounded queue of rxCapacity
+    packets; rxOverflow picks what happens when it is full (see
+    PacketQueue).
+    """
+
+    def __init__(self, ins, outs, rxCapacity=RX_QUEUE_SIZE, rxOverflow=DROP_OLDEST):
         self.ins = ins
         self.outs = outs
 
-        self.inSync = False
         self.seqNo = 0
 
-        self.receiveBuffer = bytes(MTU)
+        self.deframer = Deframer(MTU)
+        self.rxFrames = deque()
+
+        # the last frames in and out, for post-mortem dumps
+        self.recorder = FlightRecorder()
+        self.deframer.recorder = self.recorder.deframed
 
         self.received = [None] * 256
         self.received[P_ACK] = []
         self.received[P_PACKET_NO_ACK] = []
-        rxLock = Lock()
-        self.dataCV = Condition(rxLock)
-        self.ackCV = Condition(rxLock)
-        self.lastData = None
+        self.rxQueue = PacketQueue(rxCapacity, rxOverflow)
+        self.ackCV = Condition(Lock())
         self.lastAck = None
 
-    # also a little ugly: can't start this thread until the
+        # All writes go through txQueue and the TX thread, so the RX
+        # thread never blocks on the serial port. txLock serializes
+        # acknowledged data writes.
+        self.txQueue = Queue()
+        self.txLock = Lock()
+
+        self.taps = ()
+
+        self.bytesIn = 0
+        self.bytesOut = 0
+        self.framesOut = 0
+        self.noAcks = 0
+        self.retransmits = 0
+        self.ackRtt = Histogram()
+
+    # also a little ugly: can't start these threads until the
     # serial.Serial object has been opened. This should all be
     # encapsulated in a single constructor.
-    def open(self):
-        self.rxThread = RXThread(self)
-        self.rxThread.start()
-
-    def readPacket(self):
-        with self.dataCV:
-            self.dataCV.wait()
-            return self.lastData
+    def open(self, rxThread=True):
+        """
+        Start the TX thread and, unless rxThread is False, the RX thread.
+        Without an RX thread the owner passes received bytes to feed().
+        """
+        self.txThread = TXThread(self)
+        self.txThread.start()
+        if rxThread:
+            self.rxThread = RXThread(self)
+            self.rxThread.start()
+
+    def shutdown(self):
+        """Stop the TX thread and wake up anyone waiting for data or acks."""
+        self.txQueue.put(None)
+        with self.ackCV:
+            self.lastAck = None
+            self.ackCV.notify()
+        self.rxQueue.close()
+
+    def addTap(self, tap):
+        """Call tap(protocol, frame) with every good frame received."""
+        self.taps = self.taps + (tap,)
+
+    def removeTap(self, tap):
+        self.taps = tuple(t for t in self.taps if t is not tap)
+
+    def handleFrame(self, frame):
+        """
+        Process one received frame. Acks are matched to the pending
+        write, P_PACKET_ACK frames are acknowledged, and data packets
+        are returned; None is returned for anything else.
+        """
+        for tap in self.taps:
+            tap(self, frame)
+        frameType = frame[0]
+        pdataOffset = 1
+        if frameType == P_PACKET_ACK:
+            # send an ACK, without waiting for it to go out
+            self.sendFramedPacket(P_ACK, frame[1], b"")
+            pdataOffset = 2
+        packet = frame[pdataOffset:]
+
+        if frameType == P_ACK:
+            with self.ackCV:
+                if self.lastAck:
+                    logger.debug("Warning: last ack not cleared")
+                self.lastAck = packet
+                self.ackCV.notify()
+            return None
+        return packet
+
+    def feed(self, chunk) -> list:
+        """Deframe chunk and return the data packets it completed."""
+        packets = []
+        if not chunk:
+            return packets
+        self.bytesIn += len(chunk)
+        for frame in self.deframer.feed(chunk):
+            packet = self.handleFrame(frame)
+            if packet != None:
+                packets.append(packet)
+        if not self.deframer.inSync:
+            self.txQueue.put(B_SYNC_BYTE + B_SYNC_BYTE)
+        return packets
+
+    def readPacket(self, timeout=None):
+        """
+        Return the oldest received packet, waiting up to timeout seconds
+        for one. Returns None on timeout or once the protocol has shut down.
+        """
+        return self.rxQueue.get(timeout)
+
+    def readPackets(self, max_n, timeout=None) -> list:
+        """
+        Return up to max_n received packets, waiting up to timeout
+        seconds for the first one.
+        """
+        return self.rxQueue.getMany(max_n, timeout)
 
     def readFramedPacket(self) -> bytes:
-        count = 0
-        escaped = False
-        receiveBuffer = ""
+        while not self.rxFrames:
+            if not self.deframer.inSync:
+                logger.debug("resynchronizing...")
 
-        while True:
-            if not self.inSync:
-                logger.debug("resynchronizing...",)
-
-                while self.ins.read(1) != B_SYNC_BYTE:
-                    self.outs.write(B_SYNC_BYTE)
-                    self.outs.write(B_SYNC_BYTE)
-                logger.debug("synchronized")
-
-                self.inSync = True
-                count = 0
-                escaped = False
-
-                continue
-
-            if count >= MTU:
-                logger.debug("packet too long")
-                self.inSync = False
-                continue
-
-            b = self.ins.read(1)[0]
-
-            if escaped:
-                if b == SYNC_BYTE:
-                    # sync byte following escape is an error, resync
-                    logger.debug("unexpected sync byte")
-                    self.inSync = False
-                    continue
-
-                b ^= 0x20
-                escaped = False
-            elif b == ESCAPE_BYTE:
-                escaped = True
-                continue
-            elif b == SYNC_BYTE:
-                if count < 4:
-                    # too-small frames are ignored
-                    count = 0
-                    continue
-
-                packet = receiveBuffer[0 : count - 2]
-                readCrc = receiveBuffer[count - 2] | (receiveBuffer[count - 1] << 8)
-                computedCrc = crc(packet)
-
-                logger.debug(" len: %d", len(receiveBuffer))
-                logger.debug(" rcrc: %x ccrc: %x", readCrc, computedCrc)
-
-                if readCrc == computedCrc:
-                    return packet
-                else:
-                    logger.debug("bad packet")
-                    logger.debug(receiveBuffer)
-                    # We don't lose sync here. If we did, garbage on the line at
-                    # startup will cause loss of the first packet.
-                    count = 0
-                    receiveBuffer = ""
-                    continue
-
-            receiveBuffer += (b).to_bytes(1, byteorder="big")
-            count += 1
+            chunk = self.ins.read_some(READ_SIZE)
+            self.bytesIn += len(chunk)
+            self.rxFrames.extend(self.deframer.feed(chunk))
+
+            if not self.deframer.inSync:
+                self.txQueue.put(B_SYNC_BYTE + B_SYNC_BYTE)
+
+        return self.rxFrames.popleft()
 
     def writePacket(self, data: bytes) -> None:
-        logger.debug("Writing packet:")
-        logger.debug(" ".join(map(hex, data)))
         attemptsLeft = TX_ATTEMPT_LIMIT
-        self.seqNo = (self.seqNo + 1) % 256
-        while attemptsLeft:
-            attemptsLeft -= 1
-            try:
-                self.writeFramedPacket(P_PACKET_ACK, self.seqNo, data)
-                break
-            except NoAckException:
-                logger.debug("NO ACK: %s", self.seqNo)
+        with self.txLock:
+            self.seqNo = (self.seqNo + 1) % 256
+            while attemptsLeft:
+                if attemptsLeft < TX_ATTEMPT_LIMIT:
+                    self.retransmits += 1
+                attemptsLeft -= 1
+                try:
+                    self.writeFramedPacket(P_PACKET_ACK, self.seqNo, data)
+                    break
+                except NoAckException:
+                    self.noAcks += 1
+                    logger.debug("NO ACK: %s", self.seqNo)
 
     def writeFramedPacket(self, frameType: int, sn: int, data: bytes) -> None:
-        crc = 0
-        frame = b""
-
-        frame += B_SYNC_BYTE
-
-        crc = crcByte(crc, frameType)
-        frame += self.escape(frameType)
-
-        crc = crcByte(crc, sn)
-        frame += self.escape(sn)
-
-        for c in data:
-            crc = crcByte(crc, c)
-            frame += self.escape(c)
+        """Write a frame and wait for the ACK that matches sn."""
+        frame = HDLC.encode(bytes((frameType, sn)), data)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Framed Write: (%x) %s", sn, " ".join("%02x" % b for b in frame)
+            )
 
-        frame += self.escape(crc & 0xFF)
-        frame += self.escape(crc >> 8)
-
-        frame += B_SYNC_BYTE
-        logger.debug("Framed Write: (%x) %s", sn, " ".join(map(hex, frame)))
-        self.outs.write(frame)
         with self.ackCV:
-            self.ackCV.wait(0.25)
-            if not self.lastAck or self.lastAck[0] != sn:
-                raise NoAckException("No serial ACK received")
             self.lastAck = None
+            self.framesOut += 1
+            entry = self.recorder.sent(frame)
+            start = time.perf_counter()
+            self.txQueue.put(frame)
+            acked = self.ackCV.wait_for(
+                lambda: self.lastAck != None and self.lastAck[0] == sn, ACK_TIMEOUT
+            )
+            self.lastAck = None
+            if not acked:
+                entry[2] = NO_ACK
+                raise NoAckException("No serial ACK received")
+            self.ackRtt.observe(time.perf_counter() - start)
+
+    def sendFramedPacket(self, frameType: int, sn: int, data: bytes) -> None:
+        """Queue a frame for writing and return immediately."""
+        frame = HDLC.encode(bytes((frameType, sn)), data)
+        self.framesOut += 1
+        self.recorder.sent(frame)
+        self.txQueue.put(frame)
+
+    def stats(self) -> dict:
+        deframer = self.deframer
+        rxQueue = self.rxQueue
+        return {
+            "bytesIn": self.bytesIn,
+            "bytesOut": self.bytesOut,
+            "framesIn": deframer.frames,
+            "framesOut": self.framesOut,
+            "crcErrors": deframer.crcErrors,
+            "escapeErrors": deframer.escapeErrors,
+            "oversizeFrames": deframer.oversize,
+            "resyncs": deframer.resyncs,
+            "skippedBytes": deframer.skipped,
+            "inSync": deframer.inSync,
+            "noAcks": self.noAcks,
+            "retransmits": self.retransmits,
+            "ackRttSeconds": self.ackRtt.snapshot(),
+            "rxQueueDepth": len(rxQueue),
+            "rxQueueMaxDepth": rxQueue.maxDepth,
+            "rxQueueDropped": rxQueue.dropped,
+            "txQueueDepth": self.txQueue.qsize(),
+        }
 
     def escape(self, b: int) -> bytes:
         if b == SYNC_BYTE or b == ESCAPE_BYTE:
@@ -247,21 +329,8 @@ class SerialProtocol:
 
 
 def crc(data: bytes) -> int:
-    crc = 0
-
-    for b in data:
-        crc = crcByte(crc, b)
-
-    return crc
+    return crc16.compute(data)
 
 
 def crcByte(crc: int, b: int) -> int:
-    crc = crc ^ b << 8
-
-    for i in range(0, 8):
-        if (crc & 0x8000) == 0x8000:
-            crc = crc << 1 ^ 0x1021
-        else:
-            crc = crc << 1
-
-    return crc & 0xFFFF
+    return crc16.updateByte(crc, b)
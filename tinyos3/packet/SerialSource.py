@@ -31,6 +31,7 @@
 import re
 import sys
 
+from .IO import IODone
 from .PacketSource import *
 from .Platform import *
 from .SerialProtocol import *
@@ -60,6 +61,7 @@ class SerialSource(PacketSource):
 
         self.io = SerialIO(device, baud)
         self.prot = SerialProtocol(self.io, self.io)
+        self.prot.recorder.name = device
 
     def cancel(self):
         self.done = True
@@ -67,14 +69,37 @@ class SerialSource(PacketSource):
 
     def open(self):
         self.io.open()
-        self.prot.open()
+        self.prot.open(rxThread=not self.inline)
         PacketSource.open(self)
 
     def close(self):
+        if self.inline:
+            self.prot.shutdown()
         self.io.close()
 
     def readPacket(self):
-        return self.prot.readPacket()
+        packet = self.prot.readPacket()
+        if packet == None and self.prot.rxQueue.closed:
+            # the RX thread has stopped, e.g. the device hung up
+            raise IODone()
+        return packet
+
+    def readPackets(self, max_n=None, timeout=None):
+        if max_n == None:
+            max_n = RX_QUEUE_SIZE
+        packets = self.prot.readPackets(max_n, timeout)
+        if not packets and self.prot.rxQueue.closed:
+            raise IODone()
+        return packets
+
+    def fileno(self):
+        return self.io.fileno()
+
+    def stats(self):
+        return self.prot.stats()
+
+    def readAvailable(self):
+        return self.prot.feed(self.io.read_available(READ_SIZE))
 
     def writePacket(self, packet):
         self.prot.writePacket(packet)
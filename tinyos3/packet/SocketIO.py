@@ -28,13 +28,30 @@
 #
 # Author: Geoffrey Mainland <mainland@eecs.harvard.edu>
 #
+import selectors
 import socket
 
 from .IO import *
 
+RECV_BUFFER_SIZE = 65536
+
+# Lets recv_into() return immediately when nothing is buffered, so the
+# selector is only consulted when a read would actually block.
+MSG_DONTWAIT = getattr(socket, "MSG_DONTWAIT", None)
+
 
 class SocketIO(IO):
-    def __init__(self, host, port):
+    """
+    A TCP connection with an internal receive buffer.
+
+    Data is received with recv_into() into a preallocated bytearray and
+    read() and read_some() return memoryview slices of it. Bytes are
+    never overwritten once they have been handed out: when the buffer
+    fills up, unread data moves to a fresh buffer and the old one lives
+    on for as long as views into it exist.
+    """
+
+    def __init__(self, host, port, bufferSize=RECV_BUFFER_SIZE):
         IO.__init__(self)
 
         self.done = False
@@ -42,38 +59,129 @@ class SocketIO(IO):
         self.host = host
         self.port = port
 
+        self.bufferSize = bufferSize
+        self.buffer = bytearray(bufferSize)
+        self.view = memoryview(self.buffer)
+        self.head = 0
+        self.tail = 0
+        self.selector = None
+
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         self.socket.settimeout(1)
         self.socket.bind(("", 0))
 
-    def cancel(self):
-        self.done = True
-
     def open(self):
         print("SocketIO: Connecting socket to " + str(self.host) + ":" + str(self.port))
         self.socket.connect((self.host, self.port))
-        self.socket.settimeout(1)
+        self.socket.settimeout(None)
+
+        self.waker = Waker()
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.socket, selectors.EVENT_READ)
+        self.selector.register(self.waker, selectors.EVENT_READ)
+        if self.isDone():
+            self.waker.wake()
 
     def close(self):
+        if self.selector:
+            self.selector.close()
+            self.selector = None
+        if self.waker:
+            self.waker.close()
+            self.waker = None
         self.socket.close()
         self.socket = None
 
-    def read(self, count):
-        data = b""
-        while count - len(data) > 0:
+    def buffered(self):
+        """Return the number of received bytes not yet read."""
+        return self.tail - self.head
+
+    def _fill(self, need, block=True):
+        """
+        Receive more data, making room for at least need unread bytes.
+        With block False, returns without waiting if nothing has arrived.
+        """
+        if len(self.buffer) - self.head < need or self.tail == len(self.buffer):
+            unread = self.tail - self.head
+            buffer = bytearray(max(self.bufferSize, 2 * need))
+            buffer[:unread] = self.view[self.head : self.tail]
+            self.buffer = buffer
+            self.view = memoryview(buffer)
+            self.head = 0
+            self.tail = unread
+
+        while True:
             if self.isDone():
                 raise IODone()
 
             try:
-                data += self.socket.recv(count - len(data))
-            except socket.timeout:
-                pass
+                if not block and MSG_DONTWAIT == None:
+                    if not self.selector.select(0):
+                        return
+                    n = self.socket.recv_into(self.view[self.tail :])
+                elif MSG_DONTWAIT != None:
+                    n = self.socket.recv_into(self.view[self.tail :], 0, MSG_DONTWAIT)
+                else:
+                    self.selector.select()
+                    if self.isDone():
+                        raise IODone()
+                    n = self.socket.recv_into(self.view[self.tail :])
+            except BlockingIOError:
+                if not block:
+                    return
+                self.selector.select()
+                continue
 
+            if n == 0:
+                # connection closed by the other end
+                raise IODone()
+            self.tail += n
+            return
+
+    def read(self, count):
+        while self.tail - self.head < count:
+            self._fill(count)
+
+        data = self.view[self.head : self.head + count]
+        self.head += count
+        return data
+
+    def read_some(self, count):
+        if self.tail == self.head:
+            self._fill(1)
+
+        n = min(count, self.tail - self.head)
+        data = self.view[self.head : self.head + n]
+        self.head += n
         return data
 
+    def wait_readable(self, timeout):
+        """Wait up to timeout seconds for data; return whether any is there."""
+        if self.tail != self.head:
+            return True
+        if self.isDone():
+            raise IODone()
+        events = self.selector.select(timeout)
+        if self.isDone():
+            raise IODone()
+        return any(key.fileobj is self.socket for (key, mask) in events)
+
+    def read_available(self, count):
+        if self.tail == self.head:
+            self._fill(1, block=False)
+
+        n = min(count, self.tail - self.head)
+        data = self.view[self.head : self.head + n]
+        self.head += n
+        return data
+
+    def fileno(self):
+        return self.socket.fileno()
+
     def write(self, data):
-        return self.socket.send(data)
+        self.socket.sendall(data)
+        return len(data)
 
     def flush(self):
         pass
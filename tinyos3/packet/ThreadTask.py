@@ -66,7 +66,7 @@ class ThreadTaskRunner:
 
     def start(self, task):
         thread = threading.Thread(None, task)
-        thread.setDaemon(True)
+        thread.daemon = True
         thread.start()
 
     def cancelAll(self):
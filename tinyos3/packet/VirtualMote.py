@@ -0,0 +1,262 @@
+"""
+A virtual mote behind a pseudo-terminal, for testing SerialSource,
+SerialProtocol and tos.Serial without hardware (Linux and other systems
+with ptys only).
+
+The mote speaks the TEP113 serial protocol: it sends Active Message
+packets as P_PACKET_NO_ACK frames following the configured traffic
+patterns, and acknowledges each P_PACKET_ACK frame it receives, or
+ignores it with probability 1 - ackProbability.
+
+    python -m tinyos3.packet.VirtualMote --rate 500 --size 28
+
+prints the pty device to use as MOTECOM=serial@/dev/pts/N:115200.
+"""
+
+import argparse
+import os
+import random
+import select
+import selectors
+import struct
+import time
+from collections import deque
+from threading import Lock, Thread
+
+from . import HDLC
+from .HDLC import Deframer
+from .IO import Waker
+from .Serial import Serial
+
+P_ACK = Serial.SERIAL_PROTO_ACK
+P_PACKET_ACK = Serial.SERIAL_PROTO_PACKET_ACK
+P_PACKET_NO_ACK = Serial.SERIAL_PROTO_PACKET_NOACK
+AM_DISPATCH = Serial.TOS_SERIAL_ACTIVE_MESSAGE_ID
+
+# dest, src, length, group, type (big-endian), as in SerialPacket
+AM_HEADER = struct.Struct(">HHBBB")
+
+READ_SIZE = 4096
+# Most frames generated per write when sending as fast as possible.
+BURST = 64
+# Downlink packets kept for inspection.
+RECEIVED_LIMIT = 1024
+
+
+class Traffic:
+    """
+    One stream of uplink AM packets: rate packets per second (None for
+    as fast as the pty takes them) of size payload bytes, count packets
+    in total (None for no limit). The payload starts with a big-endian
+    32-bit sequence number.
+    """
+
+    def __init__(
+        self,
+        amType=0x22,
+        rate=10.0,
+        size=16,
+        src=1,
+        dest=0xFFFF,
+        group=0x22,
+        count=None,
+    ):
+        if size < 4 or size > 255:
+            raise ValueError("size must be between 4 and 255")
+        self.amType = amType
+        self.rate = rate
+        self.size = size
+        self.src = src
+        self.dest = dest
+        self.group = group
+        self.count = count
+
+        self.sent = 0
+        self.due = 0.0
+        self.header = bytes((P_PACKET_NO_ACK, AM_DISPATCH)) + AM_HEADER.pack(
+            dest, src, size, group, amType
+        )
+        self.filler = bytes(range(4, size))
+
+    def done(self):
+        return self.count != None and self.sent >= self.count
+
+    def frame(self):
+        payload = self.sent.to_bytes(4, "big") + self.filler
+        self.sent += 1
+        return HDLC.encode(self.header, payload)
+
+
+class VirtualMote:
+    def __init__(self, traffic=(), ackProbability=1.0, seed=None, mtu=HDLC.MTU):
+        self.traffic = list(traffic)
+        self.ackProbability = ackProbability
+        self.random = random.Random(seed)
+        self.deframer = Deframer(mtu)
+
+        self.master = None
+        self.slave = None
+        self.path = None
+        self.waker = None
+        self.writeLock = Lock()
+        self.threads = []
+        self.done = False
+
+        self.received = deque(maxlen=RECEIVED_LIMIT)
+        self.framesIn = 0
+        self.framesOut = 0
+        self.acked = 0
+        self.dropped = 0
+
+    def open(self):
+        # Unix only; imported here so the package still imports elsewhere
+        import tty
+
+        (self.master, self.slave) = os.openpty()
+        tty.setraw(self.slave)
+        tty.setraw(self.master)
+        os.set_blocking(self.master, False)
+        self.path = os.ttyname(self.slave)
+        self.waker = Waker()
+        return self.path
+
+    def start(self):
+        if self.master == None:
+            self.open()
+        for target in (self.rxLoop, self.txLoop):
+            thread = Thread(target=target, name="VirtualMote")
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+        return self.path
+
+    def stop(self):
+        self.done = True
+        if self.waker != None:
+            self.waker.wake()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        for fd in (self.master, self.slave):
+            if fd != None:
+                os.close(fd)
+        self.master = self.slave = None
+        if self.waker != None:
+            self.waker.close()
+            self.waker = None
+
+    def write(self, data):
+        with self.writeLock:
+            view = memoryview(data)
+            while view:
+                try:
+                    n = os.write(self.master, view)
+                except BlockingIOError:
+                    # nobody is reading the pty; wait, but not past stop()
+                    if self.done:
+                        raise OSError("virtual mote stopped")
+                    select.select([], [self.master], [], 0.1)
+                    continue
+                view = view[n:]
+
+    def rxLoop(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self.master, selectors.EVENT_READ)
+        selector.register(self.waker, selectors.EVENT_READ)
+        try:
+            while not self.done:
+                for (key, events) in selector.select():
+                    if key.fileobj is self.waker:
+                        continue
+                    try:
+                        chunk = os.read(self.master, READ_SIZE)
+                    except BlockingIOError:
+                        continue
+                    except OSError:
+                        return
+                    for frame in self.deframer.feed(chunk):
+                        self.handleFrame(frame)
+        finally:
+            selector.close()
+
+    def handleFrame(self, frame):
+        self.framesIn += 1
+        protocol = frame[0]
+        if protocol == P_PACKET_ACK and len(frame) >= 2:
+            if self.random.random() >= self.ackProbability:
+                self.dropped += 1
+                return
+            self.received.append(frame[2:])
+            self.acked += 1
+            self.write(HDLC.encode(bytes((P_ACK, frame[1]))))
+        elif protocol == P_PACKET_NO_ACK:
+            self.received.append(frame[1:])
+
+    def txLoop(self):
+        start = time.monotonic()
+        for t in self.traffic:
+            t.due = start
+        while not self.done:
+            active = [t for t in self.traffic if not t.done()]
+            if not active:
+                return
+
+            now = time.monotonic()
+            frames = []
+            for t in active:
+                if t.rate == None:
+                    n = BURST
+                else:
+                    n = 0
+                    while t.due <= now and n < BURST:
+                        t.due += 1.0 / t.rate
+                        n += 1
+                for i in range(n):
+                    if t.done():
+                        break
+                    frames.append(t.frame())
+
+            if frames:
+                try:
+                    self.write(b"".join(frames))
+                except OSError:
+                    return
+                self.framesOut += len(frames)
+                continue
+
+            delay = min(t.due for t in active) - now
+            if delay > 0:
+                time.sleep(min(delay, 0.1))
+
+    def sent(self):
+        return sum(t.sent for t in self.traffic)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Virtual TinyOS mote on a pty")
+    parser.add_argument("--am-type", type=lambda s: int(s, 0), default=0x22)
+    parser.add_argument("--rate", type=float, default=10.0, help="packets/s, 0 for max")
+    parser.add_argument("--size", type=int, default=16, help="payload bytes")
+    parser.add_argument("--count", type=int, default=None)
+    parser.add_argument("--ack-probability", type=float, default=1.0)
+    args = parser.parse_args()
+
+    traffic = Traffic(
+        args.am_type, args.rate or None, args.size, count=args.count
+    )
+    mote = VirtualMote([traffic], args.ack_probability)
+    print("MOTECOM=serial@%s:115200" % mote.open())
+    mote.start()
+    try:
+        while True:
+            time.sleep(1)
+            print(
+                "sent %d, received %d, acked %d, dropped %d"
+                % (mote.sent(), mote.framesIn, mote.acked, mote.dropped)
+            )
+    except KeyboardInterrupt:
+        mote.stop()
+
+
+if __name__ == "__main__":
+    main()
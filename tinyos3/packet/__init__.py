@@ -41,4 +41,15 @@ __all__ = [
     "SerialSource",
     "SerialProtocol",
     "SerialIO",
+    "crc16",
+    "HDLC",
+    "PacketQueue",
+    "SerialForwarder",
+    "Reactor",
+    "Capture",
+    "ReplaySource",
+    "Pcapng",
+    "VirtualMote",
+    "Metrics",
+    "FlightRecorder",
 ]
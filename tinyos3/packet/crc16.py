@@ -0,0 +1,77 @@
+"""
+CRC-16 (CCITT, polynomial 0x1021, initial value 0) as used by the
+TEP113 serial framing.
+
+Both framing stacks (tinyos3.tos.HDLC and tinyos3.packet.SerialProtocol)
+share this module. Whole buffers are handled by binascii.crc_hqx, which
+computes the same CRC in C; the 256-entry table serves code that feeds
+the CRC one byte at a time.
+"""
+
+import binascii
+
+__all__ = ["CRC_TABLE", "update", "updateByte", "compute", "verify", "verify_many"]
+
+POLYNOMIAL = 0x1021
+
+
+def _makeTable():
+    table = []
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = (crc << 1) ^ POLYNOMIAL
+            else:
+                crc = crc << 1
+        table.append(crc & 0xFFFF)
+    return tuple(table)
+
+
+CRC_TABLE = _makeTable()
+
+_crc_hqx = binascii.crc_hqx
+
+
+def update(crc: int, buffer) -> int:
+    """Fold buffer into crc and return the new value.
+
+    buffer may be bytes, bytearray, memoryview or a list of ints.
+    """
+    try:
+        return _crc_hqx(buffer, crc)
+    except TypeError:
+        return _crc_hqx(bytes(buffer), crc)
+
+
+def updateByte(crc: int, b: int) -> int:
+    """Fold a single byte into crc."""
+    return ((crc << 8) & 0xFFFF) ^ CRC_TABLE[(crc >> 8) ^ (b & 0xFF)]
+
+
+def compute(buffer) -> int:
+    """Return the CRC of buffer."""
+    return update(0, buffer)
+
+
+def verify(frame) -> bool:
+    """Check a frame whose last two bytes are its little-endian CRC."""
+    n = len(frame)
+    if n < 2:
+        return False
+    return update(0, frame[: n - 2]) == frame[n - 2] | (frame[n - 1] << 8)
+
+
+def verify_many(frames) -> list:
+    """Apply verify() to every frame in frames and return the results."""
+    crc_hqx = _crc_hqx
+    results = []
+    for frame in frames:
+        n = len(frame)
+        if n < 2:
+            results.append(False)
+            continue
+        if type(frame) is list:
+            frame = bytes(frame)
+        results.append(crc_hqx(frame[: n - 2], 0) == frame[n - 2] | (frame[n - 1] << 8))
+    return results
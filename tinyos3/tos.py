@@ -39,6 +39,7 @@ packets using the serial format from T2 (TEP113) and a second one that
 tries to simplifies the work with arbitrary packets.
 """
 
+import abc
 import sys
 import struct
 import time
@@ -52,6 +53,15 @@ except ImportError:
     print("Please install PySerial first.")
     sys.exit(1)
 
+from collections import deque
+from concurrent.futures import Future
+
+from tinyos3.packet import crc16
+from tinyos3.packet.HDLC import Deframer
+from tinyos3.packet.HDLC import encode as HDLC_encode
+from tinyos3.packet.HDLC import escape as HDLC_escape
+from tinyos3.packet.HDLC import unescape as HDLC_unescape
+
 __version__ = "2.2.0"
 
 __all__ = [
@@ -67,6 +77,9 @@ __all__ = [
 
 HDLC_FLAG_BYTE = 0x7E
 HDLC_CTLESC_BYTE = 0x7D
+HDLC_MTU = 1024
+
+READ_SIZE = 4096
 
 TOS_SERIAL_ACTIVE_MESSAGE_ID = 0
 TOS_SERIAL_CC1000_ID = 1
@@ -107,7 +120,66 @@ def getSource(comm):
     raise Exception
 
 
-class Serial:
+class ByteSource(abc.ABC):
+    """
+    Transmit side shared by Serial and SerialMIB600, which implement
+    _write().
+
+    Frames are written with one call to _write() each, or a batch of
+    frames with a single call. If framePacing is set, consecutive frames
+    are spaced at least that many seconds apart.
+    """
+
+    def __init__(self, framePacing=0):
+        self.framePacing = framePacing
+        self.txBytes = 0
+        self.txFrames = 0
+        self.txTime = 0.0
+        self._txReady = 0
+
+    @abc.abstractmethod
+    def _write(self, data):
+        """Write data to the device."""
+
+    def putBytes(self, data):
+        """Write one complete frame."""
+        self.putFrames((data,))
+
+    def putFrames(self, frames, pacing=None):
+        """
+        Write a batch of frames. Without pacing the whole batch goes
+        out in one write.
+        """
+        if pacing == None:
+            pacing = self.framePacing
+        frames = [bytes(f) if type(f) == type([]) else f for f in frames]
+        if not frames:
+            return
+
+        start = time.perf_counter()
+        if pacing:
+            for f in frames:
+                wait = self._txReady - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+                self._write(f)
+                self._txReady = time.perf_counter() + pacing
+        elif len(frames) == 1:
+            self._write(frames[0])
+        else:
+            self._write(b"".join(frames))
+        self.txTime += time.perf_counter() - start
+        self.txFrames += len(frames)
+        self.txBytes += sum(map(len, frames))
+
+    def txRate(self):
+        """Return the achieved transmit rate in bytes/s."""
+        if not self.txTime:
+            return 0.0
+        return self.txBytes / self.txTime
+
+
+class Serial(ByteSource):
     def __init__(
         self,
         port,
@@ -116,7 +188,9 @@ class Serial:
         debug=False,
         readTimeout=None,
         ackTimeout=0.02,
+        framePacing=0,
     ):
+        ByteSource.__init__(self, framePacing)
         self.debug = debug
         self.readTimeout = readTimeout
         self.ackTimeout = ackTimeout
@@ -147,11 +221,15 @@ class Serial:
         # print 'Serial:getByte: 0x%02x' % ord(c)
         return ord(c)
 
-    def putBytes(self, data):
-        # print "DEBUG: putBytes:", data
-        for b in data:
-            self._s.write(struct.pack("B", b))
-            time.sleep(0.000001)
+    def getBytes(self, count):
+        """Return up to count bytes, blocking for at least one."""
+        c = self._s.read(max(1, min(count, self._s.in_waiting)))
+        if not c:
+            raise Timeout
+        return c
+
+    def _write(self, data):
+        self._s.write(data)
 
     def getTimeout(self):
         return self._s.timeout
@@ -160,8 +238,17 @@ class Serial:
         self._s.timeout = timeout
 
 
-class SerialMIB600:
-    def __init__(self, host, port=10002, debug=False, readTimeout=None, ackTimeout=0.5):
+class SerialMIB600(ByteSource):
+    def __init__(
+        self,
+        host,
+        port=10002,
+        debug=False,
+        readTimeout=None,
+        ackTimeout=0.5,
+        framePacing=0,
+    ):
+        ByteSource.__init__(self, framePacing)
         self.debug = debug
         self.readTimeout = readTimeout
         self.ackTimeout = ackTimeout
@@ -180,10 +267,18 @@ class SerialMIB600:
         # print 'Serial:getByte: 0x%02x' % ord(c)
         return ord(c)
 
-    def putBytes(self, data):
-        # print "DEBUG: putBytes:", data
-        for b in data:
-            self._s.send(struct.pack("B", b))
+    def getBytes(self, count):
+        """Return up to count bytes, blocking for at least one."""
+        try:
+            c = self._s.recv(count)
+        except socket.timeout:
+            c = b""
+        if not c:
+            raise Timeout
+        return c
+
+    def _write(self, data):
+        self._s.sendall(data)
 
     def getTimeout(self):
         return self._s.gettimeout()
@@ -198,8 +293,13 @@ class HDLC:
     source using a HDLC-like formating.
     """
 
-    def __init__(self, source):
+    def __init__(self, source, lists=False):
         self._s = source
+        self._deframer = Deframer(HDLC_MTU)
+        self._frames = deque()
+        # compatibility: hand out packets as lists of ints, as older
+        # versions did, rather than the bytes they are received as
+        self.lists = lists
 
     # Returns the next incoming serial packet
     def read(self, timeout=None):
@@ -218,13 +318,12 @@ class HDLC:
         #
         # It's also possible that the serial device was half-way
         # through transmitting a packet when this function was called
-        # (app was just started). So we also neeed to handle this
-        # case:
-        #
-        #     [Incomplete escaped data][HDLC_FLAG_BYTE][HDLC_FLAG_BYTE][Escaped data][HDLC_FLAG_BYTE]
-        #
-        # In this case we skip over the first (incomplete) packet.
+        # (app was just started). The Deframer skips everything up to
+        # the first HDLC_FLAG_BYTE, so the incomplete packet is dropped.
         #
+        # Bytes are read in chunks of whatever the source has
+        # available; one chunk may hold several packets, which are
+        # queued and returned by the following calls.
 
         if self._s.getTimeout() != timeout and timeout != None:
             self.log(
@@ -233,86 +332,44 @@ class HDLC:
             )
             self._s.setTimeout(timeout)
 
-        #    +--- FLAG -----+
-        #    |              |  ___________
-        #    v              | /           |
-        #  >(1)-- !FLAG -->(2)<-- !FLAG --+
-        #    |
-        #   FLAG
-        #    |  ___________
-        #    v /           |
-        #   (3)<-- FLAG ---+
-        #    |
-        #  !FLAG
-        #    |  ___________
-        #    v /           |
-        #   (4)<-- !FLAG --+
-        #    |
-        #   FLAG
-        #    |
-        #    v
-        #   (5)
-
         try:
-            # Read bytes until we get to a HDLC_FLAG_BYTE value
-            # (either the end of a packet, or the start of a new one)
-            d = self._s.getByte()
-            ts = time.time()
-            if d != HDLC_FLAG_BYTE:
-                self.log("Skipping byte %d" % d)
-                while d != HDLC_FLAG_BYTE:
-                    d = self._s.getByte()
-                    self.log("Skipping byte %d" % d)
-                    ts = time.time()
-
-            # Store HDLC_FLAG_BYTE at the start of the retrieved packet
-            # data:
-            packet = [d]
-
-            # Is the next byte also HDLC_FLAG_BYTE?
-            d = self._s.getByte()
-            while d == HDLC_FLAG_BYTE:
-                d = self._s.getByte()
+            while not self._frames:
+                crcErrors = self._deframer.crcErrors
+                chunk = self._s.getBytes(READ_SIZE)
                 ts = time.time()
+                for frame in self._deframer.feed(chunk):
+                    self._frames.append((ts, frame))
+                if self._deframer.crcErrors != crcErrors:
+                    print(
+                        "Warning: wrong CRC! %d packet(s) dropped"
+                        % (self._deframer.crcErrors - crcErrors)
+                    )
+        except Timeout:
+            return None
 
-            # We are now on the 2nd byte of the packet. Add it to
-            # our retrieved packet data:
-            packet.append(d)
-
-            # Read bytes from serial until we read another HDLC_FLAG_BYTE
-            # value (end of the current packet):
-            while d != HDLC_FLAG_BYTE:
-                d = self._s.getByte()
-                packet.append(d)
-
-            # Done reading a whole packet from serial
-            self.log("SimpleSerial:_read: unescaped %s" % packet)
-
-            # Decode the packet, and check CRC:
-            packet = self._unescape(packet)
+        return self.readQueued()
 
-            crc = self._crc16(0, packet[1:-3])
-            packet_crc = self._decode(packet[-3:-1])
+    def readQueued(self):
+        """Return an already received packet, or None without waiting."""
+        if not self._frames:
+            return None
 
-            if crc != packet_crc:
-                print(
-                    "Warning: wrong CRC! %x != %x %s"
-                    % (crc, packet_crc, ["%2x" % i for i in packet])
-                )
-            if not self._s._ts:
-                self._s._ts = ts
+        (ts, packet) = self._frames.popleft()
+        if self.lists:
+            packet = list(packet)
+        if not self._s._ts:
+            self._s._ts = ts
+        if self._s.debug:
             self.log(
                 "Serial:_read: %.4f (%.4f) Recv: %s"
-                % (ts, ts - self._s._ts, self._format(packet[1:-3]))
+                % (ts, ts - self._s._ts, self._format(packet))
             )
-            self._ts = ts
+        self._ts = ts
 
-            # Packet was successfully retrieved, so return it in a
-            # RawPacket wrapper object (but leave out the HDLC_FLAG_BYTE
-            # and CRC bytes)
-            return RawPacket(ts, packet[1:-3])
-        except Timeout:
-            return None
+        # Packet was successfully retrieved, so return it in a
+        # RawPacket wrapper object (the HDLC_FLAG_BYTE and CRC bytes
+        # have already been removed)
+        return RawPacket(ts, packet)
 
     def write(self, payload, seqno):
         """
@@ -322,23 +379,26 @@ class HDLC:
         calling the .payload().
         """
 
+        self._s.putBytes(self._frame(payload, seqno))
+
+    def writeMany(self, packets):
+        """
+        Write a batch of (payload, seqno) pairs with a single call to
+        the byte source.
+        """
+        self._s.putFrames([self._frame(p, seqno) for (p, seqno) in packets])
+
+    def _frame(self, payload, seqno):
         if isinstance(payload, Packet):
             payload = payload.payload()
 
-        packet = DataFrame()
-        # We need to always request for acks
-        packet.protocol = SERIAL_PROTO_PACKET_ACK
-        packet.seqno = seqno
-        packet.dispatch = 0
-        packet.data = payload
-        packet = packet.payload()
-        crc = self._crc16(0, packet)
-        packet.append(crc & 0xFF)
-        packet.append((crc >> 8) & 0xFF)
-        packet = [HDLC_FLAG_BYTE] + self._escape(packet) + [HDLC_FLAG_BYTE]
-
-        self.log("Serial: write %s" % packet)
-        self._s.putBytes(packet)
+        # DataFrame header: we need to always request for acks
+        header = bytes((SERIAL_PROTO_PACKET_ACK, seqno, 0))
+        packet = HDLC_encode(header, payload)
+
+        if self._s.debug:
+            self.log("Serial: write %s" % list2hex(packet))
+        return packet
 
     def _format(self, payload):
         f = NoAckDataFrame(payload)
@@ -357,16 +417,7 @@ class HDLC:
             )
 
     def _crc16(self, base_crc, frame_data):
-        crc = base_crc
-        for b in frame_data:
-            crc = crc ^ (b << 8)
-            for i in range(0, 8):
-                if crc & 0x8000 == 0x8000:
-                    crc = (crc << 1) ^ 0x1021
-                else:
-                    crc = crc << 1
-                crc = crc & 0xFFFF
-        return crc
+        return crc16.update(base_crc, frame_data)
 
     def _encode(self, val, dim):
         output = []
@@ -382,39 +433,59 @@ class HDLC:
         return r
 
     def _unescape(self, packet):
-        r = []
-        esc = False
-        for b in packet:
-            if esc:
-                r.append(b ^ 0x20)
-                esc = False
-            elif b == HDLC_CTLESC_BYTE:
-                esc = True
-            else:
-                r.append(b)
-        return r
+        return list(HDLC_unescape(packet))
 
     def _escape(self, packet):
-        r = []
-        for b in packet:
-            if b == HDLC_FLAG_BYTE or b == HDLC_CTLESC_BYTE:
-                r.append(HDLC_CTLESC_BYTE)
-                r.append(b ^ 0x20)
-            else:
-                r.append(b)
-        return r
+        return list(HDLC_escape(packet))
 
     def log(self, s):
         if self._s.debug:
             print(s)
 
 
+class _WindowedSend(object):
+    __slots__ = ("packet", "future", "seqno", "frame", "attempts", "deadline")
+
+    def __init__(self, packet, future):
+        self.packet = packet
+        self.future = future
+        self.seqno = None
+        self.frame = None
+        self.attempts = 0
+        self.deadline = 0
+
+
 class SimpleAM(object):
-    def __init__(self, source, oobHook=None):
+    """
+    write() sends one packet and waits for its ack (stop-and-wait).
+
+    send() queues a packet for windowed transmission instead: up to
+    window packets are outstanding at once, acks are matched to them by
+    seqno and only the ones whose ack times out are retransmitted (at
+    most retries times). send() returns a concurrent.futures.Future
+    that resolves to True once acked, or False if it never was; the
+    queued packets are transmitted by flush().
+
+    Received packets carry their data as bytes. Callers that still
+    index or compare it as a list of ints can pass lists=True.
+    """
+
+    def __init__(self, source, oobHook=None, window=1, retries=3, lists=False):
+        # sequence numbers are 8 bits wide and must stay unique while
+        # outstanding
+        if not 1 <= window <= 255:
+            raise ValueError("window must be between 1 and 255, not %r" % (window,))
         self._source = source
-        self._hdlc = HDLC(source)
+        self._hdlc = HDLC(source, lists)
         self.seqno = 0
         self.oobHook = oobHook
+        self.window = window
+        self.retries = retries
+        self._queued = deque()
+        self._outstanding = {}
+        # seqno: time until which a seqno given up on is not reused, so
+        # a late ack for it cannot be taken for a newer packet's
+        self._retired = {}
 
     def read(self, timeout=None):
         f = self._hdlc.read(timeout)
@@ -455,6 +526,119 @@ class SimpleAM(object):
         # print 'SimpleAM:write: got an ack:', ack, ack.seqno == self.seqno
         return ack != None and ack.seqno == self.seqno
 
+    def send(self, packet, amId, callback=None):
+        """
+        Queue packet for windowed transmission and return a Future.
+        callback, if given, is called with the Future once it is done.
+        """
+        future = Future()
+        if callback:
+            future.add_done_callback(callback)
+        self._queued.append(_WindowedSend(ActiveMessage(packet, amId=amId), future))
+        return future
+
+    def flush(self, timeout=None):
+        """
+        Transmit everything queued by send() and wait for the acks.
+        Returns True if every packet was acknowledged.
+        """
+        end = None
+        if timeout != None:
+            end = time.time() + timeout
+        prevTimeout = self._source.getTimeout()
+        futures = [s.future for s in self._queued]
+        futures += [s.future for s in self._outstanding.values()]
+        try:
+            while self._queued or self._outstanding:
+                now = time.time()
+                if end != None and now >= end:
+                    break
+                frames = self._fillWindow(now) + self._retransmit(now)
+                if frames:
+                    self._source.putFrames(frames)
+                if self._outstanding:
+                    wait = min(s.deadline for s in self._outstanding.values())
+                elif self._queued:
+                    # every free seqno is retired; wait for the first
+                    wait = min(self._retired.values())
+                else:
+                    continue
+                wait -= now
+                if end != None:
+                    wait = min(wait, end - now)
+                f = self._hdlc.read(max(wait, 0.001))
+                while f != None:
+                    self._handleFrame(f)
+                    f = self._hdlc.readQueued()
+        finally:
+            self._source.setTimeout(prevTimeout)
+
+        # Whatever is left timed out as a whole
+        for s in list(self._outstanding.values()) + list(self._queued):
+            if not s.future.done():
+                s.future.set_result(False)
+        for seqno in self._outstanding:
+            self._retire(seqno, time.time())
+        self._outstanding.clear()
+        self._queued.clear()
+        return all(f.cancelled() or f.result() for f in futures)
+
+    def _fillWindow(self, now):
+        frames = []
+        while self._queued and len(self._outstanding) < self.window:
+            seqno = self._nextSeqno(now)
+            if seqno == None:
+                break
+            s = self._queued.popleft()
+            if not s.future.set_running_or_notify_cancel():
+                continue
+            self.seqno = seqno
+            s.seqno = self.seqno
+            s.frame = self._hdlc._frame(s.packet, s.seqno)
+            s.attempts = 1
+            s.deadline = now + self._source.ackTimeout
+            self._outstanding[s.seqno] = s
+            frames.append(s.frame)
+        return frames
+
+    def _nextSeqno(self, now):
+        """Return the next seqno neither outstanding nor retired, or None."""
+        seqno = self.seqno
+        for i in range(256):
+            seqno = (seqno + 1) % 256
+            if seqno not in self._outstanding and self._retired.get(seqno, 0) <= now:
+                return seqno
+        return None
+
+    def _retire(self, seqno, now):
+        self._retired[seqno] = now + self._source.ackTimeout
+
+    def _retransmit(self, now):
+        frames = []
+        for s in list(self._outstanding.values()):
+            if s.deadline > now:
+                continue
+            if s.attempts > self.retries:
+                del self._outstanding[s.seqno]
+                self._retire(s.seqno, now)
+                s.future.set_result(False)
+                continue
+            s.attempts += 1
+            s.deadline = now + self._source.ackTimeout
+            frames.append(s.frame)
+        return frames
+
+    def _handleFrame(self, f):
+        ack = AckFrame(f)
+        if ack.protocol == SERIAL_PROTO_ACK:
+            s = self._outstanding.pop(ack.seqno, None)
+            if s:
+                s.future.set_result(True)
+        elif self.oobHook:
+            self.oobHook(ActiveMessage(NoAckDataFrame(f)))
+        else:
+            print("SimpleAM:flush: skip", ack, f)
+
     def setOobHook(self, oobHook):
         self.oobHook = oobHook
 
@@ -463,7 +647,7 @@ def printfHook(packet):
     if packet == None:
         return
     if packet.type == 100:
-        s = "".join([chr(i) for i in packet.data]).strip("\0")
+        s = bytes(packet.data).decode("latin-1").strip("\0")
         lines = s.split("\n")
         for line in lines:
             if line:
@@ -473,7 +657,7 @@ def printfHook(packet):
 
 
 class AM(SimpleAM):
-    def __init__(self, s=None, oobHook=None):
+    def __init__(self, s=None, oobHook=None, window=1, lists=False):
         if s == None:
             try:
                 s = getSource(sys.argv[1])
@@ -492,7 +676,7 @@ class AM(SimpleAM):
                         sys.exit(-1)
         if oobHook == None:
             oobHook = printfHook
-        super(AM, self).__init__(s, oobHook)
+        super(AM, self).__init__(s, oobHook, window, lists=lists)
 
     def read(self, timeout=None):
         return self.oobHook(super(AM, self).read(timeout))
@@ -548,107 +732,343 @@ class AM(SimpleAM):
 ################################################################################
 
 
+# struct codes for the integer sizes that have one
+_UINT_CODES = {1: "B", 2: "H", 4: "I", 8: "Q"}
+_SINT_CODES = {1: "b", 2: "h", 4: "i", 8: "q"}
+
+# Compiled layouts, by (Packet class, description). Classes that build
+# a new description per instance would grow it without bound, so it is
+# emptied once it holds LAYOUT_CACHE_SIZE layouts.
+LAYOUT_CACHE_SIZE = 256
+_layouts = {}
+
+
+class _Field:
+    """Attribute access to one field of a compiled Packet layout."""
+
+    __slots__ = ("name", "index", "layout")
+
+    def __init__(self, name, index, layout):
+        self.name = name
+        self.index = index
+        self.layout = layout
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        if obj._layout is self.layout:
+            return obj._values[self.index]
+        # an instance built from another description
+        return obj.__getattr__(self.name)
+
+
+class _Layout:
+    """
+    A Packet description compiled once: the field names and their
+    positions, and a struct.Struct for the leading run of fixed-size
+    integer and bit fields. The fields after that run, usually just a
+    trailing blob, are decoded one by one.
+    """
+
+    def __init__(self, desc):
+        desc = list(desc)
+        # a variable-size field followed by fixed-size ones gets all
+        # but the bytes of those
+        total = 0
+        for i in range(len(desc) - 1, -1, -1):
+            (n, t, s) = desc[i]
+            if s == None:
+                if total > 0:
+                    desc[i] = (n, t, -total)
+                break
+            total += s
+
+        self.names = [n for (n, t, s) in desc]
+        self.schema = [(t, s) for (n, t, s) in desc]
+        self.index = {}
+        for (i, n) in enumerate(self.names):
+            self.index.setdefault(n, i)
+
+        # plan holds (struct item, shift, mask) per field; shift is None
+        # for whole integers
+        unpackFmt = ">"
+        packFmt = ">"
+        plan = []
+        items = 0
+        boffset = 0
+        clean = (0, ">", ">", 0)
+        for (t, s) in self.schema:
+            if t == "bint" and 0 < s <= 8 - boffset:
+                if boffset == 0:
+                    unpackFmt += "B"
+                    packFmt += "B"
+                    items += 1
+                plan.append((items - 1, 8 - (boffset + s), (1 << s) - 1))
+                boffset = (boffset + s) % 8
+            elif t in ("int", "sint") and s in _UINT_CODES and boffset == 0:
+                codes = _SINT_CODES if t == "sint" else _UINT_CODES
+                unpackFmt += codes[s]
+                packFmt += _UINT_CODES[s]
+                plan.append((items, None, (1 << (8 * s)) - 1))
+                items += 1
+            else:
+                break
+            if boffset == 0:
+                clean = (len(plan), unpackFmt, packFmt, items)
+
+        (count, unpackFmt, packFmt, items) = clean
+        self.plan = plan[:count]
+        self.count = count
+        self.unpacker = struct.Struct(unpackFmt)
+        self.packer = struct.Struct(packFmt)
+        self.items = items
+        self.size = self.unpacker.size
+        self.bits = any(shift != None for (i, shift, mask) in self.plan)
+        # the common case: nothing but a blob for the rest of the packet
+        self.restIsBlob = self.schema[count:] == [("blob", None)]
+
+    def decode(self, packet):
+        """
+        Return the field values of packet, a list of byte values, bytes
+        or a memoryview. Blobs are slices of packet.
+        """
+        n = self.size
+        if len(packet) < n:
+            return self.decodeFrom(packet, [], 0, 0)
+        if type(packet) == list:
+            try:
+                raw = self.unpacker.unpack_from(bytes(packet[:n]))
+            except ValueError:
+                # not a list of byte values; decode it the slow way
+                return self.decodeFrom(packet, [], 0, 0)
+        else:
+            raw = self.unpacker.unpack_from(packet)
+        if self.bits:
+            values = [
+                raw[i] if shift == None else (raw[i] >> shift) & mask
+                for (i, shift, mask) in self.plan
+            ]
+        else:
+            values = list(raw)
+        if self.restIsBlob:
+            values.append(packet[n:])
+        elif self.count < len(self.schema):
+            self.decodeFrom(packet, values, self.count, n)
+        return values
+
+    def decodeFrom(self, packet, values, start, offset):
+        """Decode the fields from start on, one at a time."""
+        boffset = 0
+        for (t, s) in self.schema[start:]:
+            if t == "int":
+                values.append(_decode(packet[offset : offset + s]))
+                offset += s
+            elif t == "sint":
+                values.append(_sign(_decode(packet[offset : offset + s]), s))
+                offset += s
+            elif t == "bint":
+                doffset = 8 - (boffset + s)
+                values.append((packet[offset] >> doffset) & ((1 << s) - 1))
+                boffset += s
+                if boffset == 8:
+                    offset += 1
+                    boffset = 0
+            elif t == "string":
+                values.append("".join([chr(i) for i in packet[offset : offset + s]]))
+                offset += s
+            elif t == "blob":
+                if s:
+                    if s > 0:
+                        values.append(packet[offset : offset + s])
+                        offset += s
+                    else:
+                        values.append(packet[offset:s])
+                        offset = len(packet) + s
+                else:
+                    values.append(packet[offset:])
+        return values
+
+    def encode(self, values):
+        """
+        Return the bytes of values: as bytes if any of the blobs is
+        bytes-like, as a list of byte values otherwise.
+        """
+        raw = [0] * self.items
+        for ((i, shift, mask), v) in zip(self.plan, values):
+            if shift == None:
+                raw[i] = v & mask
+            else:
+                raw[i] |= (v & mask) << shift
+        r = bytearray(self.packer.pack(*raw))
+
+        asBytes = False
+        boffset = 0
+        for i in range(self.count, len(values)):
+            (t, s) = self.schema[i] if i < len(self.schema) else ("blob", None)
+            v = values[i]
+            if t == "int":
+                r.extend(_encode(v, s))
+                boffset = 0
+            elif t == "bint":
+                bits = (v & ((1 << s) - 1)) << (8 - (boffset + s))
+                if boffset == 0:
+                    r.append(bits)
+                else:
+                    r[-1] |= bits
+                boffset += s
+                if boffset == 8:
+                    boffset = 0
+            elif t == "string":
+                r += v.encode("latin-1")
+            elif type(v) == list:
+                r.extend(v)
+            else:
+                r += v
+                asBytes = True
+        return bytes(r) if asBytes else list(r)
+
+
+def _compileLayout(cls, desc):
+    layout = _Layout(desc)
+    if cls is not Packet:
+        for (name, i) in layout.index.items():
+            # fields never hide methods, as with plain attribute lookup
+            existing = getattr(cls, name, None)
+            if name.isidentifier() and (existing == None or type(existing) == _Field):
+                setattr(cls, name, _Field(name, i, layout))
+    if len(_layouts) >= LAYOUT_CACHE_SIZE:
+        _layouts.clear()
+    _layouts[(cls, desc)] = layout
+    if cls is not Packet and "_compiled" not in cls.__dict__:
+        # the description the class is first built with is looked up
+        # by identity, without hashing it
+        cls._compiled = (desc, layout)
+    return layout
+
+
+def _decode(v):
+    r = int(0)
+    for i in v:
+        r = (r << 8) + i
+    return r
+
+
+def _encode(val, dim):
+    output = []
+    for i in range(dim):
+        output.append(int(val & 0xFF))
+        val = val >> 8
+    output.reverse()
+    return output
+
+
+def _show(value):
+    # memoryview blobs print like the lists they replace
+    if type(value) == memoryview:
+        return value.tolist()
+    return value
+
+
+def _sign(val, dim):
+    if val >= (1 << (dim * 8 - 1)):
+        return val - (1 << (dim * 8))
+    return val
+
+
 class Packet:
     """
     The Packet class offers a handy way to build pack and unpack
     binary data based on a given pattern.
+
+    The pattern is a list of (name, type, size) fields, with types
+    "int", "sint", "bint" (size in bits), "string" and "blob" (size
+    None for the rest of the packet). It is compiled once per Packet
+    class, and the fields become attributes of that class.
+
+    packet may be a list of ints, bytes or a memoryview, and blobs are
+    slices of it: lists, bytes, or views into the same buffer that copy
+    nothing. A bytearray is decoded as bytes, so it can still be resized.
+    HDLC hands out bytes rather than views: a memoryview object alone
+    is larger than the bytes slice of a typical payload, and keeps the
+    whole frame alive.
     """
 
+    __slots__ = ("_layout", "_values")
+    # (description, layout) a subclass was first compiled for
+    _compiled = (None, None)
+
     def _decode(self, v):
-        r = int(0)
-        for i in v:
-            r = (r << 8) + i
-        return r
+        return _decode(v)
 
     def _encode(self, val, dim):
-        output = []
-        for i in range(dim):
-            output.append(int(val & 0xFF))
-            val = val >> 8
-        output.reverse()
-        return output
+        return _encode(val, dim)
 
     def _sign(self, val, dim):
-        if val > (1 << (dim * 8 - 1)):
-            return val - (1 << (dim * 8))
-        return val
+        return _sign(val, dim)
 
     def __init__(self, desc, packet=None):
-        offset = 0
-        boffset = 0
-        sum = 0
-        for i in range(len(desc) - 1, -1, -1):
-            (n, t, s) = desc[i]
-            if s == None:
-                if sum > 0:
-                    desc[i] = (n, t, -sum)
-                break
-            sum += s
-        self.__dict__["_schema"] = [(t, s) for (n, t, s) in desc]
-        self.__dict__["_names"] = [n for (n, t, s) in desc]
-        self.__dict__["_values"] = []
-        if type(packet) == type([]):
-            for (t, s) in self._schema:
-                if t == "int":
-                    self._values.append(self._decode(packet[offset : offset + s]))
-                    offset += s
-                elif t == "sint":
-                    self._values.append(
-                        self._sign(self._decode(packet[offset : offset + s]), s)
-                    )
-                    offset += s
-                elif t == "bint":
-                    doffset = 8 - (boffset + s)
-                    self._values.append((packet[offset] >> doffset) & ((1 << s) - 1))
-                    boffset += s
-                    if boffset == 8:
-                        offset += 1
-                        boffset = 0
-                elif t == "string":
-                    self._values.append(
-                        "".join([chr(i) for i in packet[offset : offset + s]])
-                    )
-                    offset += s
-                elif t == "blob":
-                    if s:
-                        if s > 0:
-                            self._values.append(packet[offset : offset + s])
-                            offset += s
-                        else:
-                            self._values.append(packet[offset:s])
-                            offset = len(packet) + s
-                    else:
-                        self._values.append(packet[offset:])
-        elif type(packet) == type(()):
-            for i in packet:
-                self._values.append(i)
+        cls = self.__class__
+        (known, layout) = cls._compiled
+        if desc is not known:
+            # descriptions may be lists of lists; keys must be hashable
+            if type(desc) != tuple or not all(type(f) == tuple for f in desc):
+                desc = tuple(tuple(f) for f in desc)
+            layout = _layouts.get((cls, desc))
+            if layout == None:
+                layout = _compileLayout(cls, desc)
+        object.__setattr__(self, "_layout", layout)
+
+        t = type(packet)
+        if t == list:
+            values = layout.decode(packet)
+        elif t == bytes:
+            values = layout.decode(packet)
+        elif t == memoryview:
+            values = layout.decode(packet if packet.format == "B" else packet.cast("B"))
+        elif t == bytearray:
+            values = layout.decode(bytes(packet))
+        elif t == tuple:
+            values = list(packet)
         else:
-            for v in self._schema:
-                self._values.append(None)
+            values = [None] * len(layout.names)
+        object.__setattr__(self, "_values", values)
 
     def __repr__(self):
-        return self._values.__repr__()
+        return [_show(v) for v in self._values].__repr__()
 
     def __str__(self):
+        names = self._layout.names
         r = ""
-        for i in range(len(self._names)):
-            r += "%s: %s " % (self._names[i], self._values[i])
-        for i in range(len(self._names), len(self._values)):
-            r += "%s" % self._values[i]
+        for i in range(len(names)):
+            r += "%s: %s " % (names[i], _show(self._values[i]))
+        for i in range(len(names), len(self._values)):
+            r += "%s" % _show(self._values[i])
         return r
 
     # Implement the struct behavior
     def __getattr__(self, name):
         if type(name) == type(0):
-            return self._names[name]
-        else:
-            return self._values[self._names.index(name)]
+            return self._layout.names[name]
+        if name in Packet.__slots__:
+            # not set yet, e.g. while copying
+            raise AttributeError(name)
+        i = self._layout.index.get(name)
+        if i == None:
+            raise AttributeError("%s has no field %r" % (self.__class__.__name__, name))
+        return self._values[i]
 
     def __setattr__(self, name, value):
         if type(name) == type(0):
             self._values[name] = value
+        elif name in Packet.__slots__:
+            object.__setattr__(self, name, value)
         else:
-            self._values[self._names.index(name)] = value
+            i = self._layout.index.get(name)
+            if i == None:
+                raise AttributeError(
+                    "%s has no field %r" % (self.__class__.__name__, name)
+                )
+            self._values[i] = value
 
     def __ne__(self, other):
         if other.__class__ == self.__class__:
@@ -676,113 +1096,87 @@ class Packet:
         return len(self._values)
 
     def keys(self):
-        return self._names
+        return list(self._layout.names)
 
     def values(self):
         return self._values
 
     # Custom functions
     def names(self):
-        return self._names
+        return list(self._layout.names)
 
     def sizes(self):
-        return self._schema
+        return list(self._layout.schema)
 
     def payload(self):
-        r = []
-        boffset = 0
-        for i in range(len(self._schema)):
-            (t, s) = self._schema[i]
-            if t == "int":
-                r += self._encode(self._values[i], s)
-                boffset = 0
-            elif t == "bint":
-                doffset = 8 - (boffset + s)
-                if boffset == 0:
-                    r += [self._values[i] << doffset]
-                else:
-                    r[-1] |= self._values[i] << doffset
-                boffset += s
-                if boffset == 8:
-                    boffset = 0
-            elif self._values[i] != []:
-                r += self._values[i]
-        for i in self._values[len(self._schema) :]:
-            r += i
-        return r
+        return self._layout.encode(self._values)
 
 
 class RawPacket(Packet):
+    __slots__ = ()
+    _desc = (("ts", "int", 4), ("data", "blob", None))
+
     def __init__(self, ts=None, data=None):
-        Packet.__init__(self, [("ts", "int", 4), ("data", "blob", None)], None)
-        self.ts = ts
-        self.data = data
+        Packet.__init__(self, self._desc, (ts, data))
+
+
+def _framePayload(payload):
+    if isinstance(payload, Packet):
+        if isinstance(payload, RawPacket):
+            return payload.data
+        return payload.payload()
+    return payload
 
 
 class AckFrame(Packet):
+    __slots__ = ()
+    _desc = (("protocol", "int", 1), ("seqno", "int", 1))
+
     def __init__(self, payload=None):
-        if isinstance(payload, Packet):
-            if isinstance(payload, RawPacket):
-                payload = payload.data
-            else:
-                payload = payload.payload()
-        Packet.__init__(self, [("protocol", "int", 1), ("seqno", "int", 1)], payload)
+        Packet.__init__(self, self._desc, _framePayload(payload))
 
 
 class DataFrame(Packet):
+    __slots__ = ()
+    _desc = (
+        ("protocol", "int", 1),
+        ("seqno", "int", 1),
+        ("dispatch", "int", 1),
+        ("data", "blob", None),
+    )
+
     def __init__(self, payload=None):
-        if isinstance(payload, Packet):
-            if isinstance(payload, RawPacket):
-                payload = payload.data
-            else:
-                payload = payload.payload()
-        Packet.__init__(
-            self,
-            [
-                ("protocol", "int", 1),
-                ("seqno", "int", 1),
-                ("dispatch", "int", 1),
-                ("data", "blob", None),
-            ],
-            payload,
-        )
+        Packet.__init__(self, self._desc, _framePayload(payload))
 
 
 class NoAckDataFrame(Packet):
+    __slots__ = ()
+    _desc = (("protocol", "int", 1), ("dispatch", "int", 1), ("data", "blob", None))
+
     def __init__(self, payload=None):
-        if isinstance(payload, Packet):
-            if isinstance(payload, RawPacket):
-                payload = payload.data
-            else:
-                payload = payload.payload()
-        Packet.__init__(
-            self,
-            [("protocol", "int", 1), ("dispatch", "int", 1), ("data", "blob", None)],
-            payload,
-        )
+        Packet.__init__(self, self._desc, _framePayload(payload))
 
 
 class ActiveMessage(Packet):
+    __slots__ = ()
+    _desc = (
+        ("destination", "int", 2),
+        ("source", "int", 2),
+        ("length", "int", 1),
+        ("group", "int", 1),
+        ("type", "int", 1),
+        ("data", "blob", None),
+    )
+
     def __init__(self, packet=None, amId=0x00, dest=0xFFFF):
         payload = None
-        if type(packet) == type([]):
+        if isinstance(packet, (list, bytes, bytearray, memoryview)):
             payload = packet
         elif isinstance(packet, NoAckDataFrame):
             payload = packet.data
             packet = None
 
-        Packet.__init__(
-            self,
-            [
-                ("destination", "int", 2),
-                ("source", "int", 2),
-                ("length", "int", 1),
-                ("group", "int", 1),
-                ("type", "int", 1),
-                ("data", "blob", None),
-            ],
-            payload,
-        )
+        Packet.__init__(self, self._desc, payload)
         if payload == None:
             self.destination = dest
             self.source = 0x0000
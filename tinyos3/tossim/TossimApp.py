@@ -32,6 +32,10 @@
 # @author Kamin Whitehouse
 # @author Philip Levis
 
+import os
+import re
+from xml.dom import minidom
+
 from tinyos3.tossim.TossimNescDecls import *
 
 
@@ -125,7 +129,7 @@ class NescTypes(object):
         self._types = {}
         # figure out the sizes of all the basic types for this platform (by scanning the xml file)
         platformTypes = {}
-        typeRE = re.compile('cname="([\w\s]+?)" size="I:(\d+?)"')
+        typeRE = re.compile(r'cname="([\w\s]+?)" size="I:(\d+?)"')
         infile = open(xmlFilename, "r")
         for line in infile:
             match = typeRE.search(line)
@@ -382,8 +386,8 @@ class NescEnums(object):
 
         # now define all the struct types
         enumDefs = [node for node in dom.getElementsByTagName("enum")]
-        integer = re.compile("^I:(\d+)$")
-        hexidecimal = re.compile("^(0x[\dabcdefABCDEF]+)$")
+        integer = re.compile(r"^I:(\d+)$")
+        hexidecimal = re.compile(r"^(0x[\dabcdefABCDEF]+)$")
 
         for enumDef in enumDefs:
             name = enumDef.getAttribute("name")
@@ -431,7 +435,7 @@ class NescMsgs(object):
     def __init__(self, types, enums, applicationName="Unknown App"):
         self.applicationName = applicationName
         msgTypes = [enum for enum in enums._enums if enum.find("AM_") == 0]
-        name = re.compile("^AM_(\w+)$")
+        name = re.compile(r"^AM_(\w+)$")
         self._msgNames = []
         self._msgs = {}
         for msgType in msgTypes:
@@ -556,10 +556,7 @@ class nescStruct(object):
     def _parseXMLFields(self, nescTypes, xmlDefinition):
         """Create a list of fields & values given a struct xml declaration."""
         fields = [node for node in xmlDefinition.getElementsByTagName("field")]
-        fields.sort(
-            lambda A, B: int(A.getAttribute("bit-offset")[2:])
-            - int(B.getAttribute("bit-offset")[2:])
-        )
+        fields.sort(key=lambda f: int(f.getAttribute("bit-offset")[2:]))
         for fieldDef in fields:
             field = {}
             field["name"] = fieldDef.getAttribute("name")